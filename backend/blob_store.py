@@ -0,0 +1,165 @@
+"""Content-addressed storage for uploaded files.
+
+Files are keyed by their SHA-256 and laid out as blobs/ab/cd/<sha256> in the
+configured storage backend, so identical uploads are stored once and two uploads
+can never overwrite each other. The `blobs` collection reference-counts every blob: each
+document or policy version entry that points at a blob holds one reference.
+"""
+import hashlib
+import logging
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import aiofiles.os
+
+from storage import LocalStorage, StorageBackend, validate_key
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_URL_PREFIX = "/uploads/"
+BLOB_URL_PREFIX = "/uploads/blobs/"
+
+class BlobStore:
+    def __init__(self, db, storage: StorageBackend):
+        self.blobs = db.blobs
+        self.storage = storage
+
+    def key_for(self, sha256: str) -> str:
+        return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+    def url_for(self, sha256: str) -> str:
+        return UPLOAD_URL_PREFIX + self.key_for(sha256)
+
+    async def commit(self, temp_path: Path, sha256: str, size: int) -> bool:
+        """Move a fully written temp file into the store under its hash.
+
+        Returns False when identical content was already stored, in which case the
+        temp file is discarded. The caller takes a reference with add_ref() once the
+        record pointing at the blob has been written.
+        """
+        key = self.key_for(sha256)
+        if await self.storage.stat(key) is not None:
+            await aiofiles.os.remove(temp_path)
+            return False
+        await self.storage.put(key, temp_path)
+        # Content that had been delta-encoded or moved to the cold tier is whole again
+        await self.blobs.update_one(
+            {"_id": sha256, "$or": [{"encoding": {"$exists": True}}, {"tier": {"$exists": True}}]},
+            {"$unset": {"encoding": "", "base_sha256": "", "stored_size": "", "tier": "", "cold_size": "", "frozen_at": ""}}
+        )
+        return True
+
+    async def add_ref(self, sha256: str, size: int, count: int = 1):
+        await self.blobs.update_one(
+            {"_id": sha256},
+            {"$inc": {"refcount": count}, "$setOnInsert": {"size": size, "created_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    async def release(self, sha256: str, count: int = 1):
+        """Drop references; blobs reaching zero are left for the garbage collector."""
+        await self.blobs.update_one({"_id": sha256}, {"$inc": {"refcount": -count}})
+
+def key_for_url(file_url: str) -> Optional[str]:
+    """Map a stored /uploads/... URL to its storage key, refusing anything that escapes the store."""
+    if not file_url.startswith(UPLOAD_URL_PREFIX):
+        return None
+    try:
+        return validate_key(file_url[len(UPLOAD_URL_PREFIX):])
+    except ValueError:
+        return None
+
+def hash_file(path: Path) -> Tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+async def rebuild_refcounts(db) -> Dict[str, int]:
+    """Recompute every blob's refcount from the version entries and renditions that reference it."""
+    counts: Dict[str, int] = {}
+    sizes: Dict[str, int] = {}
+    async for version in db.document_versions.find({"file_sha256": {"$ne": None}}, {"file_sha256": 1, "file_size": 1}):
+        sha256 = version["file_sha256"]
+        counts[sha256] = counts.get(sha256, 0) + 1
+        sizes[sha256] = version.get("file_size")
+    # Each ready linearized rendition (pdf_optimize.py) holds one reference on its output
+    async for rendition in db.pdf_renditions.find({"status": "ready"}, {"sha256": 1, "size": 1}):
+        counts[rendition["sha256"]] = counts.get(rendition["sha256"], 0) + 1
+        sizes[rendition["sha256"]] = rendition["size"]
+    async for blob in db.blobs.find({}, {"_id": 1}):
+        counts.setdefault(blob["_id"], 0)
+    for sha256, refcount in counts.items():
+        await db.blobs.update_one(
+            {"_id": sha256},
+            {"$set": {"refcount": refcount}, "$setOnInsert": {"size": sizes.get(sha256), "created_at": datetime.utcnow()}},
+            upsert=True
+        )
+    return counts
+
+async def migrate_legacy_files(db, store: BlobStore, source: LocalStorage) -> Dict[str, int]:
+    """Move files referenced by pre-blob /uploads/<name> URLs from `source` into the blob store.
+
+    Records are rewritten to point at their blob, legacy files are removed once no
+    record refers to them any more, and refcounts are rebuilt at the end. Safe to re-run.
+    """
+    migrated: Dict[str, Tuple[str, int]] = {}  # legacy URL -> (sha256, size)
+    stats = {"records": 0, "files": 0, "missing": 0}
+
+    async def to_blob(file_url: str) -> Optional[Tuple[str, int]]:
+        if file_url in migrated:
+            return migrated[file_url]
+        key = key_for_url(file_url)
+        path = source.local_path(key) if key else None
+        if path is None or not path.is_file():
+            logger.warning(f"Legacy file missing, leaving reference untouched: {file_url}")
+            stats["missing"] += 1
+            return None
+        sha256, size = hash_file(path)
+        temp_path = source.root / ".incoming" / f"{uuid.uuid4().hex}.part"
+        temp_path.parent.mkdir(exist_ok=True)
+        shutil.copyfile(path, temp_path)
+        await store.commit(temp_path, sha256, size)
+        migrated[file_url] = (sha256, size)
+        stats["files"] += 1
+        return migrated[file_url]
+
+    legacy = {"file_url": {"$not": {"$regex": f"^{BLOB_URL_PREFIX}"}}}
+    for collection in (db.documents, db.policies, db.document_versions):
+        async for record in collection.find(legacy, {"_id": 1, "file_url": 1}):
+            blob = await to_blob(record["file_url"])
+            if blob:
+                await collection.update_one(
+                    {"_id": record["_id"]},
+                    {"$set": {"file_url": store.url_for(blob[0]), "file_sha256": blob[0], "file_size": blob[1]}}
+                )
+                stats["records"] += 1
+
+    for file_url in migrated:
+        await source.delete(key_for_url(file_url))
+
+    await rebuild_refcounts(db)
+    return stats
+
+async def copy_blobs(source: LocalStorage, target: StorageBackend) -> int:
+    """Upload local blobs missing from `target`, e.g. when switching a node to S3. Returns the count copied."""
+    copied = 0
+    blobs_dir = source.root / "blobs"
+    if not blobs_dir.is_dir():
+        return copied
+    for path in sorted(blobs_dir.glob("*/*/*")):
+        key = path.relative_to(source.root).as_posix()
+        if await target.stat(key) is not None:
+            continue
+        temp_path = source.root / ".incoming" / f"{uuid.uuid4().hex}.part"
+        temp_path.parent.mkdir(exist_ok=True)
+        shutil.copyfile(path, temp_path)
+        await target.put(key, temp_path)
+        copied += 1
+    return copied
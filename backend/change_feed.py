@@ -0,0 +1,247 @@
+"""Server-Sent Events feed of registry changes.
+
+Each worker runs one pump task that tails the change journal
+(change_journal.py). For every batch it loads the visibility of the touched
+documents and policies once, then hands one compact notification per event to
+every connected client that may see it:
+
+    {"seq": 1042, "entity": "document", "id": "...", "action": "updated", "fields": ["title"]}
+
+The pump never waits on a client. Each connection has a bounded queue, and a
+client that falls CHANGE_FEED_QUEUE notifications behind has its backlog
+dropped and replaced by a single `resync` event, telling it to reload its
+lists. That costs one put per client and event, so a worker can serve
+thousands of idle EventSource connections. Comment heartbeats keep proxies
+from closing quiet streams.
+
+What each client receives:
+- users and user groups: admins only;
+- categories and policy types: every signed-in user;
+- documents and policies: admins and policy managers see all of them. Other
+  users see the ones they can currently read. If a write removes a record from
+  their view (deleted, hidden, group removed), they get it as action `removed`.
+  A record they could not have read before the write produces nothing.
+- public stream (no login): public documents. `removed` follows the rule of
+  the sync endpoint (delta_sync.left_public_view), so private ids never show.
+
+A signed-in stream is filtered with the role and groups its caller had when it
+connected. It is closed when the caller's token expires and whenever the
+invalidation bus (invalidation.py) reports a change to the caller's user
+record (role, groups, suspension, deletion). EventSource then reconnects and
+authenticates again.
+
+Configuration (environment):
+    CHANGE_FEED_POLL_SECONDS   journal poll interval when idle (default 1)
+    CHANGE_FEED_QUEUE          notifications buffered per client (default 100)
+    CHANGE_FEED_HEARTBEAT      seconds between heartbeats (default 15)
+    CHANGE_FEED_MAX_CLIENTS    connections per worker (default 5000)
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from change_journal import MAX_READ, ChangeJournal, CursorExpired
+from delta_sync import left_public_view
+from invalidation import InvalidationBus
+
+logger = logging.getLogger(__name__)
+
+ADMIN_ENTITIES = {"user", "user_group"}
+SHARED_ENTITIES = {"category", "policy_type"}
+READABLE_STATUSES = {"active", "archived"}
+# A write touching one of these can take a record out of a reader's view
+VISIBILITY_FIELDS = {"status", "is_visible_to_users", "visible_to_groups"}
+
+class Subscriber:
+    """One open stream and what its caller may see."""
+
+    def __init__(self, role: Optional[str], group_ids: List[str], size: int,
+                 user_id: Optional[str] = None, expires_at: Optional[float] = None):
+        self.role = role  # None for the public stream
+        self.group_ids = set(group_ids)
+        self.user_id = user_id
+        self.expires_at = expires_at  # epoch seconds
+        self.closed = False
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+
+    def project(self, event: Dict[str, Any], record: Optional[Dict[str, Any]]) -> Optional[str]:
+        """The notification this caller gets for `event`, or None."""
+        entity = event["entity"]
+        if self.role is None and entity != "document":
+            return None
+        if self.role == "admin":
+            return event["data"]
+        if entity in ADMIN_ENTITIES:
+            return None
+        if entity in SHARED_ENTITIES or self.role == "policy_manager":
+            return event["data"]
+        if self.can_read(entity, record):
+            return event["data"]
+        if self.could_have_read(entity, event, record):
+            return event["removed"]
+        return None
+
+    def can_read(self, entity: str, record: Optional[Dict[str, Any]]) -> bool:
+        if record is None or record.get("status") not in READABLE_STATUSES:
+            return False
+        return self.can_access(entity, record)
+
+    def could_have_read(self, entity: str, event: Dict[str, Any], record: Optional[Dict[str, Any]]) -> bool:
+        """Whether `event` may have taken a record this caller cannot read now out of their view.
+
+        Only a write to a visibility field can, and the fields it left alone still
+        have their current values, which must have let this caller in.
+        """
+        if self.role is None:
+            return left_public_view(event, record)
+        changed = VISIBILITY_FIELDS.intersection(event["fields"])
+        if not changed:
+            return False
+        if record is None:
+            return True
+        if "status" not in changed and record.get("status") not in READABLE_STATUSES:
+            return False
+        return bool(changed - {"status"}) or self.can_access(entity, record)
+
+    def can_access(self, entity: str, record: Dict[str, Any]) -> bool:
+        if entity == "policy":
+            return record.get("is_visible_to_users", True)
+        return (record.get("is_visible_to_users", False)
+                or bool(self.group_ids.intersection(record.get("visible_to_groups") or [])))
+
+    def offer(self, message: str):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Too far behind to catch up event by event: drop the backlog, ask for a reload
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    def close(self):
+        self.closed = True
+        self.offer(CLOSE)  # wakes the stream up
+
+    @property
+    def ended(self) -> bool:
+        return self.closed or (self.expires_at is not None and time.time() >= self.expires_at)
+
+def sse(event: str, data: str, seq: Optional[int] = None) -> str:
+    head = f"id: {seq}\n" if seq is not None else ""
+    return f"{head}event: {event}\ndata: {data}\n\n"
+
+RESYNC = sse("resync", "{}")
+# Wakes up a closed stream; never sent
+CLOSE = ""
+
+class ChangeFeed:
+    def __init__(self, db, journal: ChangeJournal, bus: InvalidationBus):
+        self.db = db
+        self.journal = journal
+        self.poll_interval = float(os.environ.get("CHANGE_FEED_POLL_SECONDS", "1"))
+        self.queue_size = int(os.environ.get("CHANGE_FEED_QUEUE", "100"))
+        self.heartbeat = float(os.environ.get("CHANGE_FEED_HEARTBEAT", "15"))
+        self.max_clients = int(os.environ.get("CHANGE_FEED_MAX_CLIENTS", "5000"))
+        self.subscribers: Set[Subscriber] = set()
+        self._pump: Optional[asyncio.Task] = None
+        self._listening = asyncio.Event()
+        bus.subscribe("user", self.close_users)
+
+    @property
+    def full(self) -> bool:
+        return len(self.subscribers) >= self.max_clients
+
+    async def stream(self, role: Optional[str], group_ids: List[str], is_disconnected,
+                     user_id: Optional[str] = None, expires_at: Optional[float] = None) -> AsyncIterator[str]:
+        """SSE body for one connection; `role` None subscribes to the public feed."""
+        subscriber = Subscriber(role, group_ids, self.queue_size, user_id, expires_at)
+        self.subscribers.add(subscriber)
+        self._listening.set()
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        return
+                    message = ": ping\n\n"
+                if subscriber.ended:
+                    return
+                yield message
+        finally:
+            self.subscribers.discard(subscriber)
+
+    async def _run(self):
+        """Tail the journal; idle while nobody is connected."""
+        cursor = await self.journal.head()
+        while True:
+            if not self.subscribers:
+                self._listening.clear()
+                await self._listening.wait()
+                cursor = await self.journal.head()  # nobody needs what happened meanwhile
+            try:
+                events, cursor_after = await self.journal.read(cursor, MAX_READ)
+            except CursorExpired:
+                cursor = await self.journal.head()
+                self._broadcast(RESYNC)
+                continue
+            except Exception:
+                logger.exception("Change feed poll failed")
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if events:
+                try:
+                    await self._dispatch(events)
+                except Exception:
+                    logger.exception("Change feed dispatch failed")
+                    await asyncio.sleep(self.poll_interval)
+                    continue  # retry the batch: nothing was sent before its records were loaded
+            if cursor_after == cursor or len(events) < MAX_READ:
+                await asyncio.sleep(self.poll_interval)
+            cursor = cursor_after
+
+    async def _dispatch(self, events: List[Dict[str, Any]]):
+        records = await self._visibility(events)
+        for event in events:
+            compact = {"seq": event["seq"], "entity": event["entity"], "id": event["entity_id"],
+                       "action": event["action"], "fields": event["fields"]}
+            # Serialized once per event, whatever the number of clients
+            event = {**event, "data": sse("change", json.dumps(compact), event["seq"]),
+                     "removed": sse("change", json.dumps({**compact, "action": "removed", "fields": []}), event["seq"])}
+            record = records.get((event["entity"], event["entity_id"]))
+            for subscriber in tuple(self.subscribers):
+                message = subscriber.project(event, record)
+                if message is not None:
+                    subscriber.offer(message)
+            await asyncio.sleep(0)  # let connections drain before the next event
+
+    async def _visibility(self, events: List[Dict[str, Any]]) -> Dict[tuple, Dict[str, Any]]:
+        """Current status and visibility of the documents and policies in a batch."""
+        projection = {"_id": 0, "id": 1, "status": 1, "is_visible_to_users": 1, "visible_to_groups": 1}
+        records = {}
+        for entity, collection in (("document", self.db.documents), ("policy", self.db.policies)):
+            ids = list({event["entity_id"] for event in events if event["entity"] == entity})
+            if ids:
+                async for record in collection.find({"id": {"$in": ids}}, projection):
+                    records[(entity, record["id"])] = record
+        return records
+
+    def close_users(self, ids: Optional[Set[str]]):
+        """Close the signed-in streams of these users (all of them when `ids` is None)."""
+        for subscriber in tuple(self.subscribers):
+            if subscriber.user_id is not None and (ids is None or subscriber.user_id in ids):
+                subscriber.close()
+
+    def _broadcast(self, message: str):
+        for subscriber in tuple(self.subscribers):
+            subscriber.offer(message)
+
+    def shutdown(self):
+        if self._pump is not None:
+            self._pump.cancel()
@@ -0,0 +1,162 @@
+"""Append-only journal of registry writes.
+
+Every write to documents, policies, users, user groups, categories and policy
+types appends one compact event to the `change_journal` collection:
+
+    {"seq": 1042, "entity": "document", "entity_id": "...", "action": "updated",
+     "fields": ["title", "status"], "actor": "<user id>", "at": <datetime>}
+
+`seq` comes from a counter in the `counters` collection and increases
+strictly. The same counter document keeps, per entity, the seq of its newest
+event (`entities.<entity>`), which does not expire with the events and versions
+the public list ETags (public_cache.py). Consumers (search indexing, caches, sync clients) remember the last
+seq they processed and read on from there with read(), instead of re-scanning
+collections. Events expire after CHANGE_JOURNAL_RETENTION_DAYS (TTL index). A
+consumer whose cursor is older than the oldest retained event must resync from
+scratch (CursorExpired).
+
+The event must not be lost when a writer fails after its registry write (there
+is no multi-document transaction on a standalone server). Writers therefore
+store a pending_change() entry in the record's outbox (PENDING_FIELD) with the
+same write, and then commit() it: that appends the event and removes the entry.
+drain() journals entries that a writer which crashed or raised in between left
+behind for longer than PENDING_TIMEOUT (CHANGE_JOURNAL_PENDING_SECONDS,
+default 60). A slow writer can thus have its
+event appended twice. Consumers treat events as "this record changed" and
+re-read the record, so a repeat is harmless.
+
+Sequence numbers are handed out before the insert, so two concurrent writers
+can make seq 8 visible a moment before seq 7. read() therefore stops in front
+of a gap and only skips it once it is older than GAP_TIMEOUT, which covers a
+writer that died between taking its number and inserting.
+"""
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_RETENTION = timedelta(days=float(os.environ.get("CHANGE_JOURNAL_RETENTION_DAYS", "30")))
+COUNTER_ID = "change_journal"
+GAP_TIMEOUT = timedelta(seconds=10)
+MAX_READ = 1000
+# Bookkeeping fields every update touches; left out of `fields`
+IGNORED_FIELDS = {"modified_by", "modified_at"}
+# Registry collection of each journal entity
+ENTITY_COLLECTIONS = {
+    "document": "documents",
+    "policy": "policies",
+    "user": "users",
+    "user_group": "user_groups",
+    "category": "categories",
+    "policy_type": "policy_types",
+}
+# Outbox on each registry record: changes written but not yet journaled
+PENDING_FIELD = "pending_changes"
+# An outbox entry this old has lost its writer; drain() journals it
+PENDING_TIMEOUT = timedelta(seconds=float(os.environ.get("CHANGE_JOURNAL_PENDING_SECONDS", "60")))
+
+def pending_change(action: str, actor: Optional[str] = None, fields: Iterable[str] = ()) -> Dict[str, Any]:
+    """Outbox entry for one write; store it with the write, then pass it to ChangeJournal.commit()."""
+    return {"id": uuid.uuid4().hex, "action": action, "actor": actor,
+            "fields": sorted(set(fields) - IGNORED_FIELDS), "at": datetime.utcnow()}
+
+def with_pending(update: Dict[str, Any], change: Dict[str, Any]) -> Dict[str, Any]:
+    """`update` (an update document) also adding `change` to the record's outbox."""
+    return {**update, "$push": {PENDING_FIELD: change}}
+
+class CursorExpired(Exception):
+    """The requested position has already been removed from the journal."""
+
+class ChangeJournal:
+    def __init__(self, db):
+        self.db = db
+        self.journal = db.change_journal
+        self.counters = db.counters
+        # Called with (entity, entity_id) after each append, e.g. to drop local cache entries
+        self.listeners: List[Callable[[str, str], None]] = []
+
+    async def append(self, entity: str, entity_id: str, action: str, actor: Optional[str] = None,
+                     fields: Iterable[str] = ()) -> int:
+        """Record one write that has just been applied and return its sequence number."""
+        # One atomic write hands out the number and records it as the entity's newest
+        counter = await self.counters.find_one_and_update(
+            {"_id": COUNTER_ID},
+            [{"$set": {"seq": {"$add": [{"$ifNull": ["$seq", 0]}, 1]}}},
+             {"$set": {f"entities.{entity}": "$seq"}}],
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        event = {"seq": counter["seq"], "entity": entity, "entity_id": entity_id, "action": action,
+                 "fields": sorted(set(fields) - IGNORED_FIELDS), "actor": actor, "at": datetime.utcnow()}
+        await self.journal.insert_one(event)
+        for listener in self.listeners:
+            listener(entity, entity_id)
+        return event["seq"]
+
+    async def commit(self, entity: str, entity_id: str, change: Dict[str, Any]) -> int:
+        """Journal an outbox entry written with the record and remove it; returns the event's seq."""
+        seq = await self.append(entity, entity_id, change["action"], change["actor"], change["fields"])
+        remaining = {"$filter": {"input": f"${PENDING_FIELD}", "cond": {"$ne": ["$$this.id", change["id"]]}}}
+        await self.db[ENTITY_COLLECTIONS[entity]].update_one(
+            {"id": entity_id, f"{PENDING_FIELD}.id": change["id"]},
+            [{"$set": {PENDING_FIELD: remaining}},
+             {"$set": {PENDING_FIELD: {"$cond": [{"$eq": [f"${PENDING_FIELD}", []]}, "$$REMOVE", f"${PENDING_FIELD}"]}}}]
+        )
+        return seq
+
+    async def drain(self) -> int:
+        """Journal the outbox entries whose writers stopped before commit(); returns how many."""
+        cutoff = datetime.utcnow() - PENDING_TIMEOUT
+        drained = 0
+        for entity, collection in ENTITY_COLLECTIONS.items():
+            stranded = self.db[collection].find({f"{PENDING_FIELD}.at": {"$lt": cutoff}},
+                                                {"_id": 0, "id": 1, PENDING_FIELD: 1})
+            async for record in stranded:
+                for change in record[PENDING_FIELD]:
+                    if change["at"] < cutoff:
+                        await self.commit(entity, record["id"], change)
+                        drained += 1
+        return drained
+
+    async def head(self) -> int:
+        """Sequence number of the newest event (0 for an empty journal)."""
+        counter = await self.counters.find_one({"_id": COUNTER_ID})
+        return counter["seq"] if counter else 0
+
+    async def entity_version(self, entity: str) -> int:
+        """Sequence number of the newest event for `entity` (0 if it never had one)."""
+        counter = await self.counters.find_one({"_id": COUNTER_ID}, {f"entities.{entity}": 1})
+        version = ((counter or {}).get("entities") or {}).get(entity)
+        if version is None:
+            # Counter written before per-entity versions were kept: use the newest retained event
+            newest = await self.journal.find_one({"entity": entity}, {"seq": 1}, sort=[("seq", -1)])
+            version = newest["seq"] if newest else 0
+        return version
+
+    async def read(self, after: int, limit: int = 100, entities: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Events after `after` in order, and the cursor to continue from.
+
+        With `entities`, other events are left out but still advance the cursor.
+        Raises CursorExpired when events after `after` were already purged.
+        """
+        oldest = await self.journal.find_one({}, {"seq": 1}, sort=[("seq", 1)])
+        if after > 0 and oldest and oldest["seq"] > after + 1:
+            raise CursorExpired(f"Changes after {after} are no longer retained")
+        if after > 0 and not oldest and after < await self.head():
+            raise CursorExpired(f"Changes after {after} are no longer retained")
+
+        limit = min(limit, MAX_READ)
+        events = await self.journal.find({"seq": {"$gt": after}}, {"_id": 0}).sort("seq", 1).to_list(limit)
+        result, cursor = [], after
+        now = datetime.utcnow()
+        for event in events:
+            if event["seq"] != cursor + 1 and now - event["at"] < GAP_TIMEOUT:
+                break  # an earlier number is probably still being written
+            cursor = event["seq"]
+            if entities is None or event["entity"] in entities:
+                result.append(event)
+        return result, cursor
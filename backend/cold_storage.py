@@ -0,0 +1,190 @@
+"""Compressed cold tier for rarely read blobs.
+
+A periodic mover compresses two kinds of blobs with zstd and moves them from
+blobs/... to cold/ab/cd/<sha256>.zst:
+
+- blobs not read for COLD_AFTER_DAYS days;
+- files of archived and deleted documents and policies, including their whole
+  version history.
+
+Blobs that are still the current file of a live record are left alone in the
+second case. The mover paces its reads and writes at COLD_MOVE_RATE_MB per
+second so it can run on a live node. It takes a lease in the `maintenance`
+collection, so only one node moves at a time.
+
+Moved blobs keep their hash and their `blobs` record, which gains tier="cold".
+Reads go through DeltaStore.resolve(). It decompresses a cold blob into the
+shared cache/ of reconstructed files, so a document that becomes popular again
+is read from disk at full speed until the cache evicts it. Reads also stamp the
+blob's last_access, at most once an hour, and that is what "not read for N days"
+is measured against.
+
+Configuration (environment):
+    COLD_TIER               true to run the mover (needs `pip install zstandard`)
+    COLD_AFTER_DAYS         idle days before a blob moves (default 90)
+    COLD_MOVE_RATE_MB       mover I/O budget in MB/s (default 20)
+    COLD_INTERVAL_HOURS     time between mover runs (default 24)
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+import aiofiles
+from pymongo.errors import DuplicateKeyError
+
+from blob_store import BlobStore
+from storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COLD_TIER = "cold"
+COLD_PREFIX = "cold/"
+COMPRESSION_LEVEL = 12
+INACTIVE_STATUSES = ["archived", "deleted"]
+MOVER_LOCK_ID = "cold_mover"
+# Reads stamp last_access at most this often, so hot files do not cost a write per download
+ACCESS_RESOLUTION = timedelta(hours=1)
+
+def cold_key(sha256: str) -> str:
+    return f"{COLD_PREFIX}{sha256[:2]}/{sha256[2:4]}/{sha256}.zst"
+
+class ColdTier:
+    def __init__(self, db, store: BlobStore, storage: StorageBackend, scratch_dir: Path):
+        self.db = db
+        self.blobs = db.blobs
+        self.store = store
+        self.storage = storage
+        self.scratch_dir = scratch_dir
+        self.enabled = zstandard is not None and os.environ.get("COLD_TIER", "false").lower() == "true"
+        self.after = timedelta(days=float(os.environ.get("COLD_AFTER_DAYS", "90")))
+        self.rate = float(os.environ.get("COLD_MOVE_RATE_MB", "20")) * 1024 * 1024
+        self.interval = float(os.environ.get("COLD_INTERVAL_HOURS", "24")) * 3600
+        if zstandard is None and os.environ.get("COLD_TIER", "false").lower() == "true":
+            logger.warning("COLD_TIER is set but zstandard is not installed: the cold tier mover is off (pip install zstandard)")
+
+    async def touch(self, sha256: str, record: Dict[str, Any]):
+        """Note a read of a blob (its `blobs` record must include last_access)."""
+        now = datetime.utcnow()
+        if record.get("last_access") is None or record["last_access"] < now - ACCESS_RESOLUTION:
+            await self.blobs.update_one({"_id": sha256}, {"$set": {"last_access": now}})
+
+    async def _transform(self, source: AsyncIterator[bytes], codec, destination: Path, rate: float = 0) -> int:
+        """Run chunks through a zstd (de)compression object into a file, paced at `rate` bytes/s if set."""
+        convert = codec.compress if hasattr(codec, "compress") else codec.decompress
+        written = read = 0
+        started = time.monotonic()
+        async with aiofiles.open(destination, "wb") as f:
+            async for chunk in source:
+                data = await asyncio.to_thread(convert, chunk)
+                await f.write(data)
+                written += len(data)
+                read += len(chunk)
+                if rate:
+                    await asyncio.sleep(max(read / rate - (time.monotonic() - started), 0))
+            data = codec.flush()
+            await f.write(data)
+            written += len(data)
+        return written
+
+    async def freeze(self, sha256: str) -> bool:
+        """Move one whole blob to the cold tier; returns True if it was moved."""
+        record = await self.blobs.find_one({"_id": sha256}, {"tier": 1, "encoding": 1})
+        if not record or record.get("tier") or record.get("encoding"):
+            return False
+        key = self.store.key_for(sha256)
+        if await self.storage.stat(key) is None:
+            return False
+        temp_path = self.scratch_dir / f"{uuid.uuid4().hex}.part"
+        try:
+            compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL).compressobj()
+            cold_size = await self._transform(self.storage.stream(key), compressor, temp_path, self.rate)
+            await self.storage.put(cold_key(sha256), temp_path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+        # Point readers at the cold copy before the whole file goes away
+        await self.blobs.update_one(
+            {"_id": sha256}, {"$set": {"tier": COLD_TIER, "cold_size": cold_size, "frozen_at": datetime.utcnow()}}
+        )
+        await self.storage.delete(key)
+        return True
+
+    async def rehydrate(self, sha256: str, destination_key: str):
+        """Decompress a cold blob to `destination_key` (at full speed: a reader is waiting)."""
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read cold-tier files")
+        temp_path = self.scratch_dir / f"{uuid.uuid4().hex}.part"
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        await self._transform(self.storage.stream(cold_key(sha256)), decompressor, temp_path)
+        await self.storage.put(destination_key, temp_path)
+
+    async def _inactive_blobs(self) -> Set[str]:
+        """Blobs of archived/deleted records that no live record currently shows."""
+        candidates: Set[str] = set()
+        for collection in (self.db.documents, self.db.policies):
+            ids = []
+            async for record in collection.find({"status": {"$in": INACTIVE_STATUSES}}, {"id": 1, "file_sha256": 1}):
+                ids.append(record["id"])
+                if record.get("file_sha256"):
+                    candidates.add(record["file_sha256"])
+            for start in range(0, len(ids), 500):
+                async for version in self.db.document_versions.find(
+                    {"document_id": {"$in": ids[start:start + 500]}, "file_sha256": {"$ne": None}}, {"file_sha256": 1}
+                ):
+                    candidates.add(version["file_sha256"])
+        for collection in (self.db.documents, self.db.policies):
+            async for record in collection.find(
+                {"status": {"$nin": INACTIVE_STATUSES}, "file_sha256": {"$in": list(candidates)}}, {"file_sha256": 1}
+            ):
+                candidates.discard(record["file_sha256"])
+        return candidates
+
+    async def run(self, limit: Optional[int] = None) -> Dict[str, int]:
+        """One mover pass; returns counts. Skipped when another node holds the mover lease."""
+        stats = {"moved": 0, "bytes_before": 0, "bytes_after": 0}
+        now = datetime.utcnow()
+        try:
+            await self.db.maintenance.find_one_and_update(
+                {"_id": MOVER_LOCK_ID, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+                {"$set": {"lease_until": now + timedelta(seconds=max(self.interval, 3600))}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            logger.info("Cold tier mover is running on another node")
+            return stats
+        try:
+            cutoff = now - self.after
+            idle = {"tier": {"$exists": False}, "encoding": {"$exists": False}, "$or": [
+                {"last_access": {"$lt": cutoff}},
+                {"last_access": None, "created_at": {"$lt": cutoff}},
+            ]}
+            candidates = await self._inactive_blobs()
+            async for blob in self.blobs.find(idle, {"_id": 1}):
+                candidates.add(blob["_id"])
+            for sha256 in sorted(candidates):
+                if limit is not None and stats["moved"] >= limit:
+                    break
+                try:
+                    if await self.freeze(sha256):
+                        blob = await self.blobs.find_one({"_id": sha256}, {"size": 1, "cold_size": 1})
+                        stats["moved"] += 1
+                        stats["bytes_before"] += blob.get("size") or 0
+                        stats["bytes_after"] += blob["cold_size"]
+                except Exception:
+                    logger.exception(f"Moving {sha256} to the cold tier failed")
+        finally:
+            await self.db.maintenance.update_one(
+                {"_id": MOVER_LOCK_ID}, {"$set": {"lease_until": None, "finished_at": datetime.utcnow(), **stats}}
+            )
+        logger.info(f"Cold tier: moved {stats['moved']} blobs, {stats['bytes_before']} -> {stats['bytes_after']} bytes")
+        return stats
@@ -0,0 +1,251 @@
+"""Declarative MongoDB index definitions for the policy register.
+
+Every collection's hot query shapes are listed in INDEXES and applied by
+ensure_indexes(), which is safe to run on every startup: unchanged indexes are
+no-ops and indexes whose options changed are rebuilt in place.
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.collation import Collation, CollationStrength
+from pymongo.errors import OperationFailure
+
+from change_journal import ENTITY_COLLECTIONS, JOURNAL_RETENTION, PENDING_FIELD
+
+logger = logging.getLogger(__name__)
+
+# Rows hidden by soft delete never take part in lookups, so most lookup indexes skip them
+NOT_DELETED = {"is_deleted": False}
+
+# Uniqueness of usernames, emails and codes ignores case
+CASE_INSENSITIVE = Collation(locale="en", strength=CollationStrength.SECONDARY)
+
+# MongoDB error codes for "an index with this name/key already exists with other options"
+INDEX_CONFLICT_CODES = {85, 86}
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Exact-match lookup used by authentication on every request
+        IndexModel([("username", ASCENDING)], name="username_active", partialFilterExpression=NOT_DELETED),
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True,
+                   partialFilterExpression=NOT_DELETED, collation=CASE_INSENSITIVE),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True,
+                   partialFilterExpression=NOT_DELETED, collation=CASE_INSENSITIVE),
+        IndexModel([("user_group_ids", ASCENDING)], name="user_group_ids"),  # multikey
+    ],
+    "user_groups": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("code", ASCENDING)], name="code_unique", unique=True,
+                   partialFilterExpression=NOT_DELETED, collation=CASE_INSENSITIVE),
+    ],
+    "categories": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("code", ASCENDING)], name="code_unique", unique=True,
+                   partialFilterExpression=NOT_DELETED, collation=CASE_INSENSITIVE),
+    ],
+    "policy_types": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("code", ASCENDING)], name="code_unique", unique=True,
+                   partialFilterExpression=NOT_DELETED, collation=CASE_INSENSITIVE),
+    ],
+    "policies": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # generate_policy_number: category + year range, excluding deleted
+        IndexModel(
+            [("category_id", ASCENDING), ("date_issued", ASCENDING), ("status", ASCENDING)],
+            name="numbering"
+        ),
+        IndexModel([("status", ASCENDING), ("is_visible_to_users", ASCENDING)], name="visibility"),
+        # Renditions and delta encoding look up which records currently hold some content
+        IndexModel([("file_sha256", ASCENDING)], name="file_sha256"),
+    ],
+    "documents": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # generate_document_number: category + type + year range, excluding deleted
+        IndexModel(
+            [("category_id", ASCENDING), ("document_type", ASCENDING),
+             ("date_issued", ASCENDING), ("status", ASCENDING)],
+            name="numbering"
+        ),
+        IndexModel([("status", ASCENDING), ("is_visible_to_users", ASCENDING)], name="public_visibility"),
+        IndexModel([("visible_to_groups", ASCENDING), ("status", ASCENDING)], name="group_visibility"),  # multikey
+        IndexModel([("file_sha256", ASCENDING)], name="file_sha256"),
+    ],
+    "upload_sessions": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # purge of abandoned resumable uploads
+        IndexModel([("expires_at", ASCENDING)], name="expires_at"),
+    ],
+    "document_versions": [
+        # Paged history per document or policy; also hands out each version number once
+        IndexModel([("document_id", ASCENDING), ("version_number", ASCENDING)], name="document_version", unique=True),
+        # Linearized renditions are attached to every version holding the same content
+        IndexModel([("file_sha256", ASCENDING)], name="file_sha256"),
+    ],
+    "status_changes": [
+        # Status in effect at a point in time, per document or policy (versions.find_as_of)
+        IndexModel([("document_id", ASCENDING), ("changed_at", ASCENDING)], name="document_changed_at"),
+    ],
+    "change_journal": [
+        # Cursor reads; also rejects a sequence number being used twice
+        IndexModel([("seq", ASCENDING)], name="seq_unique", unique=True),
+        # Newest event per entity, for counters written before they kept it (ChangeJournal.entity_version)
+        IndexModel([("entity", ASCENDING), ("seq", ASCENDING)], name="entity_seq"),
+        # Retention (CHANGE_JOURNAL_RETENTION_DAYS)
+        IndexModel([("at", ASCENDING)], name="at_ttl", expireAfterSeconds=int(JOURNAL_RETENTION.total_seconds())),
+    ],
+    "blobs": [
+        # _id is the content hash; this finds unreferenced blobs for garbage collection
+        IndexModel([("refcount", ASCENDING)], name="refcount"),
+        # Delta-encoded versions (delta_store.py), listed by reconcile
+        IndexModel([("encoding", ASCENDING)], name="encoding", sparse=True),
+        # Cold tier mover: blobs not read for a while (cold_storage.py)
+        IndexModel([("last_access", ASCENDING), ("created_at", ASCENDING)], name="idle"),
+        IndexModel([("tier", ASCENDING)], name="tier", sparse=True),
+    ],
+    "stream_tickets": [
+        # Unused change stream tickets are removed once expired (server.py checks expiry on use as well)
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "reconstructed_cache": [
+        # LRU eviction of reconstructed versions
+        IndexModel([("last_access", ASCENDING)], name="last_access"),
+    ],
+}
+
+# Outbox entries not yet journaled (ChangeJournal.drain); the field only exists while one is pending
+for collection_name in ENTITY_COLLECTIONS.values():
+    INDEXES[collection_name].append(
+        IndexModel([(f"{PENDING_FIELD}.at", ASCENDING)], name="pending_changes", sparse=True)
+    )
+
+class UniqueIndexError(Exception):
+    """A unique index could not be built, so the uniqueness it enforces is not in place."""
+
+# Indexes replaced by a later definition; dropped by ensure_indexes() if still present
+RETIRED_INDEXES: Dict[str, List[str]] = {
+    "users": ["email_active"],
+    "user_groups": ["code_active"],
+    "categories": ["code_active"],
+    "policy_types": ["code_active"],
+}
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create every declared index, rebuilding any whose definition changed.
+
+    Failures of ordinary indexes are logged and skipped. Unique indexes are the
+    only guard against duplicate usernames, emails and codes, so if any of them
+    cannot be built (usually over existing duplicates, see find_duplicates())
+    UniqueIndexError is raised after all other indexes were attempted.
+    Returns the names of the indexes that are in place, per collection.
+    """
+    for collection_name, names in RETIRED_INDEXES.items():
+        existing = {index["name"] async for index in db[collection_name].list_indexes()}
+        for name in names:
+            if name in existing:
+                logger.info(f"Dropping retired index {collection_name}.{name}")
+                await db[collection_name].drop_index(name)
+    
+    applied: Dict[str, List[str]] = {}
+    failed_unique: List[str] = []
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        applied[collection_name] = []
+        for model in models:
+            name = model.document["name"]
+            try:
+                await collection.create_indexes([model])
+            except OperationFailure as e:
+                if e.code not in INDEX_CONFLICT_CODES:
+                    logger.error(f"Could not create index {collection_name}.{name}: {e}")
+                    if model.document.get("unique"):
+                        failed_unique.append(f"{collection_name}.{name}")
+                    continue
+                logger.info(f"Rebuilding index {collection_name}.{name} with its new definition")
+                try:
+                    await _drop_conflicting_index(collection, model)
+                    await collection.create_indexes([model])
+                except OperationFailure as e:
+                    logger.error(f"Could not rebuild index {collection_name}.{name}: {e}")
+                    if model.document.get("unique"):
+                        failed_unique.append(f"{collection_name}.{name}")
+                    continue
+            applied[collection_name].append(name)
+    if failed_unique:
+        raise UniqueIndexError(
+            f"Unique indexes missing: {', '.join(failed_unique)}. "
+            "List the conflicting rows with `python manage.py find-duplicates`, resolve them and restart."
+        )
+    return applied
+
+async def find_duplicates(db) -> List[Dict[str, Any]]:
+    """Rows that keep a declared unique index from being built.
+
+    Groups each collection by the index key, under the index's partial filter and
+    collation (so `Admin` and `admin` collide where the index ignores case).
+    """
+    conflicts = []
+    for collection_name, models in INDEXES.items():
+        for model in models:
+            document = model.document
+            if not document.get("unique"):
+                continue
+            fields = list(document["key"])
+            pipeline = [
+                {"$match": document.get("partialFilterExpression", {})},
+                {"$group": {"_id": {field: f"${field}" for field in fields},
+                            "ids": {"$push": "$id"}, "count": {"$sum": 1}}},
+                {"$match": {"count": {"$gt": 1}}},
+            ]
+            options = {"collation": document["collation"]} if document.get("collation") else {}
+            async for group in db[collection_name].aggregate(pipeline, **options):
+                conflicts.append({"collection": collection_name, "index": document["name"],
+                                  "key": group["_id"], "ids": group["ids"]})
+    return conflicts
+
+async def _drop_conflicting_index(collection, model: IndexModel):
+    """Drop the existing index that shares the model's name or key pattern."""
+    name = model.document["name"]
+    key = dict(model.document["key"])
+    async for existing in collection.list_indexes():
+        if existing["name"] == "_id_":
+            continue
+        if existing["name"] == name or (
+            dict(existing["key"]) == key
+            and _collation_key(existing.get("collation")) == _collation_key(model.document.get("collation"))
+        ):
+            await collection.drop_index(existing["name"])
+
+def _collation_key(collation) -> Optional[tuple]:
+    # The server echoes collations back with every default filled in, so compare the meaningful parts
+    if not collation:
+        return None
+    return collation.get("locale"), collation.get("strength", 3)
+
+async def index_usage_report(db) -> List[Dict[str, Any]]:
+    """Report usage of every index since the server last restarted.
+
+    Each row carries the access count from $indexStats and whether the index is
+    declared in INDEXES, so unused or undeclared indexes can be reviewed and dropped.
+    """
+    report = []
+    for collection_name in sorted(set(INDEXES) | set(await db.list_collection_names())):
+        declared = {model.document["name"] for model in INDEXES.get(collection_name, [])}
+        try:
+            stats = await db[collection_name].aggregate([{"$indexStats": {}}]).to_list(None)
+        except OperationFailure as e:
+            logger.warning(f"Index stats unavailable for {collection_name}: {e}")
+            continue
+        for stat in stats:
+            if stat["name"] == "_id_":
+                continue
+            report.append({
+                "collection": collection_name,
+                "index": stat["name"],
+                "ops": stat["accesses"]["ops"],
+                "since": stat["accesses"]["since"],
+                "declared": stat["name"] in declared,
+            })
+    return sorted(report, key=lambda row: (row["ops"], row["collection"], row["index"]))
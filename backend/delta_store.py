@@ -0,0 +1,287 @@
+"""Binary delta storage for superseded file versions.
+
+When a document or policy gets a new version, the previous version's blob can be
+re-encoded as a zstd delta against the new one: the new file is used as a raw
+content dictionary, so only the changed regions cost space. The latest version
+always stays whole, and every KEYFRAME_INTERVAL-th version is kept whole as
+well, which bounds how many deltas a reconstruction has to apply.
+
+A delta-encoded blob keeps its hash and its `blobs` record. The record gains
+encoding="zstd-delta" and base_sha256, and its bytes move from blobs/... to
+deltas/... . Readers call resolve() on a blob key, which also rehydrates blobs
+moved to the cold tier (cold_storage.py). Hot versions are
+reconstructed into cache/... and verified against their hash; the least recently
+used are evicted beyond RECONSTRUCTED_CACHE_MB.
+
+Eviction never removes a file a reader still needs. resolve() leases the entry
+for READ_LEASE, enough for callers that read the file at once or hand out a
+presigned URL to it. checkout() is for responses streamed to a client and also
+holds the entry until the returned release() runs. evict() first claims an entry that nobody holds, then deletes
+the file. A resolve() that meets a claimed entry waits for the eviction to
+finish and rebuilds the file.
+
+Uploading content that was delta-encoded (a revert) stores it whole again
+(BlobStore.commit). A revert that lands while its old version is being encoded
+is caught by a second check before the whole file is deleted.
+
+Configuration (environment):
+    DELTA_VERSIONS              true to delta-encode superseded versions (needs `pip install zstandard`)
+    RECONSTRUCTED_CACHE_MB      size budget of reconstructed versions (default 512)
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import aiofiles
+from pymongo.errors import DuplicateKeyError
+
+from blob_store import BlobStore
+from cold_storage import COLD_TIER, ColdTier
+from storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DELTA_ENCODING = "zstd-delta"
+DELTA_PREFIX = "deltas/"
+CACHE_PREFIX = "cache/"
+
+# Every n-th version stays whole so a reconstruction applies at most n - 1 deltas
+KEYFRAME_INTERVAL = 8
+# Both files are held in memory while encoding; larger versions stay whole
+MAX_DELTA_SOURCE_BYTES = 64 * 1024 * 1024
+# A delta that saves less than this fraction is not worth the reconstruction cost
+MIN_SAVING = 0.5
+COMPRESSION_LEVEL = 15
+
+# How long resolve() keeps a reconstructed file from eviction; outlives a presigned URL (PRESIGNED_URL_TTL)
+READ_LEASE = timedelta(minutes=10)
+# Longest a checkout() holds an entry when its release() never runs (the worker died)
+CHECKOUT_TIMEOUT = timedelta(hours=6)
+# A claim older than this belongs to an evictor that died before removing the entry
+EVICTION_TIMEOUT = timedelta(minutes=1)
+EVICTION_WAIT_SECONDS = 0.05
+
+Release = Callable[[], Awaitable[None]]
+
+async def _nothing_to_release():
+    pass
+
+def _params(size: int):
+    window_log = max(20, min(31, size.bit_length() + 1))
+    return window_log, zstandard.ZstdCompressionParameters.from_level(COMPRESSION_LEVEL, window_log=window_log)
+
+def encode_delta(target: bytes, base: bytes) -> bytes:
+    dictionary = zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+    _, params = _params(len(target) + len(base))
+    return zstandard.ZstdCompressor(dict_data=dictionary, compression_params=params).compress(target)
+
+def decode_delta(delta: bytes, base: bytes, size: int) -> bytes:
+    dictionary = zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+    window_log, _ = _params(size + len(base))
+    return zstandard.ZstdDecompressor(dict_data=dictionary, max_window_size=2 ** window_log).decompress(delta)
+
+def delta_key(sha256: str) -> str:
+    return f"{DELTA_PREFIX}{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+def cache_key(sha256: str) -> str:
+    return f"{CACHE_PREFIX}{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+class DeltaStore:
+    def __init__(self, db, store: BlobStore, storage: StorageBackend, scratch_dir: Path, cold: Optional[ColdTier] = None):
+        self.db = db
+        self.blobs = db.blobs
+        self.cache = db.reconstructed_cache
+        self.store = store
+        self.storage = storage
+        self.scratch_dir = scratch_dir
+        self.cold = cold or ColdTier(db, store, storage, scratch_dir)
+        self.enabled = zstandard is not None and os.environ.get("DELTA_VERSIONS", "false").lower() == "true"
+        self.cache_bytes = int(os.environ.get("RECONSTRUCTED_CACHE_MB", "512")) * 1024 * 1024
+        self._pending: Dict[str, asyncio.Task] = {}  # also keeps running tasks referenced
+        self._rebuilding: Dict[str, asyncio.Lock] = {}
+        if zstandard is None and os.environ.get("DELTA_VERSIONS", "false").lower() == "true":
+            logger.warning("DELTA_VERSIONS is set but zstandard is not installed: versions stay whole (pip install zstandard)")
+
+    def schedule(self, previous_sha256: Optional[str], new_sha256: str, previous_version: int):
+        """After a new version is written, encode the one it superseded in the background."""
+        if (not self.enabled or not previous_sha256 or previous_sha256 == new_sha256
+                or previous_version % KEYFRAME_INTERVAL == 0 or previous_sha256 in self._pending):
+            return
+        task = asyncio.create_task(self.encode(previous_sha256, new_sha256))
+        self._pending[previous_sha256] = task
+        task.add_done_callback(lambda _: self._pending.pop(previous_sha256, None))
+
+    async def _in_use(self, sha256: str) -> bool:
+        """Whether some record still shows this content as its current file."""
+        for collection in (self.db.documents, self.db.policies):
+            if await collection.find_one({"file_sha256": sha256}, {"_id": 1}):
+                return True
+        return False
+
+    async def encode(self, sha256: str, base_sha256: str) -> bool:
+        """Replace a whole blob by a delta against `base_sha256`; returns True if it was encoded."""
+        try:
+            record = await self.blobs.find_one({"_id": sha256})
+            if not record or record.get("encoding") or record.get("tier") or await self._in_use(sha256):
+                return False
+            whole = self.store.key_for(sha256)
+            target_stat, base_stat = await asyncio.gather(
+                self.storage.stat(whole), self.storage.stat(self.store.key_for(base_sha256))
+            )
+            if target_stat is None or base_stat is None or \
+                    max(target_stat.size, base_stat.size) > MAX_DELTA_SOURCE_BYTES:
+                return False
+            target, base = await asyncio.gather(
+                self.storage.get(whole), self.storage.get(self.store.key_for(base_sha256))
+            )
+            delta = await asyncio.to_thread(encode_delta, target, base)
+            if len(delta) > len(target) * (1 - MIN_SAVING):
+                return False
+
+            temp_path = self.scratch_dir / f"{uuid.uuid4().hex}.part"
+            async with aiofiles.open(temp_path, "wb") as f:
+                await f.write(delta)
+            await self.storage.put(delta_key(sha256), temp_path)
+            # Switch readers to the delta before the whole file goes away
+            await self.blobs.update_one(
+                {"_id": sha256},
+                {"$set": {"encoding": DELTA_ENCODING, "base_sha256": base_sha256,
+                          "size": len(target), "stored_size": len(delta)}}
+            )
+            if await self._in_use(sha256):
+                # Reverted to this content while encoding: keep the current file whole
+                await self.blobs.update_one(
+                    {"_id": sha256}, {"$unset": {"encoding": "", "base_sha256": "", "stored_size": ""}}
+                )
+                await self.storage.delete(delta_key(sha256))
+                return False
+            await self.storage.delete(whole)
+            logger.info(f"Delta-encoded {sha256}: {len(target)} -> {len(delta)} bytes")
+            return True
+        except Exception:
+            logger.exception(f"Delta encoding failed for {sha256}")
+            return False
+
+    async def encode_history(self) -> Dict[str, int]:
+        """Delta-encode existing version history, each version against the one after it."""
+        counts = {"encoded": 0, "skipped": 0}
+        previous = None
+        async for version in self.db.document_versions.find(
+            {"file_sha256": {"$ne": None}}, {"_id": 0, "document_id": 1, "version_number": 1, "file_sha256": 1}
+        ).sort([("document_id", 1), ("version_number", 1)]):
+            if (previous and previous["document_id"] == version["document_id"]
+                    and previous["version_number"] % KEYFRAME_INTERVAL != 0
+                    and previous["file_sha256"] != version["file_sha256"]):
+                encoded = await self.encode(previous["file_sha256"], version["file_sha256"])
+                counts["encoded" if encoded else "skipped"] += 1
+            previous = version
+        return counts
+
+    async def resolve(self, key: Optional[str]) -> Optional[str]:
+        """Storage key holding the whole bytes for `key`.
+
+        Delta-encoded blobs are reconstructed and cold-tier blobs (cold_storage.py)
+        decompressed into cache/; other keys are returned as they are. A file in
+        cache/ is kept for READ_LEASE.
+        """
+        resolved, _ = await self._resolve(key, checkout=False)
+        return resolved
+
+    async def checkout(self, key: Optional[str]) -> Tuple[Optional[str], Release]:
+        """resolve() for a file that is streamed out: it stays in cache/ until `release()` is awaited."""
+        return await self._resolve(key, checkout=True)
+
+    async def _resolve(self, key: Optional[str], checkout: bool) -> Tuple[Optional[str], Release]:
+        if key is None or not key.startswith("blobs/"):
+            return key, _nothing_to_release
+        sha256 = key.rsplit("/", 1)[-1]
+        record = await self.blobs.find_one(
+            {"_id": sha256}, {"encoding": 1, "base_sha256": 1, "size": 1, "tier": 1, "last_access": 1}
+        )
+        if not record:
+            return key, _nothing_to_release
+        await self.cold.touch(sha256, record)
+        if record.get("encoding") != DELTA_ENCODING and record.get("tier") != COLD_TIER:
+            return key, _nothing_to_release
+        # Hold the entry before looking for its file, so an eviction cannot remove it after the check
+        await self._hold(sha256, record["size"], checkout)
+        cached = cache_key(sha256)
+        reconstructed = False
+        async with self._rebuilding.setdefault(sha256, asyncio.Lock()):
+            if await self.storage.stat(cached) is None:
+                if record.get("encoding") == DELTA_ENCODING:
+                    await self._reconstruct(sha256, record)
+                else:
+                    await self.cold.rehydrate(sha256, cached)
+                reconstructed = True
+        self._rebuilding.pop(sha256, None)
+        if reconstructed:
+            await self.evict()
+        if not checkout:
+            return cached, _nothing_to_release
+
+        async def release():
+            await self.cache.update_one({"_id": sha256}, {"$inc": {"readers": -1}})
+        return cached, release
+
+    async def _hold(self, sha256: str, size: int, checkout: bool):
+        """Stamp the cache entry as read and held; waits while an eviction of it is under way."""
+        while True:
+            now = datetime.utcnow()
+            hold = {
+                "$set": {"last_access": now, "size": size},
+                "$max": {"lease_until": now + READ_LEASE},
+                "$unset": {"evicting_at": ""},
+            }
+            if checkout:
+                hold["$inc"] = {"readers": 1}
+                hold["$max"]["held_until"] = now + CHECKOUT_TIMEOUT
+            unclaimed = [{"evicting_at": {"$exists": False}}, {"evicting_at": {"$lt": now - EVICTION_TIMEOUT}}]
+            try:
+                await self.cache.update_one({"_id": sha256, "$or": unclaimed}, hold, upsert=True)
+                return
+            except DuplicateKeyError:
+                # Claimed by evict(): the file is being deleted; hold the fresh entry once it is gone
+                await asyncio.sleep(EVICTION_WAIT_SECONDS)
+
+    async def _reconstruct(self, sha256: str, record: Dict):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read delta-encoded versions")
+        base_key = await self.resolve(self.store.key_for(record["base_sha256"]))
+        base, delta = await asyncio.gather(self.storage.get(base_key), self.storage.get(delta_key(sha256)))
+        data = await asyncio.to_thread(decode_delta, delta, base, record["size"])
+        if await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest()) != sha256:
+            raise RuntimeError(f"Reconstructed version does not match its hash: {sha256}")
+        temp_path = self.scratch_dir / f"{uuid.uuid4().hex}.part"
+        async with aiofiles.open(temp_path, "wb") as f:
+            await f.write(data)
+        await self.storage.put(cache_key(sha256), temp_path)
+
+    async def evict(self):
+        """Drop least recently used reconstructions beyond the cache budget (never the newest, nor held ones)."""
+        total = 0
+        now = datetime.utcnow()
+        unheld = {
+            "evicting_at": {"$exists": False},
+            "lease_until": {"$not": {"$gt": now}},
+            "$or": [{"readers": {"$not": {"$gt": 0}}}, {"held_until": {"$not": {"$gt": now}}}],
+        }
+        async for entry in self.cache.find({}, {"size": 1}).sort("last_access", -1):
+            total += entry.get("size", 0)
+            if total > self.cache_bytes and total > entry.get("size", 0):
+                claimed = await self.cache.find_one_and_update(
+                    {"_id": entry["_id"], **unheld}, {"$set": {"evicting_at": now}}
+                )
+                if claimed:
+                    await self.storage.delete(cache_key(entry["_id"]))
+                    await self.cache.delete_one({"_id": entry["_id"], "evicting_at": now})
@@ -0,0 +1,102 @@
+"""Incremental sync of the public document catalogue for mirrors and offline clients.
+
+A client without a token first pages through a snapshot of every public
+document in id order. The token it gets back afterwards points into the change
+journal (change_journal.py), at the position where the snapshot started.
+Each later call returns only documents touched since then:
+
+- documents that are public now come back in full (created or modified);
+- documents that are not come back as tombstones in `removed` (deleted,
+  hidden, or moved out of active/archived). A client simply drops those ids.
+  Only a write that may have taken a public document out of public view
+  produces one, so the endpoint never lists ids of documents that were
+  never public (see left_public_view).
+
+Replaying a change that the snapshot already covered is harmless, because
+applying a document twice gives the same result. So the snapshot needs no
+consistent read, and each call costs about as much as the number of changes,
+not the size of the catalogue. Once the journal has expired a token's position
+the call answers 410 and the client starts over without a token.
+
+Tokens are opaque to clients (URL-safe base64 of a small JSON state).
+"""
+import base64
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+from change_journal import ChangeJournal, CursorExpired
+
+PUBLIC_STATUSES = ["active", "archived"]
+PUBLIC_DOCUMENTS = {"status": {"$in": PUBLIC_STATUSES}, "is_visible_to_users": True}
+# The fields PUBLIC_DOCUMENTS looks at
+PUBLIC_FIELDS = {"status", "is_visible_to_users"}
+
+def is_public(document: Dict[str, Any]) -> bool:
+    return document.get("status") in PUBLIC_STATUSES and document.get("is_visible_to_users") is True
+
+def left_public_view(event: Dict[str, Any], document: Optional[Dict[str, Any]]) -> bool:
+    """Whether `event` may have taken a document that is not public now out of public view.
+
+    Only a write to status or is_visible_to_users can. A field the write left
+    alone still has its current value, so that value must allow public view for
+    the document to have been public just before the write.
+    """
+    changed = PUBLIC_FIELDS.intersection(event["fields"])
+    if not changed:
+        return False
+    if document is None:
+        return True
+    return (("status" in changed or document.get("status") in PUBLIC_STATUSES)
+            and ("is_visible_to_users" in changed or document.get("is_visible_to_users") is True))
+
+def encode_token(state: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_token(token: str) -> Dict[str, Any]:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if state["phase"] not in ("snapshot", "changes") or not isinstance(state["seq"], int):
+            raise ValueError(token)
+        return state
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+async def sync_page(db, journal: ChangeJournal, since: Optional[str], limit: int) -> Dict[str, Any]:
+    """One bounded page of public documents and tombstones, plus the token for the next call."""
+    if since:
+        state = decode_token(since)
+    else:
+        state = {"phase": "snapshot", "seq": await journal.head(), "after_id": ""}
+
+    if state["phase"] == "snapshot":
+        documents = await db.documents.find(
+            {**PUBLIC_DOCUMENTS, "id": {"$gt": state.get("after_id", "")}}, {"_id": 0}
+        ).sort("id", 1).to_list(limit)
+        if len(documents) == limit:
+            following = {"phase": "snapshot", "seq": state["seq"], "after_id": documents[-1]["id"]}
+        else:
+            following = {"phase": "changes", "seq": state["seq"]}
+        return {"documents": documents, "removed": [], "token": encode_token(following),
+                "has_more": len(documents) == limit, "snapshot": True}
+
+    try:
+        events, cursor = await journal.read(state["seq"], limit, ["document"])
+    except CursorExpired:
+        raise HTTPException(status_code=410, detail="Sync token expired, start again without a token")
+    touched = list(dict.fromkeys(event["entity_id"] for event in events))
+    current = {document["id"]: document
+               async for document in db.documents.find({"id": {"$in": touched}}, {"_id": 0})}
+    public = [current[document_id] for document_id in touched
+              if document_id in current and is_public(current[document_id])]
+    left = {event["entity_id"] for event in events
+            if not is_public(current.get(event["entity_id"]) or {})
+            and left_public_view(event, current.get(event["entity_id"]))}
+    return {
+        "documents": public,
+        "removed": [document_id for document_id in touched if document_id in left],
+        "token": encode_token({"phase": "changes", "seq": cursor}),
+        "has_more": cursor < await journal.head(),
+        "snapshot": False,
+    }
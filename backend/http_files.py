@@ -0,0 +1,187 @@
+"""Conditional and ranged file responses for the download endpoints.
+
+Starlette's FileResponse always sends the whole file. Viewers such as pdf.js ask
+for byte ranges and revalidate with If-None-Match, so downloads go through
+file_response(), which adds strong content-hash ETags, 304 handling and single
+and multi-range 206 responses (RFC 9110) on top of any storage backend.
+"""
+import mimetypes
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from storage import StorageBackend
+
+# More ranges than this in one request is served as a plain 200 rather than a huge multipart body
+MAX_RANGES = 16
+
+CONTENT_TYPES = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".doc": "application/msword",
+    ".txt": "text/plain; charset=utf-8",
+}
+
+def content_type_for(file_name: str) -> str:
+    suffix = Path(file_name).suffix.lower()
+    return CONTENT_TYPES.get(suffix) or mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+
+def content_disposition(file_name: str, disposition: str = "attachment") -> str:
+    quoted = quote(file_name)
+    if quoted != file_name:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{file_name}"'
+
+def _etag_matches(header: str, etag: str, weak: bool) -> bool:
+    """Compare an If-None-Match / If-Range header against our ETag.
+
+    `weak` selects weak comparison (If-None-Match); strong comparison never matches W/ tags.
+    """
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if weak:
+            candidate = candidate.removeprefix("W/")
+            if candidate == etag.removeprefix("W/"):
+                return True
+        elif candidate == etag and not etag.startswith("W/"):
+            return True
+    return False
+
+def not_modified(request: Request, etag: str, headers: Dict[str, str]) -> Optional[Response]:
+    """A 304 carrying `headers` when the request's If-None-Match already holds `etag`, else None."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and _etag_matches(if_none_match, etag, weak=True):
+        return Response(status_code=304, headers={"ETag": etag, **headers})
+    return None
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a `bytes=` Range header into inclusive (start, end) pairs.
+
+    Returns None when the header is not a byte range we understand (the request is
+    then served in full) and an empty list when no range is satisfiable (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        start, sep, end = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if start:
+                first = int(start)
+                last = int(end) if end else size - 1
+                if end and first > last:
+                    return None
+            else:
+                suffix = int(end)
+                first, last = max(size - suffix, 0), size - 1
+        except ValueError:
+            return None
+        if first < size and last >= 0:
+            ranges.append((first, min(last, size - 1)))
+    # Coalesce overlapping or adjacent ranges so clients cannot request the same bytes repeatedly
+    ranges.sort()
+    merged: List[Tuple[int, int]] = []
+    for first, last in ranges:
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+async def _read_multipart(storage: StorageBackend, key: str, ranges: List[Tuple[int, int]], size: int,
+                          media_type: str, boundary: str) -> AsyncIterator[bytes]:
+    for first, last in ranges:
+        yield (
+            f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+            f"Content-Range: bytes {first}-{last}/{size}\r\n\r\n"
+        ).encode()
+        async for chunk in storage.stream(key, first, last):
+            yield chunk
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
+
+async def file_response(
+    request: Request,
+    storage: StorageBackend,
+    key: str,
+    file_name: str,
+    sha256: Optional[str] = None,
+    cache_control: str = "private, no-cache",
+    disposition: str = "attachment"
+) -> Response:
+    """Serve the stored object `key` honouring If-None-Match, If-Modified-Since, Range and If-Range.
+
+    The ETag is the content hash when known, which stays valid across servers and
+    re-uploads of identical bytes; otherwise a weak validator is derived from mtime and size.
+    """
+    stat = await storage.stat(key)
+    if stat is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    size = stat.size
+    mtime = stat.modified.timestamp()
+    etag = f'"{sha256}"' if sha256 else f'W/"{int(mtime)}-{size}"'
+    media_type = content_type_for(file_name)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": content_disposition(file_name, disposition),
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag, weak=True):
+            return Response(status_code=304, headers=headers)
+    elif "if-modified-since" in request.headers:
+        if _not_modified_since(request.headers["if-modified-since"], mtime):
+            return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range:
+        # Only honour the range if the client's copy is still current (strong validators only)
+        if if_range.startswith(('"', 'W/')):
+            range_header = range_header if _etag_matches(if_range, etag, weak=False) else None
+        elif not _not_modified_since(if_range, mtime):
+            range_header = None
+
+    ranges = parse_range(range_header, size) if range_header else None
+    if ranges is None or len(ranges) > MAX_RANGES:
+        path = storage.local_path(key)
+        if path is not None:
+            return FileResponse(path, headers=headers, media_type=media_type)
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(storage.stream(key), headers=headers, media_type=media_type)
+    if not ranges:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if len(ranges) == 1:
+        first, last = ranges[0]
+        headers.update({"Content-Range": f"bytes {first}-{last}/{size}", "Content-Length": str(last - first + 1)})
+        return StreamingResponse(storage.stream(key, first, last), status_code=206,
+                                 headers=headers, media_type=media_type)
+
+    boundary = uuid.uuid4().hex
+    return StreamingResponse(
+        _read_multipart(storage, key, ranges, size, media_type, boundary),
+        status_code=206,
+        headers=headers,
+        media_type=f"multipart/byteranges; boundary={boundary}"
+    )
@@ -0,0 +1,162 @@
+"""Cross-worker invalidation of in-process caches.
+
+A cache registers a callback for a topic, which is a journal entity name
+("user", "category", "document", ...). The callback gets the set of ids that
+changed, or None when everything under the topic must be dropped:
+
+    bus.subscribe("user", principals.invalidate)
+
+Messages come from two places:
+
+- local writes: ChangeJournal.append() notifies the bus of its own worker, so
+  a worker never serves its own stale data;
+- other workers and nodes, through a source chosen by INVALIDATION_SOURCE:
+    change_stream  a MongoDB change stream on the registry collections. Updates
+                   arrive within milliseconds and also cover writes that bypass
+                   the API (manage.py, shell). Needs a replica set or sharded
+                   cluster.
+    journal        polls the change journal every INVALIDATION_POLL_SECONDS.
+                   Works on a standalone server and only sees journaled writes.
+    auto           (default) change_stream when the server supports it,
+                   journal otherwise.
+    off            local writes only; for single-worker deployments.
+
+A change stream sees the registry write before the journal event that follows
+it, so a cache filled from the journal counter (public_cache.CollectionVersions)
+could re-read the old value in between. The stream therefore also watches the
+journal's counter document and publishes VERSION_TOPIC with the entities whose
+newest seq moved.
+
+Whenever a source may have missed messages (stream error, journal cursor
+expired), every topic is flushed before it resumes. A cache therefore never
+stays stale for longer than the poll interval plus one round trip.
+"""
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from change_journal import COUNTER_ID, ENTITY_COLLECTIONS, MAX_READ, ChangeJournal, CursorExpired
+
+logger = logging.getLogger(__name__)
+
+Callback = Callable[[Optional[Set[str]]], None]
+
+# Registry collections and the journal entity (topic) each one feeds
+COLLECTION_TOPICS = {collection: entity for entity, collection in ENTITY_COLLECTIONS.items()}
+# Topic for "the newest seq of these entities moved"; ids are entity names
+VERSION_TOPIC = "entity_version"
+RETRY_SECONDS = 5
+
+class InvalidationBus:
+    def __init__(self, db, journal: ChangeJournal):
+        self.db = db
+        self.journal = journal
+        self.mode = os.environ.get("INVALIDATION_SOURCE", "auto").lower()
+        self.poll_interval = float(os.environ.get("INVALIDATION_POLL_SECONDS", "1"))
+        self.sources = {"change_stream": self._change_stream, "journal": self._poll_journal}
+        self._subscribers: Dict[str, List[Callback]] = {}
+        self._task: Optional[asyncio.Task] = None
+        journal.listeners.append(lambda entity, entity_id: self.publish(entity, [entity_id]))
+
+    def subscribe(self, topic: str, callback: Callback):
+        self._subscribers.setdefault(topic, []).append(callback)
+
+    def publish(self, topic: str, ids: Optional[Iterable[str]] = None):
+        """Deliver to this worker's subscribers; ids None drops the whole topic."""
+        ids = set(ids) if ids is not None else None
+        for callback in self._subscribers.get(topic, ()):
+            try:
+                callback(ids)
+            except Exception:
+                logger.exception(f"Invalidation callback failed for {topic}")
+
+    def flush_all(self):
+        for topic in list(self._subscribers):
+            self.publish(topic)
+
+    def start(self):
+        if self.mode != "off":
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        mode = self.mode
+        if mode == "auto":
+            mode = "change_stream" if await self._supports_change_streams() else "journal"
+        logger.info(f"Cache invalidation bus listening via {mode}")
+        await self.sources[mode]()
+
+    async def _supports_change_streams(self) -> bool:
+        try:
+            hello = await self.db.client.admin.command("hello")
+        except PyMongoError:
+            return False
+        return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+    async def _change_stream(self):
+        pipeline = [{"$match": {"$or": [{"ns.coll": {"$in": list(COLLECTION_TOPICS)}},
+                                        {"ns.coll": "counters", "documentKey._id": COUNTER_ID}]}}]
+        resume_token = None
+        while True:
+            try:
+                async with self.db.watch(pipeline, full_document="updateLookup",
+                                         resume_after=resume_token) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        self._deliver_change(change)
+            except OperationFailure as e:
+                logger.warning(f"Invalidation change stream failed ({e}), restarting without resume point")
+                resume_token = None
+                self.flush_all()
+            except PyMongoError as e:
+                logger.warning(f"Invalidation change stream interrupted ({e}), resuming")
+                self.flush_all()
+            await asyncio.sleep(RETRY_SECONDS)
+
+    def _deliver_change(self, change: Dict):
+        collection = change.get("ns", {}).get("coll")
+        if collection == "counters":
+            self._deliver_versions(change)
+            return
+        topic = COLLECTION_TOPICS.get(collection)
+        if topic is None:
+            return
+        record_id = (change.get("fullDocument") or {}).get("id")
+        # Hard deletes and documents gone before the lookup carry no registry id
+        self.publish(topic, [record_id] if record_id else None)
+
+    def _deliver_versions(self, change: Dict):
+        updated = (change.get("updateDescription") or {}).get("updatedFields") or {}
+        entities = {field.split(".", 1)[1] for field in updated if field.startswith("entities.")}
+        if not entities:
+            # Inserted, replaced, or the whole `entities` map rewritten: every version may have moved
+            entities = set((change.get("fullDocument") or {}).get("entities") or {}) or None
+        self.publish(VERSION_TOPIC, entities)
+
+    async def _poll_journal(self):
+        cursor = await self.journal.head()
+        while True:
+            try:
+                events, cursor = await self.journal.read(cursor, MAX_READ)
+            except CursorExpired:
+                cursor = await self.journal.head()
+                self.flush_all()
+                continue
+            except PyMongoError:
+                logger.exception("Invalidation journal poll failed")
+                self.flush_all()
+                await asyncio.sleep(RETRY_SECONDS)
+                continue
+            changed: Dict[str, Set[str]] = {}
+            for event in events:
+                changed.setdefault(event["entity"], set()).add(event["entity_id"])
+            for topic, ids in changed.items():
+                self.publish(topic, ids)
+            if len(events) < MAX_READ:
+                await asyncio.sleep(self.poll_interval)
+
+    def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
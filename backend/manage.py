@@ -0,0 +1,189 @@
+"""Operational commands for the policy register backend.
+
+Usage (from the backend directory):
+    python manage.py ensure-indexes
+    python manage.py find-duplicates
+    python manage.py index-report
+    python manage.py migrate-versions
+    python manage.py migrate-blobs
+    python manage.py rebuild-refcounts
+    python manage.py copy-blobs
+    python manage.py generate-previews
+    python manage.py reconcile [--quarantine] [--limit N] [--resume]
+    python manage.py encode-deltas
+    python manage.py cold-tier [--limit N]
+"""
+import asyncio
+import os
+from datetime import timedelta
+from pathlib import Path
+
+import typer
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from db_indexes import UniqueIndexError, ensure_indexes, find_duplicates, index_usage_report
+from storage import LocalStorage, storage_from_env
+from blob_store import BlobStore, copy_blobs, migrate_legacy_files, rebuild_refcounts, key_for_url
+from previews import PreviewService
+from versions import migrate_embedded_versions
+from reconcile import reconcile
+from delta_store import DeltaStore
+from cold_storage import ColdTier
+from change_journal import ChangeJournal
+
+ROOT_DIR = Path(__file__).parent
+UPLOAD_DIR = ROOT_DIR / "uploads"
+load_dotenv(ROOT_DIR / '.env')
+
+cli = typer.Typer(help="Policy register maintenance commands")
+
+def run_with_db(command):
+    """Run an async command against the configured database and close the client afterwards."""
+    async def runner():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        try:
+            return await command(client[os.environ['DB_NAME']])
+        finally:
+            client.close()
+    return asyncio.run(runner())
+
+@cli.command("ensure-indexes")
+def ensure_indexes_command():
+    """Create or rebuild all declared indexes (idempotent)."""
+    try:
+        applied = run_with_db(ensure_indexes)
+    except UniqueIndexError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+    for collection_name, names in applied.items():
+        typer.echo(f"{collection_name}: {', '.join(names) or '-'}")
+
+@cli.command("find-duplicates")
+def find_duplicates_command():
+    """List rows that keep a unique index from being built; resolve them before ensure-indexes."""
+    conflicts = run_with_db(find_duplicates)
+    for conflict in conflicts:
+        key = ", ".join(f"{field}={value!r}" for field, value in conflict["key"].items())
+        typer.echo(f"{conflict['collection']}.{conflict['index']}: {key} -> ids {', '.join(map(str, conflict['ids']))}")
+    typer.echo(f"{len(conflicts)} conflicting keys")
+    if conflicts:
+        raise typer.Exit(1)
+
+@cli.command("index-report")
+def index_report_command(unused_only: bool = typer.Option(False, "--unused-only", help="Only list indexes with no recorded use")):
+    """List index usage since the last server restart, least used first."""
+    report = run_with_db(index_usage_report)
+    for row in report:
+        if unused_only and row["ops"]:
+            continue
+        flag = "" if row["declared"] else "  (not declared)"
+        typer.echo(f"{row['collection']}.{row['index']}: {row['ops']} ops since {row['since']:%Y-%m-%d %H:%M}{flag}")
+
+@cli.command("migrate-versions")
+def migrate_versions_command():
+    """Move embedded version_history arrays into the document_versions collection."""
+    moved = run_with_db(migrate_embedded_versions)
+    typer.echo(f"Moved {moved} versions")
+
+@cli.command("migrate-blobs")
+def migrate_blobs_command():
+    """Move files stored under their upload name into the content-addressed blob store."""
+    async def migrate(db):
+        await migrate_embedded_versions(db)
+        return await migrate_legacy_files(db, BlobStore(db, storage_from_env(UPLOAD_DIR)), LocalStorage(UPLOAD_DIR))
+
+    stats = run_with_db(migrate)
+    typer.echo(f"Rewrote {stats['records']} records, moved {stats['files']} files, {stats['missing']} missing")
+
+@cli.command("rebuild-refcounts")
+def rebuild_refcounts_command():
+    """Recompute blob reference counts from document and policy versions."""
+    counts = run_with_db(rebuild_refcounts)
+    unreferenced = sum(1 for refcount in counts.values() if refcount == 0)
+    typer.echo(f"{len(counts)} blobs, {unreferenced} unreferenced")
+
+@cli.command("copy-blobs")
+def copy_blobs_command():
+    """Upload local blobs that the configured storage backend (e.g. S3) does not have yet."""
+    copied = asyncio.run(copy_blobs(LocalStorage(UPLOAD_DIR), storage_from_env(UPLOAD_DIR)))
+    typer.echo(f"Copied {copied} blobs")
+
+@cli.command("generate-previews")
+def generate_previews_command(workers: int = typer.Option(2, help="Rendering processes")):
+    """Render missing thumbnails for current PDF versions of documents and policies."""
+    async def generate(db):
+        service = PreviewService(db, storage_from_env(UPLOAD_DIR), UPLOAD_DIR / ".incoming", ChangeJournal(db), workers)
+        if not service.enabled:
+            typer.echo("PyMuPDF is not installed, nothing to render")
+            raise typer.Exit(1)
+        counts = {}
+        try:
+            for collection in (db.documents, db.policies):
+                query = {"file_sha256": {"$ne": None}, "file_name": {"$regex": r"\.pdf$", "$options": "i"}}
+                async for record in collection.find(query, {"file_sha256": 1, "file_url": 1}):
+                    key = key_for_url(record["file_url"])
+                    if key is not None:
+                        status = await service.generate(record["file_sha256"], key)
+                        counts[status] = counts.get(status, 0) + 1
+        finally:
+            service.shutdown()
+        return counts
+
+    counts = run_with_db(generate)
+    typer.echo(", ".join(f"{count} {status}" for status, count in sorted(counts.items())) or "Nothing to do")
+
+@cli.command("reconcile")
+def reconcile_command(
+    quarantine: bool = typer.Option(False, "--quarantine", help="Move orphans under quarantine/ instead of only reporting them"),
+    grace_hours: float = typer.Option(1.0, help="Ignore unreferenced objects younger than this"),
+    rate: int = typer.Option(200, help="Objects examined per second"),
+    limit: int = typer.Option(None, help="Stop after this many objects; continue later with --resume"),
+    resume: bool = typer.Option(False, "--resume", help="Continue after the key where the last capped run stopped"),
+):
+    """Report (and optionally quarantine) unreferenced files and report missing ones."""
+    report = run_with_db(lambda db: reconcile(
+        db, storage_from_env(UPLOAD_DIR), quarantine=quarantine, grace=timedelta(hours=grace_hours),
+        rate=rate, limit=limit, resume=resume
+    ))
+    for key in report["orphans"]:
+        typer.echo(f"orphan   {key}")
+    for key in report["missing"]:
+        typer.echo(f"missing  {key}")
+    typer.echo(
+        f"Scanned {report['scanned']} objects: {len(report['orphans'])} orphans ({report['orphan_bytes']} bytes, "
+        f"{report['quarantined']} quarantined), {len(report['missing'])} missing"
+    )
+    if not report["complete"]:
+        typer.echo(f"Stopped after {report['last_key']}; run again with --resume to continue")
+
+@cli.command("encode-deltas")
+def encode_deltas_command():
+    """Store superseded versions as deltas against their successors (needs DELTA_VERSIONS=true)."""
+    async def encode(db):
+        storage = storage_from_env(UPLOAD_DIR)
+        delta_store = DeltaStore(db, BlobStore(db, storage), storage, UPLOAD_DIR / ".incoming")
+        if not delta_store.enabled:
+            typer.echo("Delta versions are disabled (set DELTA_VERSIONS=true and install zstandard)")
+            raise typer.Exit(1)
+        return await delta_store.encode_history()
+
+    counts = run_with_db(encode)
+    typer.echo(f"Encoded {counts['encoded']} versions, {counts['skipped']} kept whole")
+
+@cli.command("cold-tier")
+def cold_tier_command(limit: int = typer.Option(None, help="Stop after moving this many blobs")):
+    """Move idle blobs and files of archived or deleted records to the compressed cold tier now."""
+    async def move(db):
+        storage = storage_from_env(UPLOAD_DIR)
+        cold_tier = ColdTier(db, BlobStore(db, storage), storage, UPLOAD_DIR / ".incoming")
+        if not cold_tier.enabled:
+            typer.echo("The cold tier is disabled (set COLD_TIER=true and install zstandard)")
+            raise typer.Exit(1)
+        return await cold_tier.run(limit=limit)
+
+    stats = run_with_db(move)
+    typer.echo(f"Moved {stats['moved']} blobs: {stats['bytes_before']} -> {stats['bytes_after']} bytes")
+
+if __name__ == "__main__":
+    cli()
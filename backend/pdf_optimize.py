@@ -0,0 +1,154 @@
+"""Linearized ("fast web view") renditions of uploaded PDFs.
+
+Scanned PDFs usually arrive non-linearized, so a viewer cannot draw page 1 until
+the whole file has downloaded. When enabled, every stored PDF is rewritten with
+pikepdf in a worker process: linearized, and optionally with its Flate streams
+recompressed (lossless). The result is stored as its own blob and recorded on each
+version entry holding the original as web_file_url / web_file_sha256 /
+web_file_size. The original upload is never modified: file_url keeps pointing at
+the exact bytes received, and downloads keep serving them. The document viewers
+load web_file_url when it is set. Recording it is journaled but leaves `revision`
+alone, so the uploader's next If-Match edit still matches.
+
+`pdf_renditions` maps an original hash to its rendition so identical uploads are
+processed once; each ready rendition holds one blob reference.
+
+Configuration (environment):
+    PDF_LINEARIZE        true to enable (default false; needs `pip install pikepdf`)
+    PDF_RECOMPRESS       true to also recompress Flate streams at maximum level
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+
+from blob_store import BlobStore
+from change_journal import ChangeJournal, pending_change, with_pending
+from storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+def linearize_pdf(source: str, destination: str, recompress: bool) -> Optional[Tuple[str, int]]:
+    """Write a linearized copy of `source`; returns (sha256, size) or None if already linearized.
+
+    Runs in a worker process.
+    """
+    if recompress:
+        pikepdf.settings.set_flate_compression_level(9)
+    with pikepdf.open(source) as pdf:
+        if pdf.is_linearized and not recompress:
+            return None
+        pdf.save(
+            destination,
+            linearize=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+            compress_streams=True,
+            recompress_flate=recompress,
+        )
+    digest = hashlib.sha256()
+    size = 0
+    with open(destination, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+class PdfOptimizer:
+    def __init__(self, db, store: BlobStore, storage: StorageBackend, scratch_dir: Path, journal: ChangeJournal,
+                 workers: int = 1):
+        self.db = db
+        self.journal = journal
+        self.renditions = db.pdf_renditions
+        self.store = store
+        self.storage = storage
+        self.scratch_dir = scratch_dir
+        self.workers = workers
+        self.recompress = os.environ.get("PDF_RECOMPRESS", "false").lower() == "true"
+        self.enabled = pikepdf is not None and os.environ.get("PDF_LINEARIZE", "false").lower() == "true"
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, asyncio.Task] = {}  # also keeps running tasks referenced
+        if pikepdf is None and os.environ.get("PDF_LINEARIZE", "false").lower() == "true":
+            logger.warning("PDF_LINEARIZE is set but pikepdf is not installed: no linearized renditions (pip install pikepdf)")
+
+    def schedule(self, sha256: str, file_name: str):
+        """Produce (or reuse) the rendition of a freshly written PDF version in the background."""
+        if not self.enabled or not file_name.lower().endswith(".pdf") or sha256 in self._pending:
+            return
+        task = asyncio.create_task(self.process(sha256))
+        self._pending[sha256] = task
+        task.add_done_callback(lambda _: self._pending.pop(sha256, None))
+
+    async def process(self, sha256: str) -> str:
+        rendition = await self.renditions.find_one({"_id": sha256})
+        if rendition is None:
+            rendition = await self._render(sha256)
+        if rendition["status"] == "ready":
+            await self._apply(sha256, rendition)
+        return rendition["status"]
+
+    async def _render(self, sha256: str) -> Dict:
+        key = self.store.key_for(sha256)
+        local = self.storage.local_path(key)
+        fetched = None
+        output = self.scratch_dir / f"{uuid.uuid4().hex}.part"
+        rendition = {"_id": sha256, "created_at": datetime.utcnow()}
+        try:
+            if local is None:
+                # Remote backend: the worker needs a seekable file
+                fetched = self.scratch_dir / f"{uuid.uuid4().hex}.part"
+                async with aiofiles.open(fetched, "wb") as f:
+                    await f.write(await self.storage.get(key))
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, linearize_pdf, str(local or fetched), str(output), self.recompress
+            )
+            if result is None:
+                rendition["status"] = "unchanged"
+            else:
+                web_sha256, web_size = result
+                await self.store.commit(output, web_sha256, web_size)
+                await self.store.add_ref(web_sha256, web_size)
+                rendition.update(status="ready", sha256=web_sha256, size=web_size)
+        except Exception:
+            logger.exception(f"PDF linearization failed for {sha256}")
+            rendition["status"] = "failed"
+        finally:
+            for path in (output, fetched):
+                if path is not None and await aiofiles.os.path.exists(path):
+                    await aiofiles.os.remove(path)
+        await self.renditions.update_one({"_id": sha256}, {"$setOnInsert": rendition}, upsert=True)
+        return rendition
+
+    async def _apply(self, sha256: str, rendition: Dict):
+        """Point every version (and current file) with the original hash at the rendition."""
+        web = {
+            "web_file_url": self.store.url_for(rendition["sha256"]),
+            "web_file_sha256": rendition["sha256"],
+            "web_file_size": rendition["size"],
+        }
+        await self.db.document_versions.update_many({"file_sha256": sha256}, {"$set": web})
+        for collection, entity in ((self.db.documents, "document"), (self.db.policies, "policy")):
+            stale = {"file_sha256": sha256, "web_file_sha256": {"$ne": rendition["sha256"]}}
+            ids = [record["id"] async for record in collection.find(stale, {"id": 1})]
+            change = pending_change("updated", None, web)
+            await collection.update_many({**stale, "id": {"$in": ids}}, with_pending({"$set": web}, change))
+            for record_id in ids:
+                await self.journal.commit(entity, record_id, change)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,172 @@
+"""First-page thumbnails and previews for stored PDFs.
+
+Rendering happens in a process pool after upload so neither the request nor the
+event loop waits for it. Images are keyed by the blob's SHA-256 and stored next to
+the blobs as previews/ab/cd/<sha256>/<variant>.<format>, so identical uploads share
+one set of previews and the /preview URLs can be cached forever. The `previews`
+collection records the outcome per hash (ready, unsupported or failed) so nothing is
+rendered twice and broken files are not retried on every request.
+
+Once a hash has previews, every document, policy and version entry holding it gets
+`thumbnail_url` and `preview_url`, so lists can show a small image instead of
+downloading the file. That write is journaled but leaves `revision` alone: it is
+derived data, and bumping it would fail the uploader's next If-Match edit.
+
+Optional dependencies:
+    pip install pymupdf   # PDF rendering; without it no previews are generated
+    pip install pillow    # WebP output; PNG is used otherwise
+"""
+import asyncio
+import io
+import logging
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+import aiofiles
+
+from change_journal import ChangeJournal, pending_change, with_pending
+from storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+# Variant name -> rendered width in pixels
+PREVIEW_VARIANTS = {"thumb": 240, "page": 1024}
+
+# Larger sources are not rendered; opening them would hold the whole file in a worker
+MAX_SOURCE_BYTES = 200 * 1024 * 1024
+
+def preview_format() -> str:
+    return "webp" if Image is not None and features.check("webp") else "png"
+
+def preview_urls(sha256: str) -> Dict[str, str]:
+    """Record fields pointing at the previews of a blob (served by /preview/{sha256}/{variant})."""
+    return {"thumbnail_url": f"/preview/{sha256}/thumb", "preview_url": f"/preview/{sha256}/page"}
+
+def render_first_page(source, variants: Dict[str, int], image_format: str) -> Dict[str, bytes]:
+    """Render page 1 of a PDF (path or bytes) at each width. Runs in a worker process."""
+    if isinstance(source, bytes):
+        pdf = fitz.open(stream=source, filetype="pdf")
+    else:
+        pdf = fitz.open(source)
+    try:
+        page = pdf[0]
+        images = {}
+        for variant, width in variants.items():
+            scale = width / page.rect.width
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+            if image_format == "png":
+                images[variant] = pixmap.tobytes("png")
+            else:
+                image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+                buffer = io.BytesIO()
+                image.save(buffer, format=image_format.upper(), quality=80, method=4)
+                images[variant] = buffer.getvalue()
+        return images
+    finally:
+        pdf.close()
+
+class PreviewService:
+    def __init__(self, db, storage: StorageBackend, scratch_dir: Path, journal: ChangeJournal, workers: int = 2):
+        self.db = db
+        self.journal = journal
+        self.previews = db.previews
+        self.storage = storage
+        self.scratch_dir = scratch_dir  # same filesystem as local storage, so put() is a rename
+        self.workers = workers
+        self.format = preview_format()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(workers)  # bounds source bytes held in memory at once
+        self._pending: Dict[str, asyncio.Task] = {}  # also keeps running tasks referenced
+        if fitz is None:
+            logger.warning("PyMuPDF is not installed: PDF previews are disabled (pip install pymupdf)")
+
+    @property
+    def enabled(self) -> bool:
+        return fitz is not None
+
+    def key_for(self, sha256: str, variant: str, image_format: str) -> str:
+        return f"previews/{sha256[:2]}/{sha256[2:4]}/{sha256}/{variant}.{image_format}"
+
+    def schedule(self, sha256: str, blob_key: str, file_name: str):
+        """Render previews in the background unless they exist or are already being made."""
+        if not self.enabled or not file_name.lower().endswith(".pdf") or sha256 in self._pending:
+            return
+        task = asyncio.create_task(self.generate(sha256, blob_key))
+        self._pending[sha256] = task
+        task.add_done_callback(lambda _: self._pending.pop(sha256, None))
+
+    async def lookup(self, sha256: str, variant: str) -> Optional[str]:
+        """Storage key of a ready preview, or None."""
+        if variant not in PREVIEW_VARIANTS:
+            return None
+        record = await self.previews.find_one({"_id": sha256, "status": "ready"}, {"format": 1})
+        return self.key_for(sha256, variant, record["format"]) if record else None
+
+    async def generate(self, sha256: str, blob_key: str) -> str:
+        """Render and store the previews for one blob; returns the recorded status."""
+        existing = await self.previews.find_one({"_id": sha256}, {"status": 1})
+        if existing:
+            if existing["status"] == "ready":
+                await self._apply(sha256)
+            return existing["status"]
+        try:
+            async with self._slots:
+                stat = await self.storage.stat(blob_key)
+                if stat is None:
+                    return "missing"
+                if stat.size > MAX_SOURCE_BYTES:
+                    status = "unsupported"
+                else:
+                    local = self.storage.local_path(blob_key)
+                    source = str(local) if local is not None else await self.storage.get(blob_key)
+                    if self._executor is None:
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    images = await asyncio.get_running_loop().run_in_executor(
+                        self._executor, render_first_page, source, PREVIEW_VARIANTS, self.format
+                    )
+                    for variant, data in images.items():
+                        temp_path = self.scratch_dir / f"{uuid.uuid4().hex}.part"
+                        async with aiofiles.open(temp_path, "wb") as f:
+                            await f.write(data)
+                        await self.storage.put(self.key_for(sha256, variant, self.format), temp_path)
+                    status = "ready"
+        except Exception:
+            logger.exception(f"Preview generation failed for {sha256}")
+            status = "failed"
+        await self.previews.update_one(
+            {"_id": sha256},
+            {"$set": {"status": status, "format": self.format, "created_at": datetime.utcnow()}},
+            upsert=True
+        )
+        if status == "ready":
+            await self._apply(sha256)
+        return status
+
+    async def _apply(self, sha256: str):
+        """Point every version (and current file) with this hash at its previews."""
+        urls = preview_urls(sha256)
+        stale = {"file_sha256": sha256, "thumbnail_url": {"$ne": urls["thumbnail_url"]}}
+        await self.db.document_versions.update_many(stale, {"$set": urls})
+        for collection, entity in ((self.db.documents, "document"), (self.db.policies, "policy")):
+            ids = [record["id"] async for record in collection.find(stale, {"id": 1})]
+            change = pending_change("updated", None, urls)
+            await collection.update_many({**stale, "id": {"$in": ids}}, with_pending({"$set": urls}, change))
+            for record_id in ids:
+                await self.journal.commit(entity, record_id, change)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,43 @@
+"""In-process cache of authenticated users, keyed by username.
+
+Every authenticated request needs the caller's user record; the cache turns that
+lookup into a dictionary read. Each write to a user goes through the change
+journal, and the invalidation bus (invalidation.py) drops the cached entry on
+every worker, so a suspension, role or group change takes effect on the writing
+worker at once and on the others within the bus delay.
+
+A lookup that was already reading the database when an invalidation arrived may
+hold the record from before the write. Such a result is used for that one
+request but not cached (the same generation check as ReferenceTable.rows).
+"""
+from typing import Any, Dict, Optional, Set
+
+from invalidation import InvalidationBus
+
+class PrincipalCache:
+    def __init__(self, users, bus: InvalidationBus, size: int = 10000):
+        self.users = users
+        self.size = size
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._generation = 0
+        bus.subscribe("user", self.invalidate)
+
+    def invalidate(self, ids: Optional[Set[str]] = None):
+        self._generation += 1
+        if ids is None:
+            self._entries.clear()
+            return
+        for username in [name for name, user in self._entries.items() if user["id"] in ids]:
+            del self._entries[username]
+
+    async def get(self, username: str) -> Optional[Dict[str, Any]]:
+        """The user record for `username`, or None if there is no such (undeleted) user."""
+        user = self._entries.get(username)
+        if user is None:
+            generation = self._generation
+            user = await self.users.find_one({"username": username, "is_deleted": False}, {"_id": 0})
+            if user is not None and generation == self._generation:
+                if len(self._entries) >= self.size:
+                    self._entries.clear()
+                self._entries[username] = user
+        return user
@@ -0,0 +1,71 @@
+"""HTTP caching for the anonymous list endpoints.
+
+/api/public/categories, /policy-types, /documents and /policies answer with a
+weak ETag naming the version of the collection behind them, and with a
+configurable Cache-Control. A conditional GET whose If-None-Match still
+matches gets a 304 straight from memory, without a database query or
+serialization.
+
+Versions are shared by every worker:
+- categories and policy types use the content digest held by the reference
+  data cache (reference_data.py);
+- documents and policies use the sequence number of the newest change
+  journal event for that entity, kept in the journal's counter document so
+  it survives the journal's retention (ChangeJournal.entity_version).
+That sequence number is read once after each change: the invalidation bus
+(invalidation.py) drops it, and the next request looks it up again. The entity
+topic alone is not enough with a change stream, which can deliver the registry
+write before the journal has moved the counter; the bus's VERSION_TOPIC, sent
+when the counter itself changes, drops the value read in between.
+
+The filters in the query string (search, category, ...) are not part of the
+tag. Caches store one entry per URL, and any change to the collection changes
+the tag for every URL.
+
+Configuration (environment):
+    PUBLIC_CACHE_MAX_AGE                 seconds a response is fresh (default 0: revalidate)
+    PUBLIC_CACHE_STALE_WHILE_REVALIDATE  seconds a stale copy may be served while
+                                         revalidating in the background (default 60)
+"""
+import os
+from typing import Dict
+
+from change_journal import ChangeJournal
+from invalidation import VERSION_TOPIC, InvalidationBus
+
+PUBLIC_CACHE_MAX_AGE = int(os.environ.get("PUBLIC_CACHE_MAX_AGE", "0"))
+PUBLIC_CACHE_STALE_WHILE_REVALIDATE = int(os.environ.get("PUBLIC_CACHE_STALE_WHILE_REVALIDATE", "60"))
+PUBLIC_CACHE_CONTROL = (f"public, max-age={PUBLIC_CACHE_MAX_AGE}, "
+                        f"stale-while-revalidate={PUBLIC_CACHE_STALE_WHILE_REVALIDATE}")
+
+class CollectionVersions:
+    """Newest journal sequence number per entity, re-read only after a change."""
+
+    def __init__(self, journal: ChangeJournal, bus: InvalidationBus, entities=("document", "policy")):
+        self.journal = journal
+        self._seq: Dict[str, int] = {}
+        self._generation: Dict[str, int] = {entity: 0 for entity in entities}
+        for entity in entities:
+            bus.subscribe(entity, lambda ids, entity=entity: self._invalidate(entity))
+        bus.subscribe(VERSION_TOPIC, self._invalidate_versions)
+
+    def _invalidate(self, entity: str):
+        self._seq.pop(entity, None)
+        self._generation[entity] += 1
+
+    def _invalidate_versions(self, entities):
+        for entity in self._generation:
+            if entities is None or entity in entities:
+                self._invalidate(entity)
+
+    async def version(self, entity: str) -> int:
+        seq = self._seq.get(entity)
+        if seq is None:
+            generation = self._generation[entity]
+            seq = await self.journal.entity_version(entity)
+            if generation == self._generation[entity]:
+                self._seq[entity] = seq  # else changed meanwhile: look again next time
+        return seq
+
+    async def etag(self, entity: str) -> str:
+        return f'W/"{entity}-{await self.version(entity)}"'
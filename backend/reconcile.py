@@ -0,0 +1,126 @@
+"""Reconcile stored objects with the database references to them.
+
+References are streamed from `documents`, `policies` and `document_versions`
+(files and linearized renditions) plus the rendered `previews`, delta-encoded
+versions and the cold tier,
+then compared with the storage listing:
+
+- orphans: objects nothing refers to. Only objects older than the grace period
+  count, so a blob committed by an upload whose record is not written yet is
+  never touched. They are reported and, on request, moved under quarantine/
+  rather than deleted, so a mistake can be undone by moving the file back.
+- missing: references whose object does not exist.
+
+Soft-deleted records still count as references because they can be restored.
+The listing is walked in key order in batches with a pause between batches
+(`rate` objects per second), and the last key seen is checkpointed, so a run can
+be capped with `limit` and continued later with `resume` on a live node.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Set
+
+from blob_store import key_for_url
+from cold_storage import COLD_TIER, cold_key
+from delta_store import CACHE_PREFIX, DELTA_ENCODING, delta_key
+from previews import PREVIEW_VARIANTS
+from storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+QUARANTINE_PREFIX = "quarantine/"
+# Never reconciled: uploads in flight (see upload_sessions.py), already quarantined files
+# and reconstructed versions, which delta_store.py evicts itself
+SKIPPED_PREFIXES = (".incoming/", QUARANTINE_PREFIX, CACHE_PREFIX)
+
+CHECKPOINT_ID = "reconcile"
+
+async def referenced_keys(db) -> Set[str]:
+    """Storage keys referenced anywhere in the database."""
+    keys: Set[str] = set()
+
+    def add(file_url: Optional[str]):
+        key = key_for_url(file_url) if file_url else None
+        if key:
+            keys.add(key)
+
+    projection = {"_id": 0, "file_url": 1, "web_file_url": 1}
+    for collection in (db.documents, db.policies, db.document_versions):
+        async for record in collection.find({}, projection):
+            add(record.get("file_url"))
+            add(record.get("web_file_url"))
+    async for preview in db.previews.find({"status": "ready"}, {"format": 1}):
+        sha256 = preview["_id"]
+        for variant in PREVIEW_VARIANTS:
+            keys.add(f"previews/{sha256[:2]}/{sha256[2:4]}/{sha256}/{variant}.{preview['format']}")
+    # Delta-encoded and cold-tier blobs are stored under deltas/ or cold/ instead of their blob key
+    async for blob in db.blobs.find({"$or": [{"encoding": DELTA_ENCODING}, {"tier": COLD_TIER}]}, {"encoding": 1}):
+        sha256 = blob["_id"]
+        keys.discard(f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}")
+        keys.add(delta_key(sha256) if blob.get("encoding") == DELTA_ENCODING else cold_key(sha256))
+    return keys
+
+async def reconcile(
+    db,
+    storage: StorageBackend,
+    quarantine: bool = False,
+    grace: timedelta = timedelta(hours=1),
+    rate: int = 200,
+    batch_size: int = 100,
+    limit: Optional[int] = None,
+    resume: bool = False,
+) -> Dict[str, Any]:
+    """Compare one pass (or the next `limit` objects) of the listing with the references."""
+    references = await referenced_keys(db)
+    checkpoint = await db.maintenance.find_one({"_id": CHECKPOINT_ID}) if resume else None
+    start_after = checkpoint.get("last_key") if checkpoint else None
+    cutoff = datetime.now(timezone.utc) - grace
+    quarantine_folder = f"{QUARANTINE_PREFIX}{datetime.utcnow():%Y%m%d-%H%M%S}/"
+
+    report: Dict[str, Any] = {"scanned": 0, "orphans": [], "orphan_bytes": 0, "missing": [], "quarantined": 0,
+                              "started_after": start_after, "last_key": None, "complete": True}
+    seen: Set[str] = set()
+    batch_started = time.monotonic()
+    async for key, stat in storage.list(start_after):
+        if limit is not None and report["scanned"] >= limit:
+            report["complete"] = False
+            break
+        report["scanned"] += 1
+        report["last_key"] = key
+        if key.startswith(SKIPPED_PREFIXES):
+            continue
+        seen.add(key)
+        modified = stat.modified if stat.modified.tzinfo else stat.modified.replace(tzinfo=timezone.utc)
+        if key not in references and modified < cutoff:
+            report["orphans"].append(key)
+            report["orphan_bytes"] += stat.size
+            if quarantine:
+                await storage.move(key, quarantine_folder + key)
+                if key.startswith("blobs/"):
+                    await db.blobs.delete_one({"_id": key.rsplit("/", 1)[-1]})
+                report["quarantined"] += 1
+        if report["scanned"] % batch_size == 0:
+            # Pace the walk so a live node keeps its disk / S3 request budget
+            elapsed = time.monotonic() - batch_started
+            await asyncio.sleep(max(batch_size / rate - elapsed, 0))
+            batch_started = time.monotonic()
+
+    # Only references inside the key range this run covered can be judged missing
+    for key in sorted(references):
+        if start_after is not None and key <= start_after:
+            continue
+        if not report["complete"] and key > report["last_key"]:
+            break
+        if key not in seen:
+            report["missing"].append(key)
+
+    await db.maintenance.update_one(
+        {"_id": CHECKPOINT_ID},
+        {"$set": {"last_key": None if report["complete"] else report["last_key"], "finished_at": datetime.utcnow(),
+                  "orphans": len(report["orphans"]), "missing": len(report["missing"])}},
+        upsert=True
+    )
+    logger.info(f"Reconciled {report['scanned']} objects: {len(report['orphans'])} orphans, {len(report['missing'])} missing")
+    return report
@@ -0,0 +1,80 @@
+"""In-process cache of the small reference tables: categories, policy types and user groups.
+
+Each table is read whole, once, and then served from memory: the list routes,
+the category / policy type checks on document writes and the numbering
+functions become dictionary lookups. Every create, update, delete and restore
+of these records goes through the change journal, and the invalidation bus
+(invalidation.py) turns each journaled write into a reload of the affected
+table on every worker. The writing worker reloads immediately; the others
+within the bus delay.
+
+`version` is a digest of the table contents. It is therefore identical on
+every worker holding the same data, and can serve directly as an ETag.
+
+Rows are shared between callers and must not be modified.
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from invalidation import InvalidationBus
+
+class ReferenceTable:
+    """All rows of one collection keyed by id, in insertion order."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.version = ""
+        self._rows: Optional[Dict[str, Dict[str, Any]]] = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self, ids=None):
+        # Tables are tiny: reload the whole table rather than patching rows
+        self._rows = None
+        self._generation += 1
+
+    async def rows(self) -> Dict[str, Dict[str, Any]]:
+        rows = self._rows
+        while rows is None:
+            async with self._lock:
+                rows = self._rows
+                if rows is not None:
+                    break
+                generation = self._generation
+                loaded = {row["id"]: row async for row in self.collection.find({}, {"_id": 0})}
+                if generation != self._generation:
+                    continue  # changed while loading; read again
+                serialized = json.dumps(list(loaded.values()), sort_keys=True, default=str)
+                self.version = hashlib.sha256(serialized.encode()).hexdigest()[:16]
+                self._rows = rows = loaded
+        return rows
+
+    async def get(self, record_id: str, **criteria) -> Optional[Dict[str, Any]]:
+        """The row with this id if it also matches `criteria` (field=value), else None."""
+        row = (await self.rows()).get(record_id)
+        if row is None or any(row.get(field) != value for field, value in criteria.items()):
+            return None
+        return row
+
+    async def find(self, **criteria) -> List[Dict[str, Any]]:
+        return [row for row in (await self.rows()).values()
+                if all(row.get(field) == value for field, value in criteria.items())]
+
+class ReferenceData:
+    def __init__(self, db, bus: InvalidationBus):
+        self.categories = ReferenceTable(db.categories)
+        self.policy_types = ReferenceTable(db.policy_types)
+        self.user_groups = ReferenceTable(db.user_groups)
+        bus.subscribe("category", self.categories.invalidate)
+        bus.subscribe("policy_type", self.policy_types.invalidate)
+        bus.subscribe("user_group", self.user_groups.invalidate)
+
+    async def load(self):
+        await asyncio.gather(self.categories.rows(), self.policy_types.rows(), self.user_groups.rows())
+
+    @property
+    def version(self) -> str:
+        """Stamp covering all three tables."""
+        return "-".join((self.categories.version, self.policy_types.version, self.user_groups.version))
@@ -1,11 +1,14 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, status, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, status, Form, Header, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
 from dotenv import load_dotenv
+from starlette.background import BackgroundTask
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
@@ -14,12 +17,48 @@ import uuid
 from datetime import datetime, timedelta
 import jwt
 from passlib.context import CryptContext
-import shutil
+import hashlib
+import secrets
+import aiofiles
+import aiofiles.os
 from enum import Enum
+from db_indexes import ensure_indexes
+from storage import storage_from_env
+from blob_store import BlobStore, key_for_url
+from http_files import file_response, content_type_for, content_disposition, not_modified
+from upload_sessions import UploadSession, UploadSessions
+from zip_stream import ZipEntry, safe_component, stream_zip, unique_names
+from previews import PreviewService
+from pdf_optimize import PdfOptimizer
+from delta_store import DeltaStore
+from cold_storage import MOVER_LOCK_ID, ColdTier
+from change_journal import PENDING_FIELD, PENDING_TIMEOUT, ChangeJournal, CursorExpired, pending_change, with_pending
+from change_feed import ChangeFeed
+from invalidation import InvalidationBus
+from principals import PrincipalCache
+from reference_data import ReferenceData
+from public_cache import PUBLIC_CACHE_CONTROL, CollectionVersions
+from delta_sync import sync_page
+from text_diff import TextDiffService
+from versions import (
+    backfill_status_changes, find_as_of, insert_version, migrate_embedded_versions, record_status_change
+)
+from upload_validation import BodySizeLimitMiddleware, UploadValidator, check_declared_size, validate_file
 
 ROOT_DIR = Path(__file__).parent
 UPLOAD_DIR = ROOT_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
+# Uploads are streamed here first and renamed into place once complete (same filesystem)
+INCOMING_DIR = UPLOAD_DIR / ".incoming"
+INCOMING_DIR.mkdir(exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+DOCUMENT_EXTENSIONS = ['.pdf', '.docx', '.doc', '.txt']
+MAX_BUNDLE_DOCUMENTS = 1000
+# Resumable upload sessions idle for longer than this are purged with their partial file
+UPLOAD_SESSION_TTL = timedelta(hours=int(os.environ.get("UPLOAD_SESSION_TTL_HOURS", "24")))
+# Lifetime of the single-use tickets EventSource clients open the change stream with
+STREAM_TICKET_TTL = timedelta(seconds=int(os.environ.get("STREAM_TICKET_TTL_SECONDS", "60")))
+UPLOAD_GC_INTERVAL_SECONDS = 900
 
 load_dotenv(ROOT_DIR / '.env')
 
@@ -28,6 +67,34 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# File storage: local disk or S3-compatible (see storage.py), content-addressed as blobs/ab/cd/<sha256>
+storage = storage_from_env(UPLOAD_DIR)
+blob_store = BlobStore(db, storage)
+upload_sessions = UploadSessions(db, INCOMING_DIR, UPLOAD_SESSION_TTL, UPLOAD_CHUNK_SIZE)
+# Every registry write appends an event here for incremental consumers (see change_journal.py)
+journal = ChangeJournal(db)
+# First-page thumbnails rendered in a process pool after upload (needs PyMuPDF, see previews.py)
+previews = PreviewService(db, storage, INCOMING_DIR, journal, workers=int(os.environ.get("PREVIEW_WORKERS", "2")))
+# Drops in-process cache entries on every worker when the records behind them change (see invalidation.py)
+invalidation = InvalidationBus(db, journal)
+change_feed = ChangeFeed(db, journal, invalidation)
+# Authenticated users by username, dropped through the invalidation bus when a user changes (see principals.py)
+principals = PrincipalCache(db.users, invalidation, int(os.environ.get("PRINCIPAL_CACHE_SIZE", "10000")))
+# Categories, policy types and user groups served from memory (see reference_data.py)
+reference_data = ReferenceData(db, invalidation)
+# Change versions behind the ETags of the public lists (see public_cache.py)
+collection_versions = CollectionVersions(journal, invalidation)
+# Optional linearized copies of PDFs for fast first-page viewing (PDF_LINEARIZE, see pdf_optimize.py)
+pdf_optimizer = PdfOptimizer(db, blob_store, storage, INCOMING_DIR, journal)
+# Rarely read blobs compressed into a cold tier by a periodic mover (COLD_TIER, see cold_storage.py)
+cold_tier = ColdTier(db, blob_store, storage, INCOMING_DIR)
+# Superseded versions kept as binary deltas against their successor (DELTA_VERSIONS, see delta_store.py)
+delta_store = DeltaStore(db, blob_store, storage, INCOMING_DIR, cold_tier)
+# Text diffs between versions, computed in a process pool and memoized per content-hash pair
+text_diffs = TextDiffService(db, storage, delta_store.resolve, workers=int(os.environ.get("DIFF_WORKERS", "2")))
+# Redirect downloads to presigned storage URLs when the backend supports them
+DOWNLOAD_REDIRECTS = os.environ.get("DOWNLOAD_REDIRECTS", "true").lower() == "true"
+
 # JWT Configuration
 SECRET_KEY = "policy-register-secret-key-2025"
 ALGORITHM = "HS256"
@@ -41,9 +108,6 @@ security = HTTPBearer()
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
-# Serve uploaded files
-app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
-
 # Enums
 class UserRole(str, Enum):
     ADMIN = "admin"
@@ -180,6 +244,14 @@ class DocumentVersion(BaseModel):
     change_summary: Optional[str] = ""
     file_url: str
     file_name: str
+    file_size: Optional[int] = None
+    file_sha256: Optional[str] = None
+    # Linearized rendition for viewing; the original above is never modified
+    web_file_url: Optional[str] = None
+    web_file_size: Optional[int] = None
+    web_file_sha256: Optional[str] = None
+    thumbnail_url: Optional[str] = None  # First-page images, set once rendered (see previews.py)
+    preview_url: Optional[str] = None
 
 # Enhanced Document model (more general than Policy)
 class Document(BaseModel):
@@ -195,9 +267,16 @@ class Document(BaseModel):
     owner_department: str
     file_url: str
     file_name: str
+    file_size: Optional[int] = None
+    file_sha256: Optional[str] = None
+    web_file_url: Optional[str] = None
+    web_file_size: Optional[int] = None
+    web_file_sha256: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
     is_visible_to_users: bool = True  # Public visibility (no login required)
     visible_to_groups: List[str] = []  # Group-specific visibility (requires login)
-    version_history: List[DocumentVersion] = []
+    revision: int = 1  # Incremented on every write, exposed as the ETag
     created_by: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     modified_by: Optional[str] = None
@@ -236,6 +315,13 @@ class PolicyVersion(BaseModel):
     change_summary: Optional[str] = ""
     file_url: str
     file_name: str
+    file_size: Optional[int] = None
+    file_sha256: Optional[str] = None
+    web_file_url: Optional[str] = None
+    web_file_size: Optional[int] = None
+    web_file_sha256: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
 
 class Policy(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -249,8 +335,15 @@ class Policy(BaseModel):
     owner_department: str
     file_url: str
     file_name: str
+    file_size: Optional[int] = None
+    file_sha256: Optional[str] = None
+    web_file_url: Optional[str] = None
+    web_file_size: Optional[int] = None
+    web_file_sha256: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
     is_visible_to_users: bool = True
-    version_history: List[PolicyVersion] = []
+    revision: int = 1  # Incremented on every write, exposed as the ETag
     created_by: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     modified_by: Optional[str] = None
@@ -273,6 +366,30 @@ class PolicyUpdate(BaseModel):
     status: Optional[PolicyStatus] = None
     is_visible_to_users: Optional[bool] = None
 
+class StoredFile(BaseModel):
+    file_url: str
+    size: int
+    sha256: str
+
+class DocumentBundleRequest(BaseModel):
+    # Either explicit ids or a filter (same fields as the document list)
+    document_ids: Optional[List[str]] = None
+    category_id: Optional[str] = None
+    policy_type_id: Optional[str] = None
+    document_type: Optional[DocumentType] = None
+    status: Optional[PolicyStatus] = None
+    include_versions: bool = False
+
+class UploadSessionCreate(BaseModel):
+    file_name: str
+    size: int = Field(..., ge=0)
+
+class UploadFinalize(BaseModel):
+    # Exactly one of: an existing document to add a version to, or metadata for a new document
+    document_id: Optional[str] = None
+    change_summary: Optional[str] = None
+    document: Optional[DocumentCreate] = None
+
 # Utility Functions
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -291,23 +408,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await authenticate(credentials.credentials)
+
+def token_expiry(token: str) -> Optional[float]:
+    """Expiry (epoch seconds) of a token authenticate() has accepted."""
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("exp")
+
+async def authenticate(token: str) -> User:
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    
-    user = await db.users.find_one({"username": username, "is_deleted": False})
+    return await load_principal(username)
+
+async def load_principal(username: str) -> User:
+    """The signed-in user behind an already verified username (cached, see principals.py)."""
+    user = await principals.get(username)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
     
     if user.get("is_suspended", False):
         raise HTTPException(status_code=401, detail="Account suspended")
     
-    user.pop('_id', None)  # Remove MongoDB ObjectId
     return User(**user)
 
 async def require_admin(current_user: User = Depends(get_current_user)):
@@ -320,14 +445,141 @@ async def require_admin_or_manager(current_user: User = Depends(get_current_user
         raise HTTPException(status_code=403, detail="Admin or Policy Manager access required")
     return current_user
 
+def raise_duplicate(error: DuplicateKeyError, messages: Dict[str, str]):
+    """Translate a unique index violation into a 400 naming the duplicated field.
+
+    `messages` maps indexed field names to their error detail; the first entry is the fallback.
+    """
+    key_pattern = (error.details or {}).get("keyPattern", {})
+    for field, detail in messages.items():
+        if field in key_pattern:
+            raise HTTPException(status_code=400, detail=detail)
+    raise HTTPException(status_code=400, detail=next(iter(messages.values())))
+
+async def save_upload(file: UploadFile) -> StoredFile:
+    """Stream an upload into the blob store without blocking the event loop.
+
+    Chunks are written through aiofiles to a temporary file while the SHA-256 and size
+    are computed in the same pass; the file is then renamed into place under its hash
+    (or dropped if that content is already stored) and referenced once. The reference
+    is taken before the record is written, so a caller whose write then fails must release it.
+    """
+    temp_path = INCOMING_DIR / f"{uuid.uuid4().hex}.part"
+    digest = hashlib.sha256()
+    size = 0
+    validator = UploadValidator(file.filename)
+    try:
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                # Size cap and magic bytes are checked before anything is written
+                validator.feed(chunk)
+                # hashlib releases the GIL on large buffers, so hash off the event loop
+                await asyncio.to_thread(digest.update, chunk)
+                await buffer.write(chunk)
+                size += len(chunk)
+        await validator.finish(temp_path)
+        sha256 = digest.hexdigest()
+        await blob_store.commit(temp_path, sha256, size)
+    except BaseException:
+        if await aiofiles.os.path.exists(temp_path):
+            await aiofiles.os.remove(temp_path)
+        raise
+    await blob_store.add_ref(sha256, size)
+    return StoredFile(file_url=blob_store.url_for(sha256), size=size, sha256=sha256)
+
+async def download_response(
+    request: Request,
+    key: Optional[str],
+    file_name: str,
+    sha256: Optional[str] = None,
+    cache_control: str = "private, no-cache"
+):
+    """Send a stored file, or redirect to a presigned URL so the bytes bypass this worker."""
+    if key is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    # A reconstructed file stays in the cache until the response has been sent
+    key, release = await delta_store.checkout(key)
+    try:
+        url = None
+        if DOWNLOAD_REDIRECTS:
+            url = await storage.presign(key, file_name, content_type_for(file_name), content_disposition(file_name))
+        if not url:
+            response = await file_response(request, storage, key, file_name, sha256, cache_control)
+    except BaseException:
+        await release()
+        raise
+    if url:
+        await release()  # the checkout's lease outlives the presigned URL
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": "no-store"})
+    response.background = BackgroundTask(release)
+    return response
+
+async def download_record_file(request: Request, record: Dict[str, Any], cache_control: str = "private, no-cache"):
+    return await download_response(
+        request, key_for_url(record["file_url"]), record["file_name"], record.get("file_sha256"), cache_control
+    )
+
+async def version_page(document_id: str, model, skip: int, limit: int) -> Dict[str, Any]:
+    query = {"document_id": document_id}
+    versions, total = await asyncio.gather(
+        db.document_versions.find(query, {"_id": 0}).sort("version_number", -1).skip(skip).to_list(limit),
+        db.document_versions.count_documents(query)
+    )
+    return {"versions": [model(**version) for version in versions], "total": total, "skip": skip, "limit": limit}
+
+async def version_diff(document_id: str, from_version: int, to_version: int) -> Dict[str, Any]:
+    versions = await db.document_versions.find(
+        {"document_id": document_id, "version_number": {"$in": [from_version, to_version]}},
+        {"_id": 0, "version_number": 1, "file_name": 1, "file_url": 1, "file_sha256": 1}
+    ).to_list(2)
+    by_number = {version["version_number"]: version for version in versions}
+    for number in (from_version, to_version):
+        if number not in by_number:
+            raise HTTPException(status_code=404, detail=f"Version {number} not found")
+        by_number[number]["key"] = key_for_url(by_number[number]["file_url"])
+    result = await text_diffs.diff(by_number[from_version], by_number[to_version])
+    return {"document_id": document_id, "from_version": from_version, "to_version": to_version, **result}
+
+# Optimistic concurrency helpers (revision <-> ETag / If-Match)
+def revision_etag(revision: int) -> str:
+    return f'"{revision}"'
+
+def parse_if_match(if_match: Optional[str]) -> Optional[List[int]]:
+    """Return the revisions listed in an If-Match header, or None when no precondition applies.
+
+    Weak or malformed tags can never match (If-Match uses strong comparison), so they
+    yield an empty list and the conditional write fails with 412.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    revisions = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+            revisions.append(int(tag[1:-1]))
+    return revisions
+
+def revision_filter(record_id: str, if_match: Optional[str]) -> Dict[str, Any]:
+    query = {"id": record_id}
+    revisions = parse_if_match(if_match)
+    if revisions is not None:
+        query["revision"] = {"$in": revisions}
+    return query
+
+async def raise_write_conflict(collection, record_id: str, if_match: Optional[str], not_found: str):
+    """Explain a conditional write that matched nothing: 412 if the record exists, else 404."""
+    if if_match is not None and await collection.count_documents({"id": record_id}, limit=1):
+        raise HTTPException(status_code=412, detail="Precondition failed: record was modified by someone else")
+    raise HTTPException(status_code=404, detail=not_found)
+
 async def generate_policy_number(category_id: str, policy_type_id: str, year: int) -> str:
     # Get category
-    category = await db.categories.find_one({"id": category_id, "is_deleted": False})
+    category = await reference_data.categories.get(category_id, is_deleted=False)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
     # Get policy type
-    policy_type = await db.policy_types.find_one({"id": policy_type_id, "is_active": True, "is_deleted": False})
+    policy_type = await reference_data.policy_types.get(policy_type_id, is_active=True, is_deleted=False)
     if not policy_type:
         raise HTTPException(status_code=404, detail="Policy type not found")
     
@@ -335,20 +587,22 @@ async def generate_policy_number(category_id: str, policy_type_id: str, year: in
     type_code = policy_type["code"]
     
     # Get next sequential number for this category and year
-    existing_policies = await db.policies.find({
+    existing_policies = await db.policies.count_documents({
         "category_id": category_id,
         "date_issued": {
             "$gte": datetime(year, 1, 1),
             "$lt": datetime(year + 1, 1, 1)
         },
         "status": {"$ne": "deleted"}
-    }).to_list(None)
+    })
     
-    next_seq = len(existing_policies) + 1
+    next_seq = existing_policies + 1
     
     return f"{category_code}-{type_code}-{next_seq:03d}-{year}-v1"
 
 # Initialize default data
+ADMIN_JOURNALED_ID = "default_admin_journaled"
+
 async def init_default_data():
     # Check if admin user exists
     admin_exists = await db.users.find_one({"role": UserRole.ADMIN, "is_deleted": False})
@@ -362,8 +616,16 @@ async def init_default_data():
             is_active=True,
             password_hash=hash_password("admin123")
         )
-        await db.users.insert_one(admin_user.dict())
+        change = pending_change("created")
+        await db.users.insert_one({**admin_user.dict(), PENDING_FIELD: [change]})
+        await journal.commit("user", admin_user.id, change)
         print("Default admin user created: username=admin, password=admin123")
+    elif not await db.maintenance.find_one({"_id": ADMIN_JOURNALED_ID}):
+        # The default admin used to be created without a journal event; record it once
+        async for admin in db.users.find({"username": "admin", "role": UserRole.ADMIN}, {"id": 1}):
+            if not await db.change_journal.find_one({"entity": "user", "entity_id": admin["id"]}):
+                await journal.append("user", admin["id"], "created")
+        await db.maintenance.update_one({"_id": ADMIN_JOURNALED_ID}, {"$set": {"at": datetime.utcnow()}}, upsert=True)
     
     # Check if default user groups exist
     default_groups = [
@@ -378,7 +640,9 @@ async def init_default_data():
         existing_group = await db.user_groups.find_one({"code": group_data["code"], "is_deleted": False})
         if not existing_group:
             user_group = UserGroup(**group_data)
-            await db.user_groups.insert_one(user_group.dict())
+            change = pending_change("created")
+            await db.user_groups.insert_one({**user_group.dict(), PENDING_FIELD: [change]})
+            await journal.commit("user_group", user_group.id, change)
             print(f"Default user group created: {group_data['name']}")
     
     # Check if default category exists
@@ -389,7 +653,9 @@ async def init_default_data():
             code="OPS",
             description="Operational policies and procedures"
         )
-        await db.categories.insert_one(default_category.dict())
+        change = pending_change("created")
+        await db.categories.insert_one({**default_category.dict(), PENDING_FIELD: [change]})
+        await journal.commit("category", default_category.id, change)
         print("Default Operations category created")
     
     # Check if default policy types exist
@@ -403,21 +669,33 @@ async def init_default_data():
         existing_type = await db.policy_types.find_one({"code": type_data["code"], "is_deleted": False})
         if not existing_type:
             policy_type = PolicyType(**type_data)
-            await db.policy_types.insert_one(policy_type.dict())
+            change = pending_change("created")
+            await db.policy_types.insert_one({**policy_type.dict(), PENDING_FIELD: [change]})
+            await journal.commit("policy_type", policy_type.id, change)
             print(f"Default policy type created: {type_data['name']}")
+    
+    # Backfill revisions on records created before optimistic concurrency existed
+    for collection in (db.documents, db.policies):
+        await collection.update_many({"revision": {"$exists": False}}, {"$set": {"revision": 1}})
+    
+    # Move embedded version_history arrays into document_versions
+    moved = await migrate_embedded_versions(db)
+    if moved:
+        print(f"Moved {moved} embedded versions into document_versions")
+    
+    # Start the status history of records created before it was recorded
+    backfilled = await backfill_status_changes(db)
+    if backfilled:
+        print(f"Recorded the current status of {backfilled} records in status_changes")
+
+USER_DUPLICATE_MESSAGES = {"username": "Username already registered", "email": "Email already registered"}
+POLICY_TYPE_DUPLICATE_MESSAGES = {"code": "Policy type code already exists"}
+CATEGORY_DUPLICATE_MESSAGES = {"code": "Category code already exists"}
+USER_GROUP_DUPLICATE_MESSAGES = {"code": "User group code already exists"}
 
 # Authentication Routes
 @api_router.post("/auth/register", response_model=User)
 async def register_user(user_data: UserCreate):
-    # Check if user already exists
-    existing_user = await db.users.find_one({"username": user_data.username, "is_deleted": False})
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
-    existing_email = await db.users.find_one({"email": user_data.email, "is_deleted": False})
-    if existing_email:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
     hashed_password = hash_password(user_data.password)
     user = User(
         username=user_data.username,
@@ -427,7 +705,13 @@ async def register_user(user_data: UserCreate):
         is_approved=False  # Requires admin approval
     )
     
-    await db.users.insert_one(user.dict())
+    change = pending_change("created", user.id)
+    # Unique indexes on username/email reject duplicates atomically
+    try:
+        await db.users.insert_one({**user.dict(), PENDING_FIELD: [change]})
+    except DuplicateKeyError as e:
+        raise_duplicate(e, USER_DUPLICATE_MESSAGES)
+    await journal.commit("user", user.id, change)
     user_dict = user.dict()
     user_dict.pop('password_hash')
     return User(**user_dict, password_hash="")
@@ -449,6 +733,7 @@ async def login_user(user_data: UserLogin):
     user_data = user.copy()
     user_data.pop('password_hash')
     user_data.pop('_id', None)  # Remove MongoDB ObjectId
+    user_data.pop(PENDING_FIELD, None)
     
     return {
         "access_token": access_token,
@@ -465,16 +750,16 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 # Policy Type Routes
 @api_router.post("/policy-types", response_model=PolicyType)
 async def create_policy_type(policy_type_data: PolicyTypeCreate, current_user: User = Depends(require_admin_or_manager)):
-    # Check if code already exists
-    existing_type = await db.policy_types.find_one({"code": policy_type_data.code.upper(), "is_deleted": False})
-    if existing_type:
-        raise HTTPException(status_code=400, detail="Policy type code already exists")
-    
-    # Create policy type with uppercase code
+    # Create policy type with uppercase code; the unique code index rejects duplicates
     policy_type_dict = policy_type_data.dict()
     policy_type_dict["code"] = policy_type_data.code.upper()
     policy_type = PolicyType(**policy_type_dict)
-    await db.policy_types.insert_one(policy_type.dict())
+    change = pending_change("created", current_user.id)
+    try:
+        await db.policy_types.insert_one({**policy_type.dict(), PENDING_FIELD: [change]})
+    except DuplicateKeyError as e:
+        raise_duplicate(e, POLICY_TYPE_DUPLICATE_MESSAGES)
+    await journal.commit("policy_type", policy_type.id, change)
     return policy_type
 
 @api_router.get("/policy-types", response_model=List[PolicyType])
@@ -488,57 +773,65 @@ async def get_policy_types(include_inactive: bool = False, include_deleted: bool
         if not include_inactive:
             query["is_active"] = True
     
-    policy_types = await db.policy_types.find(query).to_list(None)
-    result = []
-    for pt in policy_types:
-        pt.pop('_id', None)
-        result.append(PolicyType(**pt))
-    return result
+    return [PolicyType(**pt) for pt in await reference_data.policy_types.find(**query)]
 
 @api_router.patch("/policy-types/{type_id}")
 async def update_policy_type(type_id: str, update_data: PolicyTypeUpdate, current_user: User = Depends(require_admin_or_manager)):
     update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
     if update_dict:
-        result = await db.policy_types.update_one(
-            {"id": type_id},
-            {"$set": update_dict}
-        )
+        change = pending_change("updated", current_user.id, update_dict)
+        try:
+            result = await db.policy_types.update_one(
+                {"id": type_id},
+                with_pending({"$set": update_dict}, change)
+            )
+        except DuplicateKeyError as e:
+            raise_duplicate(e, POLICY_TYPE_DUPLICATE_MESSAGES)
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Policy type not found")
+        await journal.commit("policy_type", type_id, change)
     return {"message": "Policy type updated successfully"}
 
 @api_router.delete("/policy-types/{type_id}")
 async def delete_policy_type(type_id: str, current_user: User = Depends(require_admin_or_manager)):
+    change = pending_change("deleted", current_user.id, ["is_deleted", "is_active"])
     result = await db.policy_types.update_one(
         {"id": type_id},
-        {"$set": {"is_deleted": True, "is_active": False}}
+        with_pending({"$set": {"is_deleted": True, "is_active": False}}, change)
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Policy type not found")
+    await journal.commit("policy_type", type_id, change)
     return {"message": "Policy type deleted successfully"}
 
 @api_router.patch("/policy-types/{type_id}/restore")
 async def restore_policy_type(type_id: str, current_user: User = Depends(require_admin_or_manager)):
-    result = await db.policy_types.update_one(
-        {"id": type_id},
-        {"$set": {"is_deleted": False, "is_active": True}}
-    )
+    change = pending_change("restored", current_user.id, ["is_deleted", "is_active"])
+    try:
+        result = await db.policy_types.update_one(
+            {"id": type_id},
+            with_pending({"$set": {"is_deleted": False, "is_active": True}}, change)
+        )
+    except DuplicateKeyError as e:
+        raise_duplicate(e, POLICY_TYPE_DUPLICATE_MESSAGES)
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Policy type not found")
+    await journal.commit("policy_type", type_id, change)
     return {"message": "Policy type restored successfully"}
 
 # Category Routes
 @api_router.post("/categories", response_model=Category)
 async def create_category(category_data: CategoryCreate, current_user: User = Depends(require_admin_or_manager)):
-    # Check if code already exists
-    existing_category = await db.categories.find_one({"code": category_data.code.upper(), "is_deleted": False})
-    if existing_category:
-        raise HTTPException(status_code=400, detail="Category code already exists")
-    
+    # The unique code index rejects duplicates
     category_dict = category_data.dict()
     category_dict["code"] = category_data.code.upper()
     category = Category(**category_dict)
-    await db.categories.insert_one(category.dict())
+    change = pending_change("created", current_user.id)
+    try:
+        await db.categories.insert_one({**category.dict(), PENDING_FIELD: [change]})
+    except DuplicateKeyError as e:
+        raise_duplicate(e, CATEGORY_DUPLICATE_MESSAGES)
+    await journal.commit("category", category.id, change)
     return category
 
 @api_router.get("/categories", response_model=List[Category])
@@ -548,53 +841,72 @@ async def get_categories(include_deleted: bool = False, current_user: User = Dep
     else:
         query = {"is_deleted": False, "is_active": True}
     
-    categories = await db.categories.find(query).to_list(None)
-    result = []
-    for cat in categories:
-        cat.pop('_id', None)  # Remove MongoDB ObjectId
-        result.append(Category(**cat))
-    return result
+    return [Category(**cat) for cat in await reference_data.categories.find(**query)]
 
 @api_router.patch("/categories/{category_id}")
 async def update_category(category_id: str, update_data: CategoryUpdate, current_user: User = Depends(require_admin_or_manager)):
     update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
     if update_dict:
-        result = await db.categories.update_one(
-            {"id": category_id},
-            {"$set": update_dict}
-        )
+        change = pending_change("updated", current_user.id, update_dict)
+        try:
+            result = await db.categories.update_one(
+                {"id": category_id},
+                with_pending({"$set": update_dict}, change)
+            )
+        except DuplicateKeyError as e:
+            raise_duplicate(e, CATEGORY_DUPLICATE_MESSAGES)
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Category not found")
+        await journal.commit("category", category_id, change)
     return {"message": "Category updated successfully"}
 
 @api_router.delete("/categories/{category_id}")
 async def delete_category(category_id: str, current_user: User = Depends(require_admin_or_manager)):
+    change = pending_change("deleted", current_user.id, ["is_deleted", "is_active"])
     result = await db.categories.update_one(
         {"id": category_id},
-        {"$set": {"is_deleted": True, "is_active": False}}
+        with_pending({"$set": {"is_deleted": True, "is_active": False}}, change)
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    await journal.commit("category", category_id, change)
     return {"message": "Category deleted successfully"}
 
 @api_router.patch("/categories/{category_id}/restore")
 async def restore_category(category_id: str, current_user: User = Depends(require_admin_or_manager)):
-    result = await db.categories.update_one(
-        {"id": category_id},
-        {"$set": {"is_deleted": False, "is_active": True}}
-    )
+    change = pending_change("restored", current_user.id, ["is_deleted", "is_active"])
+    try:
+        result = await db.categories.update_one(
+            {"id": category_id},
+            with_pending({"$set": {"is_deleted": False, "is_active": True}}, change)
+        )
+    except DuplicateKeyError as e:
+        raise_duplicate(e, CATEGORY_DUPLICATE_MESSAGES)
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    await journal.commit("category", category_id, change)
     return {"message": "Category restored successfully"}
 
 # Public Routes (No Authentication Required)
+def public_not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Add the public caching headers; returns the 304 to send when the client's copy is current.
+
+    Take the ETag before querying, so a concurrent change can only make the body newer than its tag.
+    """
+    response.headers.update({"ETag": etag, "Cache-Control": PUBLIC_CACHE_CONTROL})
+    return not_modified(request, etag, {"Cache-Control": PUBLIC_CACHE_CONTROL})
+
 @api_router.get("/public/policies", response_model=List[Policy])
 async def get_public_policies(
+    request: Request,
+    response: Response,
     status: Optional[PolicyStatus] = None,
     category_id: Optional[str] = None,
     search: Optional[str] = None
 ):
     """Public endpoint to get all policies visible to users"""
+    if cached := public_not_modified(request, response, await collection_versions.etag("policy")):
+        return cached
     query = {
         "status": {"$in": ["active", "archived"]},
         "is_visible_to_users": True
@@ -619,7 +931,7 @@ async def get_public_policies(
     return result
 
 @api_router.get("/public/policies/{policy_id}", response_model=Policy)
-async def get_public_policy(policy_id: str):
+async def get_public_policy(policy_id: str, response: Response):
     """Public endpoint to get a specific policy if it's visible to users"""
     policy = await db.policies.find_one({
         "id": policy_id,
@@ -630,10 +942,12 @@ async def get_public_policy(policy_id: str):
         raise HTTPException(status_code=404, detail="Policy not found")
     
     policy.pop('_id', None)  # Remove MongoDB ObjectId
-    return Policy(**policy)
+    policy = Policy(**policy)
+    response.headers["ETag"] = revision_etag(policy.revision)
+    return policy
 
 @api_router.get("/public/policies/{policy_id}/download")
-async def download_public_policy(policy_id: str):
+async def download_public_policy(policy_id: str, request: Request):
     """Public endpoint to download a policy document if it's visible to users"""
     policy = await db.policies.find_one({
         "id": policy_id,
@@ -643,41 +957,23 @@ async def download_public_policy(policy_id: str):
     if not policy:
         raise HTTPException(status_code=404, detail="Policy not found")
     
-    file_path = UPLOAD_DIR / policy["file_url"].split("/")[-1]
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found")
-    
-    return FileResponse(
-        path=str(file_path),
-        filename=policy["file_name"],
-        media_type='application/octet-stream'
-    )
+    return await download_record_file(request, policy, cache_control="public, no-cache")
 
 @api_router.get("/public/categories", response_model=List[Category])
-async def get_public_categories():
+async def get_public_categories(request: Request, response: Response):
     """Public endpoint to get all active categories"""
-    categories = await db.categories.find({
-        "is_deleted": False, 
-        "is_active": True
-    }).to_list(None)
-    result = []
-    for cat in categories:
-        cat.pop('_id', None)  # Remove MongoDB ObjectId
-        result.append(Category(**cat))
-    return result
+    await reference_data.categories.rows()
+    if cached := public_not_modified(request, response, f'W/"category-{reference_data.categories.version}"'):
+        return cached
+    return [Category(**cat) for cat in await reference_data.categories.find(is_deleted=False, is_active=True)]
 
 @api_router.get("/public/policy-types", response_model=List[PolicyType])
-async def get_public_policy_types():
+async def get_public_policy_types(request: Request, response: Response):
     """Public endpoint to get all active policy types"""
-    policy_types = await db.policy_types.find({
-        "is_deleted": False,
-        "is_active": True
-    }).to_list(None)
-    result = []
-    for pt in policy_types:
-        pt.pop('_id', None)
-        result.append(PolicyType(**pt))
-    return result
+    await reference_data.policy_types.rows()
+    if cached := public_not_modified(request, response, f'W/"policy_type-{reference_data.policy_types.version}"'):
+        return cached
+    return [PolicyType(**pt) for pt in await reference_data.policy_types.find(is_deleted=False, is_active=True)]
 
 # Policy Routes
 @api_router.post("/policies")
@@ -707,14 +1003,8 @@ async def create_policy(
         policy_number = await generate_policy_number(category_id, policy_type_id, issued_date.year)
     
     # Save file
-    file_extension = file.filename.split('.')[-1]
-    saved_filename = f"{policy_number.replace('-', '_')}_v1.{file_extension}"
-    file_path = UPLOAD_DIR / saved_filename
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    file_url = f"/uploads/{saved_filename}"
+    stored = await save_upload(file)
+    file_url = stored.file_url
     
     # Create policy
     policy = Policy(
@@ -726,18 +1016,27 @@ async def create_policy(
         owner_department=owner_department,
         file_url=file_url,
         file_name=file.filename,
-        created_by=current_user.username,
-        version_history=[PolicyVersion(
-            version_number=1,
-            upload_date=datetime.utcnow(),
-            uploaded_by=current_user.username,
-            change_summary=change_summary or "Initial version",
-            file_url=file_url,
-            file_name=file.filename
-        )]
+        file_size=stored.size,
+        file_sha256=stored.sha256,
+        created_by=current_user.username
     )
     
-    await db.policies.insert_one(policy.dict())
+    change = pending_change("created", current_user.id)
+    await db.policies.insert_one({**policy.dict(), PENDING_FIELD: [change]})
+    await record_status_change(db, policy.id, "policy", policy.status, current_user.username, policy.created_at)
+    await insert_version(db, policy.id, "policy", PolicyVersion(
+        version_number=1,
+        upload_date=datetime.utcnow(),
+        uploaded_by=current_user.username,
+        change_summary=change_summary or "Initial version",
+        file_url=file_url,
+        file_name=file.filename,
+        file_size=stored.size,
+        file_sha256=stored.sha256
+    ).dict())
+    await journal.commit("policy", policy.id, change)
+    pdf_optimizer.schedule(stored.sha256, file.filename)
+    previews.schedule(stored.sha256, blob_store.key_for(stored.sha256), file.filename)
     return {"message": "Policy created successfully", "policy_number": policy_number}
 
 @api_router.get("/policies", response_model=List[Policy])
@@ -746,6 +1045,7 @@ async def get_policies(
     category_id: Optional[str] = None,
     include_hidden: bool = False,
     include_deleted: bool = False,
+    as_of: Optional[datetime] = Query(None, description="List policies as they stood at this moment"),
     current_user: User = Depends(get_current_user)
 ):
     query = {}
@@ -771,6 +1071,11 @@ async def get_policies(
     if category_id:
         query["category_id"] = category_id
     
+    if as_of:
+        # Status conditions then apply to the status in effect at as_of
+        prefilter = {"category_id": category_id} if category_id else None
+        return [Policy(**policy) for policy in await find_as_of(db.policies, as_of, query, prefilter)]
+    
     policies = await db.policies.find(query).to_list(None)
     result = []
     for policy in policies:
@@ -779,7 +1084,7 @@ async def get_policies(
     return result
 
 @api_router.get("/policies/{policy_id}", response_model=Policy)
-async def get_policy(policy_id: str, current_user: User = Depends(get_current_user)):
+async def get_policy(policy_id: str, response: Response, current_user: User = Depends(get_current_user)):
     policy = await db.policies.find_one({"id": policy_id})
     if not policy:
         raise HTTPException(status_code=404, detail="Policy not found")
@@ -790,58 +1095,86 @@ async def get_policy(policy_id: str, current_user: User = Depends(get_current_us
             raise HTTPException(status_code=404, detail="Policy not found")
     
     policy.pop('_id', None)  # Remove MongoDB ObjectId
-    return Policy(**policy)
+    policy = Policy(**policy)
+    response.headers["ETag"] = revision_etag(policy.revision)
+    return policy
 
 @api_router.patch("/policies/{policy_id}")
-async def update_policy(policy_id: str, update_data: PolicyUpdate, current_user: User = Depends(require_admin_or_manager)):
+async def update_policy(
+    policy_id: str,
+    update_data: PolicyUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(require_admin_or_manager)
+):
     update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
     if update_dict:
         update_dict["modified_by"] = current_user.username
         update_dict["modified_at"] = datetime.utcnow()
         
-        result = await db.policies.update_one(
-            {"id": policy_id},
-            {"$set": update_dict}
+        change = pending_change("updated", current_user.id, update_dict)
+        updated = await db.policies.find_one_and_update(
+            revision_filter(policy_id, if_match),
+            with_pending({"$set": update_dict, "$inc": {"revision": 1}}, change),
+            projection={"_id": 0, "revision": 1},
+            return_document=ReturnDocument.AFTER
         )
-        if result.modified_count == 0:
-            raise HTTPException(status_code=404, detail="Policy not found")
+        if not updated:
+            await raise_write_conflict(db.policies, policy_id, if_match, "Policy not found")
+        if "status" in update_dict:
+            await record_status_change(db, policy_id, "policy", update_dict["status"], current_user.username)
+        await journal.commit("policy", policy_id, change)
+        response.headers["ETag"] = revision_etag(updated["revision"])
     return {"message": "Policy updated successfully"}
 
 @api_router.patch("/policies/{policy_id}/visibility")
 async def toggle_policy_visibility(policy_id: str, is_visible: bool, current_user: User = Depends(require_admin_or_manager)):
+    change = pending_change("updated", current_user.id, ["is_visible_to_users"])
     result = await db.policies.update_one(
         {"id": policy_id},
-        {"$set": {"is_visible_to_users": is_visible, "modified_by": current_user.username, "modified_at": datetime.utcnow()}}
+        with_pending({"$set": {"is_visible_to_users": is_visible, "modified_by": current_user.username, "modified_at": datetime.utcnow()},
+         "$inc": {"revision": 1}}, change)
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Policy not found")
+    await journal.commit("policy", policy_id, change)
     return {"message": f"Policy {'shown' if is_visible else 'hidden'} successfully"}
 
 @api_router.delete("/policies/{policy_id}")
 async def delete_policy(policy_id: str, current_user: User = Depends(require_admin_or_manager)):
+    change = pending_change("deleted", current_user.id, ["status"])
     result = await db.policies.update_one(
         {"id": policy_id},
-        {"$set": {"status": "deleted", "modified_by": current_user.username, "modified_at": datetime.utcnow()}}
+        with_pending({"$set": {"status": "deleted", "modified_by": current_user.username, "modified_at": datetime.utcnow()},
+         "$inc": {"revision": 1}}, change)
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Policy not found")
+    await record_status_change(db, policy_id, "policy", "deleted", current_user.username)
+    await journal.commit("policy", policy_id, change)
     return {"message": "Policy deleted successfully"}
 
 @api_router.patch("/policies/{policy_id}/restore")
 async def restore_policy(policy_id: str, current_user: User = Depends(require_admin_or_manager)):
+    change = pending_change("restored", current_user.id, ["status"])
     result = await db.policies.update_one(
         {"id": policy_id},
-        {"$set": {"status": "active", "modified_by": current_user.username, "modified_at": datetime.utcnow()}}
+        with_pending({"$set": {"status": "active", "modified_by": current_user.username, "modified_at": datetime.utcnow()},
+         "$inc": {"revision": 1}}, change)
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Policy not found")
+    await record_status_change(db, policy_id, "policy", "active", current_user.username)
+    await journal.commit("policy", policy_id, change)
     return {"message": "Policy restored successfully"}
 
 @api_router.patch("/policies/{policy_id}/document")
 async def update_policy_document(
     policy_id: str,
+    response: Response,
     file: UploadFile = File(...),
     change_summary: Optional[str] = Form("Document updated"),
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(require_admin_or_manager)
 ):
     """Update/replace the document for an existing policy"""
@@ -854,18 +1187,15 @@ async def update_policy_document(
     if not existing_policy:
         raise HTTPException(status_code=404, detail="Policy not found")
     
-    # Generate new file name with incremented version
+    revisions = parse_if_match(if_match)
+    if revisions is not None and existing_policy["revision"] not in revisions:
+        raise HTTPException(status_code=412, detail="Precondition failed: record was modified by someone else")
+    
     new_version = existing_policy["version"] + 1
-    file_extension = file.filename.split('.')[-1]
-    policy_number = existing_policy["policy_number"]
-    saved_filename = f"{policy_number.replace('-', '_')}_v{new_version}.{file_extension}"
-    file_path = UPLOAD_DIR / saved_filename
     
     # Save new file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    new_file_url = f"/uploads/{saved_filename}"
+    stored = await save_upload(file)
+    new_file_url = stored.file_url
     
     # Create new version history entry
     new_version_entry = PolicyVersion(
@@ -874,7 +1204,9 @@ async def update_policy_document(
         uploaded_by=current_user.username,
         change_summary=change_summary or "Document updated",
         file_url=new_file_url,
-        file_name=file.filename
+        file_name=file.filename,
+        file_size=stored.size,
+        file_sha256=stored.sha256
     )
     
     # Update policy with new document and version
@@ -882,28 +1214,78 @@ async def update_policy_document(
         "version": new_version,
         "file_url": new_file_url,
         "file_name": file.filename,
+        "file_size": stored.size,
+        "file_sha256": stored.sha256,
+        "web_file_url": None,
+        "web_file_size": None,
+        "web_file_sha256": None,
+        "thumbnail_url": None,
+        "preview_url": None,
         "modified_by": current_user.username,
-        "modified_at": datetime.utcnow(),
-        "$push": {"version_history": new_version_entry.dict()}
+        "modified_at": datetime.utcnow()
     }
     
+    change = pending_change("updated", current_user.id, update_data)
+    # Guard on the revision we read so concurrent uploads cannot both claim this version number
     result = await db.policies.update_one(
-        {"id": policy_id},
-        {"$set": {k: v for k, v in update_data.items() if k != "$push"},
-         "$push": update_data["$push"]}
+        {"id": policy_id, "revision": existing_policy["revision"]},
+        with_pending({"$set": update_data, "$inc": {"revision": 1}}, change)
     )
     
     if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Failed to update policy")
-    
+        await blob_store.release(stored.sha256)  # the upload's reference; nothing points at it
+        raise HTTPException(status_code=409, detail="Policy was modified concurrently, please retry")
+    await insert_version(db, policy_id, "policy", new_version_entry.dict())
+    pdf_optimizer.schedule(stored.sha256, file.filename)
+    previews.schedule(stored.sha256, blob_store.key_for(stored.sha256), file.filename)
+    await journal.commit("policy", policy_id, change)
+    delta_store.schedule(existing_policy.get("file_sha256"), stored.sha256, existing_policy["version"])
+    
+    response.headers["ETag"] = revision_etag(existing_policy["revision"] + 1)
     return {
         "message": "Policy document updated successfully", 
         "new_version": new_version,
         "file_url": new_file_url
     }
 
+@api_router.get("/policies/{policy_id}/versions")
+async def get_policy_versions(
+    policy_id: str,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    """Version history of a policy, newest first."""
+    policy = await db.policies.find_one({"id": policy_id}, {"status": 1, "is_visible_to_users": 1})
+    if not policy:
+        raise HTTPException(status_code=404, detail="Policy not found")
+    
+    if current_user.role not in [UserRole.ADMIN, UserRole.POLICY_MANAGER]:
+        if policy["status"] == "deleted" or not policy.get("is_visible_to_users", True):
+            raise HTTPException(status_code=404, detail="Policy not found")
+    
+    return await version_page(policy_id, PolicyVersion, skip, limit)
+
+@api_router.get("/policies/{policy_id}/diff")
+async def get_policy_diff(
+    policy_id: str,
+    from_version: int = Query(..., alias="from", ge=1),
+    to_version: int = Query(..., alias="to", ge=1),
+    current_user: User = Depends(get_current_user)
+):
+    """Line diff of the text of two versions of a policy."""
+    policy = await db.policies.find_one({"id": policy_id}, {"status": 1, "is_visible_to_users": 1})
+    if not policy:
+        raise HTTPException(status_code=404, detail="Policy not found")
+    
+    if current_user.role not in [UserRole.ADMIN, UserRole.POLICY_MANAGER]:
+        if policy["status"] == "deleted" or not policy.get("is_visible_to_users", True):
+            raise HTTPException(status_code=404, detail="Policy not found")
+    
+    return await version_diff(policy_id, from_version, to_version)
+
 @api_router.get("/policies/{policy_id}/download")
-async def download_policy(policy_id: str, current_user: User = Depends(get_current_user)):
+async def download_policy(policy_id: str, request: Request, current_user: User = Depends(get_current_user)):
     policy = await db.policies.find_one({"id": policy_id})
     if not policy:
         raise HTTPException(status_code=404, detail="Policy not found")
@@ -913,15 +1295,7 @@ async def download_policy(policy_id: str, current_user: User = Depends(get_curre
         if policy["status"] == "deleted" or not policy.get("is_visible_to_users", True):
             raise HTTPException(status_code=404, detail="Policy not found")
     
-    file_path = UPLOAD_DIR / policy["file_url"].split("/")[-1]
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found")
-    
-    return FileResponse(
-        path=str(file_path),
-        filename=policy["file_name"],
-        media_type='application/octet-stream'
-    )
+    return await download_record_file(request, policy)
 
 # User Management Routes
 @api_router.get("/users", response_model=List[User])
@@ -940,42 +1314,56 @@ async def get_users(include_deleted: bool = False, current_user: User = Depends(
 async def update_user(user_id: str, update_data: UserUpdate, current_user: User = Depends(require_admin)):
     update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
     if update_dict:
-        result = await db.users.update_one(
-            {"id": user_id},
-            {"$set": update_dict}
-        )
+        change = pending_change("updated", current_user.id, update_dict)
+        try:
+            result = await db.users.update_one(
+                {"id": user_id},
+                with_pending({"$set": update_dict}, change)
+            )
+        except DuplicateKeyError as e:
+            raise_duplicate(e, USER_DUPLICATE_MESSAGES)
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
+        await journal.commit("user", user_id, change)
     return {"message": "User updated successfully"}
 
 @api_router.patch("/users/{user_id}/approve")
 async def approve_user(user_id: str, current_user: User = Depends(require_admin)):
+    change = pending_change("updated", current_user.id, ["is_approved"])
     result = await db.users.update_one(
         {"id": user_id},
-        {"$set": {"is_approved": True}}
+        with_pending({"$set": {"is_approved": True}}, change)
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    await journal.commit("user", user_id, change)
     return {"message": "User approved successfully"}
 
 @api_router.patch("/users/{user_id}/suspend")
 async def suspend_user(user_id: str, current_user: User = Depends(require_admin)):
+    change = pending_change("updated", current_user.id, ["is_suspended"])
     result = await db.users.update_one(
         {"id": user_id},
-        {"$set": {"is_suspended": True}}
+        with_pending({"$set": {"is_suspended": True}}, change)
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    await journal.commit("user", user_id, change)
     return {"message": "User suspended successfully"}
 
 @api_router.patch("/users/{user_id}/restore")
 async def restore_user(user_id: str, current_user: User = Depends(require_admin)):
-    result = await db.users.update_one(
-        {"id": user_id},
-        {"$set": {"is_suspended": False, "is_deleted": False, "is_active": True}}
-    )
+    change = pending_change("restored", current_user.id, ["is_suspended", "is_deleted", "is_active"])
+    try:
+        result = await db.users.update_one(
+            {"id": user_id},
+            with_pending({"$set": {"is_suspended": False, "is_deleted": False, "is_active": True}}, change)
+        )
+    except DuplicateKeyError as e:
+        raise_duplicate(e, USER_DUPLICATE_MESSAGES)
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    await journal.commit("user", user_id, change)
     return {"message": "User restored successfully"}
 
 @api_router.delete("/users/{user_id}")
@@ -984,32 +1372,31 @@ async def delete_user(user_id: str, current_user: User = Depends(require_admin))
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
     
+    change = pending_change("deleted", current_user.id, ["is_deleted", "is_active"])
     result = await db.users.update_one(
         {"id": user_id},
-        {"$set": {"is_deleted": True, "is_active": False}}
+        with_pending({"$set": {"is_deleted": True, "is_active": False}}, change)
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    await journal.commit("user", user_id, change)
     return {"message": "User deleted successfully"}
 
 @api_router.patch("/users/{user_id}/role")
 async def update_user_role(user_id: str, role: UserRole, current_user: User = Depends(require_admin)):
+    change = pending_change("updated", current_user.id, ["role"])
     result = await db.users.update_one(
         {"id": user_id},
-        {"$set": {"role": role}}
+        with_pending({"$set": {"role": role}}, change)
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    await journal.commit("user", user_id, change)
     return {"message": "User role updated successfully"}
 
 # User Group Routes
 @api_router.post("/user-groups", response_model=UserGroup)
 async def create_user_group(group_data: UserGroupCreate, current_user: User = Depends(require_admin)):
-    # Check if code already exists
-    existing_group = await db.user_groups.find_one({"code": group_data.code.upper(), "is_deleted": False})
-    if existing_group:
-        raise HTTPException(status_code=400, detail="User group code already exists")
-    
     user_group = UserGroup(
         name=group_data.name,
         code=group_data.code.upper(),
@@ -1017,7 +1404,13 @@ async def create_user_group(group_data: UserGroupCreate, current_user: User = De
         department=group_data.department
     )
     
-    await db.user_groups.insert_one(user_group.dict())
+    change = pending_change("created", current_user.id)
+    # The unique code index rejects duplicates
+    try:
+        await db.user_groups.insert_one({**user_group.dict(), PENDING_FIELD: [change]})
+    except DuplicateKeyError as e:
+        raise_duplicate(e, USER_GROUP_DUPLICATE_MESSAGES)
+    await journal.commit("user_group", user_group.id, change)
     return user_group
 
 @api_router.get("/user-groups")
@@ -1026,20 +1419,14 @@ async def get_user_groups(include_deleted: bool = False, current_user: User = De
     if not include_deleted:
         query["is_deleted"] = False
     
-    groups = []
-    async for group in db.user_groups.find(query):
-        group.pop('_id', None)
-        groups.append(UserGroup(**group))
-    
-    return groups
+    return [UserGroup(**group) for group in await reference_data.user_groups.find(**query)]
 
 @api_router.get("/user-groups/{group_id}", response_model=UserGroup)
 async def get_user_group(group_id: str, current_user: User = Depends(require_admin)):
-    group = await db.user_groups.find_one({"id": group_id, "is_deleted": False})
+    group = await reference_data.user_groups.get(group_id, is_deleted=False)
     if not group:
         raise HTTPException(status_code=404, detail="User group not found")
     
-    group.pop('_id', None)
     return UserGroup(**group)
 
 @api_router.put("/user-groups/{group_id}", response_model=UserGroup)
@@ -1048,14 +1435,6 @@ async def update_user_group(group_id: str, group_data: UserGroupUpdate, current_
     if group_data.name is not None:
         update_data["name"] = group_data.name
     if group_data.code is not None:
-        # Check if new code already exists (excluding current group)
-        existing_group = await db.user_groups.find_one({
-            "code": group_data.code.upper(), 
-            "is_deleted": False,
-            "id": {"$ne": group_id}
-        })
-        if existing_group:
-            raise HTTPException(status_code=400, detail="User group code already exists")
         update_data["code"] = group_data.code.upper()
     if group_data.description is not None:
         update_data["description"] = group_data.description
@@ -1066,40 +1445,165 @@ async def update_user_group(group_id: str, group_data: UserGroupUpdate, current_
     if group_data.is_deleted is not None:
         update_data["is_deleted"] = group_data.is_deleted
     
+    # Update and return the group in one round trip
     if update_data:
-        result = await db.user_groups.update_one({"id": group_id}, {"$set": update_data})
-        if result.modified_count == 0:
-            raise HTTPException(status_code=404, detail="User group not found")
-    
-    # Return updated group
-    updated_group = await db.user_groups.find_one({"id": group_id})
+        change = pending_change("updated", current_user.id, update_data)
+        try:
+            updated_group = await db.user_groups.find_one_and_update(
+                {"id": group_id},
+                with_pending({"$set": update_data}, change),
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError as e:
+            raise_duplicate(e, USER_GROUP_DUPLICATE_MESSAGES)
+    else:
+        updated_group = await db.user_groups.find_one({"id": group_id}, {"_id": 0})
     if not updated_group:
         raise HTTPException(status_code=404, detail="User group not found")
+    if update_data:
+        await journal.commit("user_group", group_id, change)
     
-    updated_group.pop('_id', None)
     return UserGroup(**updated_group)
 
 @api_router.delete("/user-groups/{group_id}")
 async def delete_user_group(group_id: str, current_user: User = Depends(require_admin)):
+    change = pending_change("deleted", current_user.id, ["is_deleted", "is_active"])
     result = await db.user_groups.update_one(
         {"id": group_id},
-        {"$set": {"is_deleted": True, "is_active": False}}
+        with_pending({"$set": {"is_deleted": True, "is_active": False}}, change)
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User group not found")
+    await journal.commit("user_group", group_id, change)
     return {"message": "User group deleted successfully"}
 
 @api_router.patch("/user-groups/{group_id}/restore")
 async def restore_user_group(group_id: str, current_user: User = Depends(require_admin)):
-    result = await db.user_groups.update_one(
-        {"id": group_id},
-        {"$set": {"is_deleted": False, "is_active": True}}
-    )
+    change = pending_change("restored", current_user.id, ["is_deleted", "is_active"])
+    try:
+        result = await db.user_groups.update_one(
+            {"id": group_id},
+            with_pending({"$set": {"is_deleted": False, "is_active": True}}, change)
+        )
+    except DuplicateKeyError as e:
+        raise_duplicate(e, USER_GROUP_DUPLICATE_MESSAGES)
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User group not found")
+    await journal.commit("user_group", group_id, change)
     return {"message": "User group restored successfully"}
 
 # Document Routes (Enhanced version of policies)
+async def check_document_references(category_id: Optional[str], policy_type_id: Optional[str]):
+    """Verify the referenced category / policy type exist (memory reads, see reference_data.py)."""
+    if category_id is not None and not await reference_data.categories.get(category_id, is_deleted=False):
+        raise HTTPException(status_code=404, detail="Category not found")
+    if policy_type_id and not await reference_data.policy_types.get(policy_type_id, is_active=True, is_deleted=False):
+        raise HTTPException(status_code=404, detail="Policy type not found")
+
+def check_document_extension(file_name: str):
+    if Path(file_name).suffix.lower() not in DOCUMENT_EXTENSIONS:
+        raise HTTPException(
+            status_code=400, 
+            detail="Invalid file type. Only PDF, DOCX, DOC, and TXT files are allowed."
+        )
+
+async def insert_document(document_data: DocumentCreate, stored: StoredFile, file_name: str, current_user: User) -> Document:
+    """Create a document at version 1 for an already stored file."""
+    doc_number = await generate_document_number(
+        document_data.category_id, document_data.policy_type_id, document_data.document_type, document_data.date_issued.year
+    )
+    document = Document(
+        title=document_data.title,
+        document_type=document_data.document_type,
+        category_id=document_data.category_id,
+        policy_type_id=document_data.policy_type_id,
+        date_issued=document_data.date_issued,
+        owner_department=document_data.owner_department,
+        document_number=doc_number,
+        description=document_data.description,
+        tags=document_data.tags or [],
+        file_url=stored.file_url,
+        file_name=file_name,
+        file_size=stored.size,
+        file_sha256=stored.sha256,
+        created_by=current_user.id
+    )
+    
+    change = pending_change("created", current_user.id)
+    await db.documents.insert_one({**document.dict(), PENDING_FIELD: [change]})
+    await record_status_change(db, document.id, "document", document.status, current_user.id, document.created_at)
+    await insert_version(db, document.id, "document", DocumentVersion(
+        version_number=1,
+        upload_date=datetime.utcnow(),
+        uploaded_by=current_user.id,
+        change_summary="Initial version",
+        file_url=stored.file_url,
+        file_name=file_name,
+        file_size=stored.size,
+        file_sha256=stored.sha256
+    ).dict())
+    await journal.commit("document", document.id, change)
+    pdf_optimizer.schedule(stored.sha256, file_name)
+    previews.schedule(stored.sha256, blob_store.key_for(stored.sha256), file_name)
+    return document
+
+async def add_document_version(
+    document_id: str, stored: StoredFile, file_name: str, change_summary: Optional[str], current_user: User
+) -> Document:
+    """Make an already stored file the next version of a document.
+
+    The upload's blob reference is released again if the document cannot take the version.
+    """
+    existing_doc = await db.documents.find_one({"id": document_id}, {"version": 1, "revision": 1, "file_sha256": 1})
+    if not existing_doc:
+        await blob_store.release(stored.sha256)
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    new_version = existing_doc["version"] + 1
+    new_version_entry = DocumentVersion(
+        version_number=new_version,
+        upload_date=datetime.utcnow(),
+        uploaded_by=current_user.id,
+        change_summary=change_summary or "Document updated",
+        file_url=stored.file_url,
+        file_name=file_name,
+        file_size=stored.size,
+        file_sha256=stored.sha256
+    )
+    
+    change = pending_change("updated", current_user.id, ["version", "file_url", "file_name", "file_size", "file_sha256"])
+    # Guard on the revision we read so concurrent uploads cannot both claim this version number
+    updated_doc = await db.documents.find_one_and_update(
+        {"id": document_id, "revision": existing_doc["revision"]},
+        with_pending({"$set": {
+            "version": new_version,
+            "file_url": stored.file_url,
+            "file_name": file_name,
+            "file_size": stored.size,
+            "file_sha256": stored.sha256,
+            "web_file_url": None,
+            "web_file_size": None,
+            "web_file_sha256": None,
+            "thumbnail_url": None,
+            "preview_url": None,
+            "modified_by": current_user.id,
+            "modified_at": datetime.utcnow()
+        },
+         "$inc": {"revision": 1}}, change),
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated_doc:
+        await blob_store.release(stored.sha256)
+        raise HTTPException(status_code=409, detail="Document was modified concurrently, please retry")
+    await insert_version(db, document_id, "document", new_version_entry.dict())
+    pdf_optimizer.schedule(stored.sha256, file_name)
+    previews.schedule(stored.sha256, blob_store.key_for(stored.sha256), file_name)
+    await journal.commit("document", document_id, change)
+    delta_store.schedule(existing_doc.get("file_sha256"), stored.sha256, existing_doc["version"])
+    return Document(**updated_doc)
+
 @api_router.post("/documents")
 async def upload_document(
     title: str = Form(...),
@@ -1114,13 +1618,7 @@ async def upload_document(
     current_user: User = Depends(require_admin_or_manager)
 ):
     # Validate file type
-    allowed_extensions = ['.pdf', '.docx', '.doc', '.txt']
-    file_extension = Path(file.filename).suffix.lower()
-    if file_extension not in allowed_extensions:
-        raise HTTPException(
-            status_code=400, 
-            detail="Invalid file type. Only PDF, DOCX, DOC, and TXT files are allowed."
-        )
+    check_document_extension(file.filename)
     
     # Parse date
     try:
@@ -1131,58 +1629,89 @@ async def upload_document(
     # Parse tags
     tag_list = [tag.strip() for tag in tags.split(',') if tag.strip()] if tags else []
     
-    # Verify category exists
-    category = await db.categories.find_one({"id": category_id, "is_deleted": False})
-    if not category:
-        raise HTTPException(status_code=404, detail="Category not found")
-    
-    # Verify policy type if provided
-    if policy_type_id:
-        policy_type = await db.policy_types.find_one({"id": policy_type_id, "is_active": True, "is_deleted": False})
-        if not policy_type:
-            raise HTTPException(status_code=404, detail="Policy type not found")
-    
-    # Generate document number
-    year = issued_date.year
-    doc_number = await generate_document_number(category_id, policy_type_id, document_type, year)
+    # Verify category and policy type exist
+    await check_document_references(category_id, policy_type_id)
     
     # Save file
-    file_path = UPLOAD_DIR / file.filename
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    stored = await save_upload(file)
     
     # Create document
-    document = Document(
+    document = await insert_document(DocumentCreate(
         title=title,
         document_type=document_type,
         category_id=category_id,
         policy_type_id=policy_type_id,
         date_issued=issued_date,
         owner_department=owner_department,
-        document_number=doc_number,
         description=description,
-        tags=tag_list,
-        file_url=f"/uploads/{file.filename}",
-        file_name=file.filename,
-        created_by=current_user.id,
-        version_history=[
-            DocumentVersion(
-                version_number=1,
-                upload_date=datetime.utcnow(),
-                uploaded_by=current_user.id,
-                change_summary="Initial version",
-                file_url=f"/uploads/{file.filename}",
-                file_name=file.filename
-            )
-        ]
-    )
-    
-    await db.documents.insert_one(document.dict())
+        tags=tag_list
+    ), stored, file.filename, current_user)
     return {"message": "Document uploaded successfully", "document": document}
 
+# Resumable Upload Routes
+@api_router.post("/uploads", response_model=UploadSession)
+async def create_upload_session(session_data: UploadSessionCreate, current_user: User = Depends(require_admin_or_manager)):
+    check_document_extension(session_data.file_name)
+    check_declared_size(session_data.file_name, session_data.size)
+    return await upload_sessions.create(session_data.file_name, session_data.size, current_user.id)
+
+@api_router.get("/uploads/{session_id}", response_model=UploadSession)
+async def get_upload_session(session_id: str, current_user: User = Depends(require_admin_or_manager)):
+    return await upload_sessions.get(session_id, current_user.id)
+
+@api_router.put("/uploads/{session_id}", response_model=UploadSession)
+async def upload_chunk(
+    session_id: str,
+    offset: int,
+    request: Request,
+    current_user: User = Depends(require_admin_or_manager)
+):
+    """Append the raw request body at `offset`; the response carries the new offset to resume from."""
+    return await upload_sessions.write(session_id, current_user.id, offset, request.stream())
+
+@api_router.delete("/uploads/{session_id}")
+async def abort_upload_session(session_id: str, current_user: User = Depends(require_admin_or_manager)):
+    await upload_sessions.abort(session_id, current_user.id)
+    return {"message": "Upload session aborted"}
+
+@api_router.post("/uploads/{session_id}/finalize")
+async def finalize_upload(
+    session_id: str,
+    finalize_data: UploadFinalize,
+    current_user: User = Depends(require_admin_or_manager)
+):
+    """Turn a completed upload into a new document or a new version of an existing one."""
+    if (finalize_data.document_id is None) == (finalize_data.document is None):
+        raise HTTPException(status_code=400, detail="Provide either document_id or document")
+    
+    # Validate before consuming the session so a rejected request can be corrected and retried
+    if finalize_data.document is not None:
+        await check_document_references(finalize_data.document.category_id, finalize_data.document.policy_type_id)
+    elif not await db.documents.find_one({"id": finalize_data.document_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    session, temp_path, sha256 = await upload_sessions.claim_complete(session_id, current_user.id)
+    try:
+        await validate_file(temp_path, session.file_name)
+        await blob_store.commit(temp_path, sha256, session.size)
+    except BaseException:
+        if await aiofiles.os.path.exists(temp_path):
+            await aiofiles.os.remove(temp_path)
+        raise
+    await blob_store.add_ref(sha256, session.size)
+    stored = StoredFile(file_url=blob_store.url_for(sha256), size=session.size, sha256=sha256)
+    
+    if finalize_data.document is not None:
+        document = await insert_document(finalize_data.document, stored, session.file_name, current_user)
+        return {"message": "Document uploaded successfully", "document": document}
+    document = await add_document_version(
+        finalize_data.document_id, stored, session.file_name, finalize_data.change_summary, current_user
+    )
+    return {"message": "Document updated successfully", "document": document}
+
 async def generate_document_number(category_id: str, policy_type_id: str, document_type: DocumentType, year: int) -> str:
     # Get category
-    category = await db.categories.find_one({"id": category_id, "is_deleted": False})
+    category = await reference_data.categories.get(category_id, is_deleted=False)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
@@ -1190,13 +1719,13 @@ async def generate_document_number(category_id: str, policy_type_id: str, docume
     
     # Get type code
     if policy_type_id:
-        policy_type = await db.policy_types.find_one({"id": policy_type_id, "is_active": True, "is_deleted": False})
+        policy_type = await reference_data.policy_types.get(policy_type_id, is_active=True, is_deleted=False)
         type_code = policy_type["code"] if policy_type else document_type.value.upper()[:2]
     else:
         type_code = document_type.value.upper()[:2]
     
     # Get next sequential number for this category and year
-    existing_docs = await db.documents.find({
+    existing_docs = await db.documents.count_documents({
         "category_id": category_id,
         "document_type": document_type,
         "date_issued": {
@@ -1204,9 +1733,9 @@ async def generate_document_number(category_id: str, policy_type_id: str, docume
             "$lt": datetime(year + 1, 1, 1)
         },
         "status": {"$ne": "deleted"}
-    }).to_list(None)
+    })
     
-    next_seq = len(existing_docs) + 1
+    next_seq = existing_docs + 1
     
     return f"{category_code}-{type_code}-{next_seq:03d}-{year}-v1"
 
@@ -1218,6 +1747,7 @@ async def get_documents(
     status: PolicyStatus = None,
     show_hidden: bool = False,
     show_deleted: bool = False,
+    as_of: Optional[datetime] = Query(None, description="List documents as they stood at this moment"),
     current_user: User = Depends(get_current_user)
 ):
     query = {}
@@ -1255,6 +1785,11 @@ async def get_documents(
     if status:
         query["status"] = status
     
+    if as_of:
+        # Status conditions then apply to the status in effect at as_of
+        prefilter = {key: query[key] for key in ("category_id", "document_type") if key in query}
+        return [Document(**doc) for doc in await find_as_of(db.documents, as_of, query, prefilter)]
+    
     documents = []
     async for doc in db.documents.find(query):
         doc.pop('_id', None)
@@ -1263,7 +1798,7 @@ async def get_documents(
     return documents
 
 @api_router.get("/documents/{document_id}", response_model=Document)
-async def get_document(document_id: str, current_user: User = Depends(get_current_user)):
+async def get_document(document_id: str, response: Response, current_user: User = Depends(get_current_user)):
     document = await db.documents.find_one({"id": document_id})
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -1276,18 +1811,19 @@ async def get_document(document_id: str, current_user: User = Depends(get_curren
             raise HTTPException(status_code=404, detail="Document not found")
     
     document.pop('_id', None)
-    return Document(**document)
+    document = Document(**document)
+    response.headers["ETag"] = revision_etag(document.revision)
+    return document
 
 @api_router.put("/documents/{document_id}", response_model=Document)
 async def update_document(
     document_id: str, 
     document_data: DocumentUpdate, 
+    response: Response,
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(require_admin_or_manager)
 ):
-    # Find existing document
-    existing_doc = await db.documents.find_one({"id": document_id})
-    if not existing_doc:
-        raise HTTPException(status_code=404, detail="Document not found")
+    await check_document_references(document_data.category_id, document_data.policy_type_id)
     
     # Build update data
     update_data = {"modified_by": current_user.id, "modified_at": datetime.utcnow()}
@@ -1297,16 +1833,8 @@ async def update_document(
     if document_data.document_type is not None:
         update_data["document_type"] = document_data.document_type
     if document_data.category_id is not None:
-        # Verify category exists
-        category = await db.categories.find_one({"id": document_data.category_id, "is_deleted": False})
-        if not category:
-            raise HTTPException(status_code=404, detail="Category not found")
         update_data["category_id"] = document_data.category_id
     if document_data.policy_type_id is not None:
-        if document_data.policy_type_id:
-            policy_type = await db.policy_types.find_one({"id": document_data.policy_type_id, "is_active": True, "is_deleted": False})
-            if not policy_type:
-                raise HTTPException(status_code=404, detail="Policy type not found")
         update_data["policy_type_id"] = document_data.policy_type_id
     if document_data.date_issued is not None:
         update_data["date_issued"] = document_data.date_issued
@@ -1323,15 +1851,23 @@ async def update_document(
     if document_data.tags is not None:
         update_data["tags"] = document_data.tags
     
-    # Update document
-    result = await db.documents.update_one({"id": document_id}, {"$set": update_data})
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Document not found")
+    change = pending_change("updated", current_user.id, update_data)
+    # Update and return the document in one round trip; If-Match is enforced in the filter
+    updated_doc = await db.documents.find_one_and_update(
+        revision_filter(document_id, if_match),
+        with_pending({"$set": update_data, "$inc": {"revision": 1}}, change),
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated_doc:
+        await raise_write_conflict(db.documents, document_id, if_match, "Document not found")
+    if document_data.status is not None:
+        await record_status_change(db, document_id, "document", document_data.status, current_user.id)
+    await journal.commit("document", document_id, change)
     
-    # Return updated document
-    updated_doc = await db.documents.find_one({"id": document_id})
-    updated_doc.pop('_id', None)
-    return Document(**updated_doc)
+    updated_doc = Document(**updated_doc)
+    response.headers["ETag"] = revision_etag(updated_doc.revision)
+    return updated_doc
 
 @api_router.patch("/documents/{document_id}/visibility")
 async def toggle_document_visibility(
@@ -1348,37 +1884,45 @@ async def toggle_document_visibility(
     if not update_data:
         raise HTTPException(status_code=400, detail="No visibility data provided")
     
+    change = pending_change("updated", current_user.id, update_data)
     result = await db.documents.update_one(
         {"id": document_id}, 
-        {"$set": update_data}
+        with_pending({"$set": update_data, "$inc": {"revision": 1}}, change)
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Document not found")
     
+    await journal.commit("document", document_id, change)
     return {"message": "Document visibility updated successfully"}
 
 @api_router.delete("/documents/{document_id}")
 async def delete_document(document_id: str, current_user: User = Depends(require_admin_or_manager)):
+    change = pending_change("deleted", current_user.id, ["status"])
     result = await db.documents.update_one(
         {"id": document_id},
-        {"$set": {"status": "deleted"}}
+        with_pending({"$set": {"status": "deleted"}, "$inc": {"revision": 1}}, change)
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Document not found")
+    await record_status_change(db, document_id, "document", "deleted", current_user.id)
+    await journal.commit("document", document_id, change)
     return {"message": "Document deleted successfully"}
 
 @api_router.patch("/documents/{document_id}/restore")
 async def restore_document(document_id: str, current_user: User = Depends(require_admin_or_manager)):
+    change = pending_change("restored", current_user.id, ["status"])
     result = await db.documents.update_one(
         {"id": document_id},
-        {"$set": {"status": "active"}}
+        with_pending({"$set": {"status": "active"}, "$inc": {"revision": 1}}, change)
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Document not found")
+    await record_status_change(db, document_id, "document", "active", current_user.id)
+    await journal.commit("document", document_id, change)
     return {"message": "Document restored successfully"}
 
 @api_router.get("/documents/{document_id}/download")
-async def download_document(document_id: str, current_user: User = Depends(get_current_user)):
+async def download_document(document_id: str, request: Request, current_user: User = Depends(get_current_user)):
     document = await db.documents.find_one({"id": document_id})
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -1390,41 +1934,217 @@ async def download_document(document_id: str, current_user: User = Depends(get_c
              not any(group in current_user.user_group_ids for group in document.get("visible_to_groups", [])))):
             raise HTTPException(status_code=404, detail="Document not found")
     
-    file_path = ROOT_DIR / document["file_url"].lstrip('/')
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found")
+    return await download_record_file(request, document)
+
+@api_router.post("/documents/bundle")
+async def download_document_bundle(bundle: DocumentBundleRequest, current_user: User = Depends(get_current_user)):
+    """Stream a ZIP of the selected documents (optionally with every historical version)."""
+    filters = bundle.dict(exclude={"document_ids", "include_versions"}, exclude_none=True)
+    if not bundle.document_ids and not filters:
+        raise HTTPException(status_code=400, detail="Provide document_ids or at least one filter")
+    
+    query: Dict[str, Any] = dict(filters)
+    if bundle.document_ids:
+        query["id"] = {"$in": bundle.document_ids}
+    # Same access rules as download_document, applied to the whole selection in one query
+    if current_user.role in [UserRole.ADMIN, UserRole.POLICY_MANAGER]:
+        if not bundle.document_ids and not bundle.status:
+            query["status"] = {"$ne": "deleted"}
+    else:
+        if bundle.status and bundle.status not in [PolicyStatus.ACTIVE, PolicyStatus.ARCHIVED]:
+            raise HTTPException(status_code=404, detail="Document not found")
+        query.setdefault("status", {"$in": ["active", "archived"]})
+        query["$or"] = [
+            {"is_visible_to_users": True},
+            {"visible_to_groups": {"$in": current_user.user_group_ids}}
+        ]
+    
+    projection = {"_id": 0, "id": 1, "document_number": 1, "title": 1, "file_url": 1, "file_name": 1,
+                  "created_at": 1, "modified_at": 1}
+    documents = await db.documents.find(query, projection).sort("document_number", 1).to_list(MAX_BUNDLE_DOCUMENTS + 1)
+    if len(documents) > MAX_BUNDLE_DOCUMENTS:
+        raise HTTPException(status_code=400, detail=f"A bundle can hold at most {MAX_BUNDLE_DOCUMENTS} documents")
+    if bundle.document_ids and len(documents) < len(set(bundle.document_ids)):
+        raise HTTPException(status_code=404, detail="Document not found")
+    if not documents:
+        raise HTTPException(status_code=404, detail="No documents match the selection")
+    
+    history: Dict[str, List[Dict[str, Any]]] = {}
+    if bundle.include_versions:
+        versions = db.document_versions.find(
+            {"document_id": {"$in": [document["id"] for document in documents]}},
+            {"_id": 0, "document_id": 1, "version_number": 1, "file_name": 1, "file_url": 1, "upload_date": 1}
+        ).sort([("document_id", 1), ("version_number", 1)])
+        async for version in versions:
+            history.setdefault(version["document_id"], []).append(version)
+    
+    names, sources = [], []
+    for document in documents:
+        # Titles and file names come from clients: each becomes a single plain path component
+        folder = safe_component(f"{document['document_number']} - {document['title']}".replace("/", "-"), "document")
+        names.append(f"{folder}/{safe_component(document['file_name'])}")
+        sources.append((document["file_url"], document.get("modified_at") or document["created_at"]))
+        if bundle.include_versions:
+            for version in history.get(document["id"], []):
+                names.append(f"{folder}/versions/v{version['version_number']} - {safe_component(version['file_name'])}")
+                sources.append((version["file_url"], version["upload_date"]))
+    entries = [
+        ZipEntry(name=name, key=key_for_url(file_url), modified=modified)
+        for name, (file_url, modified) in zip(unique_names(names), sources)
+    ]
+    
+    file_name = f"documents-{datetime.utcnow():%Y%m%d-%H%M%S}.zip"
+    return StreamingResponse(
+        stream_zip(storage, entries, delta_store.checkout),
+        media_type="application/zip",
+        headers={"Content-Disposition": content_disposition(file_name), "Cache-Control": "no-store"}
+    )
+
+@api_router.get("/documents/{document_id}/versions")
+async def get_document_versions(
+    document_id: str,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    """Version history of a document, newest first."""
+    document = await db.documents.find_one(
+        {"id": document_id}, {"status": 1, "is_visible_to_users": 1, "visible_to_groups": 1}
+    )
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    # Check access permissions
+    if current_user.role not in [UserRole.ADMIN, UserRole.POLICY_MANAGER]:
+        if (document.get("status") not in ["active", "archived"] or
+            (not document.get("is_visible_to_users", False) and 
+             not any(group in current_user.user_group_ids for group in document.get("visible_to_groups", [])))):
+            raise HTTPException(status_code=404, detail="Document not found")
     
-    return FileResponse(
-        path=file_path,
-        filename=document["file_name"],
-        media_type='application/octet-stream'
+    return await version_page(document_id, DocumentVersion, skip, limit)
+
+@api_router.get("/documents/{document_id}/diff")
+async def get_document_diff(
+    document_id: str,
+    from_version: int = Query(..., alias="from", ge=1),
+    to_version: int = Query(..., alias="to", ge=1),
+    current_user: User = Depends(get_current_user)
+):
+    """Line diff of the text of two versions of a document (unified format, memoized per file pair)."""
+    document = await db.documents.find_one(
+        {"id": document_id}, {"status": 1, "is_visible_to_users": 1, "visible_to_groups": 1}
     )
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    if current_user.role not in [UserRole.ADMIN, UserRole.POLICY_MANAGER]:
+        if (document.get("status") not in ["active", "archived"] or
+            (not document.get("is_visible_to_users", False) and 
+             not any(group in current_user.user_group_ids for group in document.get("visible_to_groups", [])))):
+            raise HTTPException(status_code=404, detail="Document not found")
+    
+    return await version_diff(document_id, from_version, to_version)
 
 # Update user group assignment
 @api_router.patch("/users/{user_id}/groups")
 async def update_user_groups(user_id: str, group_ids: List[str], current_user: User = Depends(require_admin)):
     # Verify all group IDs exist
     for group_id in group_ids:
-        group = await db.user_groups.find_one({"id": group_id, "is_deleted": False, "is_active": True})
+        group = await reference_data.user_groups.get(group_id, is_deleted=False, is_active=True)
         if not group:
             raise HTTPException(status_code=404, detail=f"User group {group_id} not found")
     
+    change = pending_change("updated", current_user.id, ["user_group_ids"])
     result = await db.users.update_one(
         {"id": user_id},
-        {"$set": {"user_group_ids": group_ids}}
+        with_pending({"$set": {"user_group_ids": group_ids}}, change)
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    await journal.commit("user", user_id, change)
     return {"message": "User groups updated successfully"}
 
+# Change journal cursor for incremental consumers (search index, caches, mirrors)
+@api_router.get("/changes")
+async def get_changes(
+    after: int = Query(0, ge=0, description="Last sequence number already processed"),
+    limit: int = Query(100, ge=1, le=1000),
+    entity: Optional[List[str]] = Query(None, description="Only these entity types (document, policy, user, ...)"),
+    current_user: User = Depends(require_admin)
+):
+    """Registry writes after `after`, oldest first; continue with the returned cursor."""
+    try:
+        changes, cursor = await journal.read(after, limit, entity)
+    except CursorExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    return {"changes": changes, "cursor": cursor, "head": await journal.head()}
+
+def event_stream(request: Request, user: Optional[User] = None, expires_at: Optional[float] = None) -> StreamingResponse:
+    if change_feed.full:
+        raise HTTPException(status_code=503, detail="Too many open change streams, retry later")
+    if user is None:
+        stream = change_feed.stream(None, [], request.is_disconnected)
+    else:
+        stream = change_feed.stream(user.role.value, user.user_group_ids, request.is_disconnected, user.id, expires_at)
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def ticket_id(ticket: str) -> str:
+    # Only the hash is stored, so the tickets cannot be read back from the database
+    return hashlib.sha256(ticket.encode()).hexdigest()
+
+# EventSource cannot send headers: a browser trades its bearer token for a short-lived, single-use ticket
+@api_router.post("/changes/stream-ticket")
+async def create_stream_ticket(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    current_user = await authenticate(credentials.credentials)
+    ticket = secrets.token_urlsafe(32)
+    await db.stream_tickets.insert_one({
+        "_id": ticket_id(ticket),
+        "username": current_user.username,
+        "token_expires_at": token_expiry(credentials.credentials),
+        "expires_at": datetime.utcnow() + STREAM_TICKET_TTL
+    })
+    return {"ticket": ticket, "expires_in": int(STREAM_TICKET_TTL.total_seconds())}
+
+# Live change notifications for open tabs
+@api_router.get("/changes/stream")
+async def stream_changes(
+    request: Request,
+    ticket: Optional[str] = Query(None, description="From POST /changes/stream-ticket, for EventSource clients"),
+    authorization: Optional[str] = Header(None)
+):
+    if ticket:
+        issued = await db.stream_tickets.find_one_and_delete(
+            {"_id": ticket_id(ticket), "expires_at": {"$gt": datetime.utcnow()}}
+        )
+        if issued is None:
+            raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+        return event_stream(request, await load_principal(issued["username"]), issued["token_expires_at"])
+    token = (authorization or "").removeprefix("Bearer ").strip()
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    current_user = await authenticate(token)
+    return event_stream(request, current_user, token_expiry(token))
+
+@api_router.get("/public/changes/stream")
+async def stream_public_changes(request: Request):
+    return event_stream(request)
+
 # Public Document API (No Authentication Required)
 @api_router.get("/public/documents")
 async def get_public_documents(
+    request: Request,
+    response: Response,
     search: str = "",
     category_id: str = "",
     document_type: DocumentType = None,
     status: PolicyStatus = None
 ):
+    if cached := public_not_modified(request, response, await collection_versions.etag("document")):
+        return cached
     query = {
         "status": {"$in": ["active", "archived"]},
         "is_visible_to_users": True
@@ -1453,8 +2173,18 @@ async def get_public_documents(
     
     return documents
 
+# Incremental catalogue sync for mirrors: changes since the last token instead of the full list
+@api_router.get("/sync")
+async def sync_public_documents(
+    since: Optional[str] = Query(None, description="Token from the previous call; omit to start with a full snapshot"),
+    limit: int = Query(200, ge=1, le=1000)
+):
+    page = await sync_page(db, journal, since, limit)
+    page["documents"] = [Document(**document) for document in page["documents"]]
+    return page
+
 @api_router.get("/public/documents/{document_id}")
-async def get_public_document(document_id: str):
+async def get_public_document(document_id: str, response: Response):
     document = await db.documents.find_one({
         "id": document_id,
         "status": {"$in": ["active", "archived"]},
@@ -1464,10 +2194,12 @@ async def get_public_document(document_id: str):
         raise HTTPException(status_code=404, detail="Document not found")
     
     document.pop('_id', None)
-    return Document(**document)
+    document = Document(**document)
+    response.headers["ETag"] = revision_etag(document.revision)
+    return document
 
 @api_router.get("/public/documents/{document_id}/download")
-async def download_public_document(document_id: str):
+async def download_public_document(document_id: str, request: Request):
     document = await db.documents.find_one({
         "id": document_id,
         "status": {"$in": ["active", "archived"]},
@@ -1476,19 +2208,39 @@ async def download_public_document(document_id: str):
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    file_path = ROOT_DIR / document["file_url"].lstrip('/')
-    if not file_path.exists():
+    return await download_record_file(request, document, cache_control="public, no-cache")
+
+# Serve uploaded files by URL (used by the in-browser viewer); replaces the old static mount
+@app.get("/uploads/{file_key:path}")
+async def serve_upload(file_key: str, request: Request):
+    key = key_for_url(f"/uploads/{file_key}")
+    if key is None or key.startswith("."):
         raise HTTPException(status_code=404, detail="File not found")
-    
-    return FileResponse(
-        path=file_path,
-        filename=document["file_name"],
-        media_type='application/octet-stream'
+    if key.startswith("blobs/"):
+        # Content-addressed: the bytes behind this URL can never change
+        sha256 = key.rsplit("/", 1)[-1]
+        return await download_response(request, key, sha256, sha256, "public, max-age=31536000, immutable")
+    return await download_response(request, key, key.rsplit("/", 1)[-1], cache_control="public, no-cache")
+
+# First-page previews by content hash; like blob URLs the hash itself is the capability
+@app.get("/preview/{sha256}/{variant}")
+async def serve_preview(sha256: str, variant: str, request: Request):
+    if len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256):
+        raise HTTPException(status_code=404, detail="Preview not found")
+    key = await previews.lookup(sha256, variant)
+    if key is None:
+        raise HTTPException(status_code=404, detail="Preview not found")
+    return await file_response(
+        request, storage, key, key.rsplit("/", 1)[-1], f"{sha256}-{variant}",
+        cache_control="public, max-age=31536000, immutable", disposition="inline"
     )
 
 # Include the router
 app.include_router(api_router)
 
+# Refuse oversized bodies before they are read (CORS is added after so it wraps the 413 too)
+app.add_middleware(BodySizeLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1506,8 +2258,58 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("startup")
 async def startup_event():
+    await ensure_indexes(db)  # raises (and so stops startup) when a unique index is missing
     await init_default_data()
+    await reference_data.load()
+    app.state.upload_gc = asyncio.create_task(purge_upload_sessions())
+    app.state.cold_mover = asyncio.create_task(move_to_cold_tier()) if cold_tier.enabled else None
+    app.state.journal_drain = asyncio.create_task(drain_change_outbox())
+    invalidation.start()
+
+async def purge_upload_sessions():
+    """Periodically drop abandoned resumable uploads and stray incoming files."""
+    while True:
+        try:
+            purged = await upload_sessions.purge_expired()
+            if purged:
+                logger.info(f"Purged {purged} abandoned uploads")
+        except Exception:
+            logger.exception("Upload session cleanup failed")
+        await asyncio.sleep(UPLOAD_GC_INTERVAL_SECONDS)
+
+async def drain_change_outbox():
+    """Journal the changes of writers that stopped between their write and its journal event."""
+    while True:
+        try:
+            drained = await journal.drain()
+            if drained:
+                logger.warning(f"Journaled {drained} changes left pending by interrupted writes")
+        except Exception:
+            logger.exception("Change journal drain failed")
+        await asyncio.sleep(PENDING_TIMEOUT.total_seconds())
+
+async def move_to_cold_tier():
+    """Run the cold tier mover every COLD_INTERVAL_HOURS, counted from the last run on any node."""
+    while True:
+        last_run = await db.maintenance.find_one({"_id": MOVER_LOCK_ID}, {"finished_at": 1}) or {}
+        wait = 0
+        if last_run.get("finished_at"):
+            wait = (last_run["finished_at"] - datetime.utcnow()).total_seconds() + cold_tier.interval
+        await asyncio.sleep(max(wait, 60))  # never right at startup
+        try:
+            await cold_tier.run()
+        except Exception:
+            logger.exception("Cold tier mover failed")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.upload_gc.cancel()
+    app.state.journal_drain.cancel()
+    if app.state.cold_mover:
+        app.state.cold_mover.cancel()
+    previews.shutdown()
+    pdf_optimizer.shutdown()
+    text_diffs.shutdown()
+    change_feed.shutdown()
+    invalidation.shutdown()
     client.close()
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""Storage backends for uploaded file bytes.
+
+The rest of the backend addresses files by key (e.g. "blobs/ab/cd/<sha256>") and
+never touches paths or buckets directly. LocalStorage keeps files under the upload
+directory; S3Storage talks to any S3-compatible service (AWS, MinIO, Ceph, moto),
+which lets several app nodes share one store and lets downloads be redirected to
+presigned URLs so file bytes never pass through the Python workers.
+
+Configuration (environment):
+    STORAGE_BACKEND      local (default) or s3
+    S3_BUCKET            bucket name (s3 only)
+    S3_PREFIX            optional key prefix inside the bucket
+    S3_ENDPOINT_URL      endpoint for non-AWS services, e.g. http://minio:9000
+    S3_REGION            region name
+    PRESIGNED_URL_TTL    lifetime of presigned download URLs in seconds (default 300)
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+class ObjectStat(BaseModel):
+    size: int
+    modified: datetime
+
+class StorageBackend:
+    """Interface every storage backend implements. Keys are '/'-separated relative paths."""
+
+    async def put(self, key: str, source: Path) -> None:
+        """Store a completed local file under `key`; `source` is consumed (moved or deleted)."""
+        raise NotImplementedError
+
+    async def get(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    async def stat(self, key: str) -> Optional[ObjectStat]:
+        """Size and modification time, or None if the key does not exist."""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def stream(self, key: str, first: int = 0, last: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield the bytes first..last (inclusive; None = end of object) in chunks."""
+        raise NotImplementedError
+
+    async def presign(self, key: str, file_name: str, content_type: str, disposition: str) -> Optional[str]:
+        """A time-limited URL the client can fetch directly, or None if unsupported."""
+        return None
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Filesystem path of the object when the backend is local, for zero-copy serving."""
+        return None
+
+    def list(self, start_after: Optional[str] = None) -> AsyncIterator[Tuple[str, ObjectStat]]:
+        """Yield every (key, stat) in lexicographic key order, optionally resuming after a key."""
+        raise NotImplementedError
+
+    async def move(self, key: str, new_key: str) -> None:
+        raise NotImplementedError
+
+def validate_key(key: str) -> str:
+    parts = key.split("/")
+    if not key or key.startswith("/") or any(part in ("", ".", "..") for part in parts):
+        raise ValueError(f"Invalid storage key: {key!r}")
+    return key
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def local_path(self, key: str) -> Path:
+        return self.root / validate_key(key)
+
+    async def put(self, key: str, source: Path) -> None:
+        destination = self.local_path(key)
+        await aiofiles.os.makedirs(destination.parent, exist_ok=True)
+        await aiofiles.os.replace(source, destination)
+
+    async def get(self, key: str) -> bytes:
+        async with aiofiles.open(self.local_path(key), "rb") as f:
+            return await f.read()
+
+    async def stat(self, key: str) -> Optional[ObjectStat]:
+        try:
+            result = await aiofiles.os.stat(self.local_path(key))
+        except FileNotFoundError:
+            return None
+        return ObjectStat(size=result.st_size, modified=datetime.fromtimestamp(result.st_mtime, timezone.utc))
+
+    async def delete(self, key: str) -> None:
+        try:
+            await aiofiles.os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    async def list(self, start_after: Optional[str] = None) -> AsyncIterator[Tuple[str, ObjectStat]]:
+        async def walk(directory: Path, prefix: str):
+            entries = await asyncio.to_thread(lambda: list(os.scandir(directory)))
+            # Sort directories as "name/" so the walk matches lexicographic order of whole keys
+            entries.sort(key=lambda entry: entry.name + "/" if entry.is_dir() else entry.name)
+            for entry in entries:
+                key = prefix + entry.name
+                if entry.is_dir():
+                    if start_after is None or start_after < key + "/" or start_after.startswith(key + "/"):
+                        async for item in walk(Path(entry.path), key + "/"):
+                            yield item
+                elif entry.is_file() and (start_after is None or key > start_after):
+                    stat = entry.stat()
+                    yield key, ObjectStat(size=stat.st_size, modified=datetime.fromtimestamp(stat.st_mtime, timezone.utc))
+
+        async for item in walk(self.root, ""):
+            yield item
+
+    async def move(self, key: str, new_key: str) -> None:
+        destination = self.local_path(new_key)
+        await aiofiles.os.makedirs(destination.parent, exist_ok=True)
+        await aiofiles.os.replace(self.local_path(key), destination)
+
+    async def stream(self, key: str, first: int = 0, last: Optional[int] = None) -> AsyncIterator[bytes]:
+        async with aiofiles.open(self.local_path(key), "rb") as f:
+            await f.seek(first)
+            remaining = None if last is None else last - first + 1
+            while remaining is None or remaining > 0:
+                chunk = await f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+class S3Storage(StorageBackend):
+    """S3-compatible object storage. boto3 is synchronous, so every call runs in a worker thread."""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, presign_ttl: int = 300, client=None):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.presign_ttl = presign_ttl
+        self.client = client or boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+
+    def object_key(self, key: str) -> str:
+        validate_key(key)
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    async def put(self, key: str, source: Path) -> None:
+        # upload_file switches to parallel multipart uploads for large files
+        await asyncio.to_thread(self.client.upload_file, str(source), self.bucket, self.object_key(key))
+        await aiofiles.os.remove(source)
+
+    async def get(self, key: str) -> bytes:
+        response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=self.object_key(key))
+        return await asyncio.to_thread(response["Body"].read)
+
+    async def stat(self, key: str) -> Optional[ObjectStat]:
+        from botocore.exceptions import ClientError
+
+        try:
+            head = await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return ObjectStat(size=head["ContentLength"], modified=head["LastModified"])
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self.object_key(key))
+
+    async def stream(self, key: str, first: int = 0, last: Optional[int] = None) -> AsyncIterator[bytes]:
+        byte_range = f"bytes={first}-{'' if last is None else last}"
+        response = await asyncio.to_thread(
+            self.client.get_object, Bucket=self.bucket, Key=self.object_key(key), Range=byte_range
+        )
+        body = response["Body"]
+        try:
+            while chunk := await asyncio.to_thread(body.read, CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
+    async def list(self, start_after: Optional[str] = None) -> AsyncIterator[Tuple[str, ObjectStat]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        params = {"Bucket": self.bucket, "Prefix": f"{self.prefix}/" if self.prefix else ""}
+        if start_after:
+            params["StartAfter"] = self.object_key(start_after)
+        pages = iter(paginator.paginate(**params))
+        while page := await asyncio.to_thread(next, pages, None):
+            for item in page.get("Contents", []):
+                key = item["Key"][len(params["Prefix"]):]
+                yield key, ObjectStat(size=item["Size"], modified=item["LastModified"])
+
+    async def move(self, key: str, new_key: str) -> None:
+        await asyncio.to_thread(
+            self.client.copy_object, Bucket=self.bucket, Key=self.object_key(new_key),
+            CopySource={"Bucket": self.bucket, "Key": self.object_key(key)}
+        )
+        await self.delete(key)
+
+    async def presign(self, key: str, file_name: str, content_type: str, disposition: str) -> Optional[str]:
+        return await asyncio.to_thread(
+            self.client.generate_presigned_url,
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self.object_key(key),
+                "ResponseContentType": content_type,
+                "ResponseContentDisposition": disposition,
+            },
+            ExpiresIn=self.presign_ttl
+        )
+
+def storage_from_env(upload_dir: Path) -> StorageBackend:
+    backend = os.environ.get("STORAGE_BACKEND", "local").lower()
+    if backend == "local":
+        return LocalStorage(upload_dir)
+    if backend == "s3":
+        return S3Storage(
+            bucket=os.environ["S3_BUCKET"],
+            prefix=os.environ.get("S3_PREFIX", ""),
+            endpoint_url=os.environ.get("S3_ENDPOINT_URL"),
+            region=os.environ.get("S3_REGION"),
+            presign_ttl=int(os.environ.get("PRESIGNED_URL_TTL", "300")),
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
@@ -0,0 +1,159 @@
+"""Text diffs between stored file versions.
+
+Text is extracted from both files and compared line by line in a process pool,
+so neither the event loop nor other requests wait for large documents. Results
+are memoized in the `text_diffs` collection under the (from, to) content-hash
+pair. Version contents never change, so a pair is diffed once and every later
+request, for any document holding the same two files, is a single lookup.
+
+Supported formats: .txt, .docx (stdlib only) and .pdf (needs `pip install pymupdf`).
+"""
+import asyncio
+import difflib
+import io
+import xml.etree.ElementTree as ElementTree
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from storage import StorageBackend
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+# Larger sources are not diffed; extraction holds the whole file in a worker
+MAX_SOURCE_BYTES = 100 * 1024 * 1024
+# Longer diffs are cut off (and flagged) so a cached result stays well below MongoDB's document limit
+MAX_DIFF_LINES = 5000
+CONTEXT_LINES = 3
+
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+def diff_supported(file_name: str) -> bool:
+    suffix = Path(file_name).suffix.lower()
+    return suffix in (".txt", ".docx") or (suffix == ".pdf" and fitz is not None)
+
+def _docx_text(source) -> str:
+    with zipfile.ZipFile(source if isinstance(source, str) else io.BytesIO(source)) as package:
+        with package.open("word/document.xml") as xml:
+            paragraphs, runs = [], []
+            for _, element in ElementTree.iterparse(xml):
+                if element.tag == WORD_NS + "t":
+                    runs.append(element.text or "")
+                elif element.tag == WORD_NS + "tab":
+                    runs.append("\t")
+                elif element.tag in (WORD_NS + "br", WORD_NS + "cr"):
+                    runs.append("\n")
+                elif element.tag == WORD_NS + "p":
+                    paragraphs.append("".join(runs))
+                    runs.clear()
+                    element.clear()
+    return "\n".join(paragraphs)
+
+def _pdf_text(source) -> str:
+    pdf = fitz.open(source) if isinstance(source, str) else fitz.open(stream=source, filetype="pdf")
+    try:
+        return "".join(page.get_text() for page in pdf)
+    finally:
+        pdf.close()
+
+def extract_text(source, file_name: str) -> str:
+    """Plain text of a file given as a path or bytes."""
+    suffix = Path(file_name).suffix.lower()
+    if suffix == ".docx":
+        return _docx_text(source)
+    if suffix == ".pdf":
+        return _pdf_text(source)
+    data = source if isinstance(source, bytes) else Path(source).read_bytes()
+    return data.decode("utf-8", errors="replace")
+
+def diff_files(old_source, old_name: str, new_source, new_name: str) -> Dict[str, Any]:
+    """Unified diff of the text of two files. Runs in a worker process."""
+    old_lines = extract_text(old_source, old_name).splitlines()
+    new_lines = extract_text(new_source, new_name).splitlines()
+    lines, added, removed = [], 0, 0
+    diff = difflib.unified_diff(old_lines, new_lines, n=CONTEXT_LINES, lineterm="")
+    # Skip the ---/+++ file header: the result is shared by every record holding this pair of files
+    next(diff, None)
+    next(diff, None)
+    truncated = False
+    for line in diff:
+        if line.startswith("+"):
+            added += 1
+        elif line.startswith("-"):
+            removed += 1
+        if len(lines) < MAX_DIFF_LINES:
+            lines.append(line)
+        else:
+            truncated = True
+    return {"diff": lines, "added": added, "removed": removed, "truncated": truncated}
+
+class TextDiffService:
+    def __init__(
+        self,
+        db,
+        storage: StorageBackend,
+        resolve: Callable[[str], Awaitable[str]],
+        workers: int = 2,
+    ):
+        self.diffs = db.text_diffs
+        self.storage = storage
+        self.resolve = resolve  # maps a blob key to one holding whole bytes (delta_store.py)
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[Tuple[str, str], asyncio.Task] = {}  # concurrent requests share one computation
+
+    async def diff(self, old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+        """Diff two version records (file_sha256, file_name, key), computing it at most once per pair."""
+        for version in (old, new):
+            if not version.get("file_sha256") or version.get("key") is None:
+                raise HTTPException(status_code=404, detail="File not found")
+            if not diff_supported(version["file_name"]):
+                raise HTTPException(
+                    status_code=422, detail=f"Text comparison is not available for {Path(version['file_name']).suffix} files"
+                )
+        pair = (old["file_sha256"], new["file_sha256"])
+        cached = await self.diffs.find_one({"_id": f"{pair[0]}:{pair[1]}"}, {"_id": 0})
+        if cached:
+            return cached
+        task = self._pending.get(pair)
+        if task is None:
+            task = asyncio.create_task(self._compute(pair, old, new))
+            self._pending[pair] = task
+            task.add_done_callback(lambda _: self._pending.pop(pair, None))
+        # A client going away must not cancel the computation other requests are waiting on
+        return await asyncio.shield(task)
+
+    async def _source(self, version: Dict[str, Any]):
+        key = await self.resolve(version["key"])
+        stat = await self.storage.stat(key)
+        if stat is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        if stat.size > MAX_SOURCE_BYTES:
+            raise HTTPException(status_code=422, detail="File is too large to compare")
+        local = self.storage.local_path(key)
+        return str(local) if local is not None else await self.storage.get(key)
+
+    async def _compute(self, pair: Tuple[str, str], old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+        old_source, new_source = await asyncio.gather(self._source(old), self._source(new))
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, diff_files, old_source, old["file_name"], new_source, new["file_name"]
+            )
+        except (zipfile.BadZipFile, KeyError, ElementTree.ParseError, RuntimeError, ValueError):
+            raise HTTPException(status_code=422, detail="Could not extract text from one of the files")
+        result.update({"from_sha256": pair[0], "to_sha256": pair[1], "created_at": datetime.utcnow()})
+        await self.diffs.update_one({"_id": f"{pair[0]}:{pair[1]}"}, {"$setOnInsert": result}, upsert=True)
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,200 @@
+"""Resumable chunked uploads.
+
+A client creates a session declaring the file name and total size, then PUTs the
+bytes in any number of chunks, each tagged with the offset it starts at. After a
+dropped connection the client asks for the session's offset and carries on from
+there, so completed chunks are never re-sent. Finalizing hands the assembled file
+to the blob store.
+
+Session state lives in the `upload_sessions` collection; the bytes are appended to
+<incoming>/<session id>.part on the node that received them, so a session must be
+continued on the same node (sticky routing) when several app nodes share a database.
+The SHA-256 is computed incrementally while chunks arrive and is only recomputed
+from disk when the running hash is unavailable (process restart, rewound offset).
+"""
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+from pymongo import ReturnDocument
+from starlette.requests import ClientDisconnect
+
+from upload_validation import UploadValidator
+
+logger = logging.getLogger(__name__)
+
+# A PUT holds the session for at most this long; a crashed request frees it afterwards
+LEASE_SECONDS = 300
+
+class UploadSession(BaseModel):
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex)
+    file_name: str
+    size: int
+    offset: int = 0
+    created_by: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime
+    lease_until: Optional[datetime] = None
+
+class UploadSessions:
+    def __init__(self, db, incoming_dir: Path, ttl: timedelta, chunk_size: int):
+        self.sessions = db.upload_sessions
+        self.incoming_dir = incoming_dir
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        # session id -> (offset hashed so far, running SHA-256); lost on restart
+        self.hashers: Dict[str, Tuple[int, "hashlib._Hash"]] = {}
+
+    def part_path(self, session_id: str) -> Path:
+        return self.incoming_dir / f"{session_id}.part"
+
+    async def create(self, file_name: str, size: int, user_id: str) -> UploadSession:
+        session = UploadSession(
+            file_name=file_name, size=size, created_by=user_id, expires_at=datetime.utcnow() + self.ttl
+        )
+        async with aiofiles.open(self.part_path(session.id), "wb"):
+            pass
+        self.hashers[session.id] = (0, hashlib.sha256())
+        await self.sessions.insert_one(session.dict())
+        return session
+
+    async def get(self, session_id: str, user_id: str) -> UploadSession:
+        session = await self.sessions.find_one({"id": session_id, "created_by": user_id}, {"_id": 0})
+        if not session:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        return UploadSession(**session)
+
+    async def write(self, session_id: str, user_id: str, offset: int, body: AsyncIterator[bytes]) -> UploadSession:
+        """Write a chunk starting at `offset` and return the session with its new offset.
+
+        The offset must match what the server already has (409 otherwise, with the
+        server's offset in the detail) so chunks can never leave a gap. A lease stops
+        two requests from writing the same session at once. Bytes received before a
+        client disconnect are kept, so the next attempt resumes after them.
+        """
+        now = datetime.utcnow()
+        claimed = await self.sessions.find_one_and_update(
+            {"id": session_id, "created_by": user_id, "offset": offset,
+             "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+            {"$set": {"lease_until": now + timedelta(seconds=LEASE_SECONDS)}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if not claimed:
+            current = await self.get(session_id, user_id)
+            if current.offset != offset:
+                raise HTTPException(status_code=409, detail=f"Upload offset is {current.offset}, not {offset}")
+            raise HTTPException(status_code=409, detail="Another request is writing to this upload session")
+        session = UploadSession(**claimed)
+
+        hashed_to, digest = self.hashers.pop(session_id, (None, None))
+        if hashed_to != offset:
+            digest = None  # resuming elsewhere than where hashing stopped; rehash at finalize
+        position = offset
+        buffer = bytearray()
+        # The first chunk is sniffed as it arrives; finalize re-checks the assembled file
+        validator = UploadValidator(session.file_name) if offset == 0 else None
+
+        async def flush(f):
+            nonlocal position
+            if digest is not None:
+                await asyncio.to_thread(digest.update, bytes(buffer))
+            await f.write(buffer)
+            position += len(buffer)
+            buffer.clear()
+
+        try:
+            mode = "r+b" if await aiofiles.os.path.exists(self.part_path(session_id)) else "wb"
+            async with aiofiles.open(self.part_path(session_id), mode) as f:
+                await f.seek(offset)
+                await f.truncate(offset)  # drop bytes beyond the acknowledged offset from an interrupted chunk
+                try:
+                    async for chunk in body:
+                        if position + len(buffer) + len(chunk) > session.size:
+                            raise HTTPException(status_code=413, detail="Chunk extends beyond the declared upload size")
+                        if validator is not None and not validator.sniffed:
+                            validator.feed(chunk)
+                        buffer.extend(chunk)
+                        if len(buffer) >= self.chunk_size:
+                            await flush(f)
+                except ClientDisconnect:
+                    logger.info(f"Upload {session_id} interrupted at {position + len(buffer)} bytes")
+                if buffer:
+                    await flush(f)
+        finally:
+            if digest is not None:
+                self.hashers[session_id] = (position, digest)
+            await self.sessions.update_one(
+                {"id": session_id},
+                {"$set": {"offset": position, "lease_until": None,
+                          "expires_at": datetime.utcnow() + self.ttl}}
+            )
+        session.offset = position
+        session.lease_until = None
+        return session
+
+    async def claim_complete(self, session_id: str, user_id: str) -> Tuple[UploadSession, Path, str]:
+        """Remove a fully written session and return it with its file and SHA-256."""
+        claimed = await self.sessions.find_one_and_delete(
+            {"id": session_id, "created_by": user_id, "lease_until": None,
+             "$expr": {"$eq": ["$offset", "$size"]}},
+            projection={"_id": 0}
+        )
+        if not claimed:
+            current = await self.get(session_id, user_id)
+            raise HTTPException(status_code=409, detail=f"Upload incomplete: {current.offset} of {current.size} bytes received")
+        session = UploadSession(**claimed)
+        path = self.part_path(session_id)
+        hashed_to, digest = self.hashers.pop(session_id, (None, None))
+        if hashed_to != session.size:
+            digest = await asyncio.to_thread(self._hash_file, path)
+        return session, path, digest.hexdigest()
+
+    def _hash_file(self, path: Path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(self.chunk_size):
+                digest.update(chunk)
+        return digest
+
+    async def abort(self, session_id: str, user_id: str):
+        result = await self.sessions.delete_one({"id": session_id, "created_by": user_id})
+        if result.deleted_count == 0:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        await self._discard(session_id)
+
+    async def _discard(self, session_id: str):
+        self.hashers.pop(session_id, None)
+        try:
+            await aiofiles.os.remove(self.part_path(session_id))
+        except FileNotFoundError:
+            pass
+
+    async def purge_expired(self) -> int:
+        """Delete sessions idle past their TTL and incoming files nobody owns any more."""
+        purged = 0
+        async for session in self.sessions.find(
+            {"expires_at": {"$lt": datetime.utcnow()}, "lease_until": None}, {"id": 1}
+        ):
+            result = await self.sessions.delete_one({"id": session["id"], "lease_until": None})
+            if result.deleted_count:
+                await self._discard(session["id"])
+                purged += 1
+
+        # Leftovers of crashed plain uploads and of sessions deleted by another node
+        cutoff = time.time() - self.ttl.total_seconds()
+        for entry in await aiofiles.os.scandir(self.incoming_dir):
+            if entry.name.endswith(".part") and entry.stat().st_mtime < cutoff:
+                if not await self.sessions.find_one({"id": entry.name[:-len(".part")]}, {"_id": 1}):
+                    await self._discard(entry.name[:-len(".part")])
+                    purged += 1
+        return purged
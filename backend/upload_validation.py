@@ -0,0 +1,263 @@
+"""Upload validation that rejects bad files while they arrive.
+
+Three stages, cheapest first:
+
+1. BodySizeLimitMiddleware runs before Starlette spools a multipart form to
+   disk. It refuses any request body over MAX_REQUEST_BYTES. On a multipart
+   request it also reads the start of the body (at most PRECHECK_BYTES) until it
+   has the file part's name and first bytes. It then applies that type's size
+   cap, to Content-Length at once and to the running byte count after, and
+   checks the magic bytes. An oversized or mislabelled file is refused with the
+   first kilobytes read.
+2. UploadValidator sees each chunk as it is written. It enforces the per-type
+   size cap and checks the leading magic bytes, so a mislabelled file fails on
+   its first kilobyte.
+3. check_structure() runs in a worker thread once the file is complete. It
+   looks for the PDF end-of-file marker and the DOCX package parts.
+
+Files that fail are never committed to the blob store.
+"""
+import asyncio
+import json
+import re
+import zipfile
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+
+MB = 1024 * 1024
+
+# Largest accepted file per extension
+UPLOAD_SIZE_LIMITS = {
+    ".pdf": 200 * MB,
+    ".docx": 50 * MB,
+    ".doc": 50 * MB,
+    ".txt": 5 * MB,
+}
+
+# Multipart framing and form fields on top of the file
+FORM_OVERHEAD = MB
+MAX_REQUEST_BYTES = max(UPLOAD_SIZE_LIMITS.values()) + FORM_OVERHEAD
+# How much of a multipart body is read ahead to find the file part
+PRECHECK_BYTES = 64 * 1024
+
+# PDF allows the header anywhere in the first 1024 bytes; the others must start the file
+SNIFF_BYTES = 1024
+
+OLE_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+BOUNDARY = re.compile(rb'boundary="?([^";]+)"?', re.IGNORECASE)
+FILENAME = re.compile(rb'filename="([^"]*)"', re.IGNORECASE)
+
+def size_limit(file_name: str) -> int:
+    return UPLOAD_SIZE_LIMITS.get(Path(file_name).suffix.lower(), 0)
+
+def check_declared_size(file_name: str, size: int):
+    if size > size_limit(file_name):
+        raise HTTPException(status_code=413, detail=f"File too large: {Path(file_name).suffix.lower()} files are limited to {size_limit(file_name) // MB} MB")
+
+def _sniff(suffix: str, head: bytes, complete: bool) -> Optional[bool]:
+    """True/False once the leading bytes prove or disprove the type, None while more are needed."""
+    if suffix == ".pdf":
+        if b"%PDF-" in head:
+            return True
+        return False if complete or len(head) >= SNIFF_BYTES else None
+    if suffix in (".docx", ".doc"):
+        signature = b"PK\x03\x04" if suffix == ".docx" else OLE_SIGNATURE
+        if len(head) < len(signature) and not complete:
+            return None
+        return head.startswith(signature)
+    if suffix == ".txt":
+        if len(head) < SNIFF_BYTES and not complete:
+            return None
+        if b"\x00" in head:
+            return False
+        try:
+            head.decode("utf-8")
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut off at the end of the sample is fine
+            return not complete and e.start >= len(head) - 3
+        return True
+    return False
+
+class UploadValidator:
+    """Feed chunks in order; raises HTTPException as soon as the upload is known to be bad."""
+
+    def __init__(self, file_name: str):
+        self.suffix = Path(file_name).suffix.lower()
+        self.limit = size_limit(file_name)
+        self.size = 0
+        self.head = b""
+        self.sniffed = False
+
+    def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.limit:
+            raise HTTPException(status_code=413, detail=f"File too large: {self.suffix} files are limited to {self.limit // MB} MB")
+        if not self.sniffed:
+            self.head += chunk[:SNIFF_BYTES - len(self.head)]
+            self._check_head(complete=False)
+
+    def _check_head(self, complete: bool):
+        verdict = _sniff(self.suffix, self.head, complete)
+        if verdict is False:
+            raise HTTPException(status_code=400, detail=f"File content is not a valid {self.suffix} file")
+        self.sniffed = verdict is True
+
+    async def finish(self, path: Path):
+        """Final checks on the complete file (structure checks run off the event loop)."""
+        if not self.sniffed:
+            self._check_head(complete=True)
+        await check_structure(path, self.suffix)
+
+def _structure_error(path: Path, suffix: str) -> Optional[str]:
+    if suffix == ".pdf":
+        with open(path, "rb") as f:
+            f.seek(max(path.stat().st_size - SNIFF_BYTES, 0))
+            if b"%%EOF" not in f.read():
+                return "PDF is truncated or damaged (no end-of-file marker)"
+    elif suffix == ".docx":
+        try:
+            with zipfile.ZipFile(path) as package:
+                names = set(package.namelist())
+        except zipfile.BadZipFile:
+            return "DOCX package is damaged"
+        if "[Content_Types].xml" not in names or "word/document.xml" not in names:
+            return "File is not a Word document"
+    return None
+
+async def check_structure(path: Path, suffix: str):
+    error = await asyncio.to_thread(_structure_error, path, suffix)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+def first_file_part(body: bytes, boundary: bytes) -> Optional[Tuple[str, bytes, bool]]:
+    """File name, leading bytes and completeness of the first file part in the start of a multipart body.
+
+    None while the part has not been reached, or when the form has no file.
+    """
+    delimiter = b"--" + boundary
+    position = 0
+    while True:
+        start = body.find(delimiter, position)
+        if start < 0 or body[start + len(delimiter):start + len(delimiter) + 2] == b"--":
+            return None
+        header_end = body.find(b"\r\n\r\n", start)
+        if header_end < 0:
+            return None
+        data_start = header_end + 4
+        data_end = body.find(b"\r\n" + delimiter, data_start)
+        match = FILENAME.search(body[start:header_end])
+        if match:
+            data = body[data_start:data_end] if data_end >= 0 else body[data_start:]
+            return match.group(1).decode("utf-8", "replace"), data[:SNIFF_BYTES], data_end >= 0
+        if data_end < 0:
+            return None
+        position = data_end + 2
+
+async def validate_file(path: Path, file_name: str):
+    """Run every check on an already assembled file (e.g. a finalized resumable upload)."""
+    check_declared_size(file_name, path.stat().st_size)
+    validator = UploadValidator(file_name)
+    with open(path, "rb") as f:
+        validator.feed(f.read(SNIFF_BYTES))
+    await validator.finish(path)
+
+class BodySizeLimitMiddleware:
+    """Answer 413 as soon as a request body is known to exceed its limit, 400 for a mislabelled file.
+
+    The limit is `max_bytes`, or the file type's cap plus FORM_OVERHEAD for a multipart upload.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        length = headers.get(b"content-length", b"")
+        content_length = int(length) if length.isdigit() else None
+        if content_length is not None and content_length > self.max_bytes:
+            return await self._reject(send)
+
+        buffered: List[dict] = []
+        limit = self.max_bytes
+        boundary = BOUNDARY.search(headers.get(b"content-type", b""))
+        if boundary and headers.get(b"content-type", b"").lower().startswith(b"multipart/form-data"):
+            try:
+                buffered, limit = await self._precheck(receive, boundary.group(1), content_length)
+            except HTTPException as e:
+                return await self._reject(send, e.status_code, e.detail)
+
+        received = 0
+        rejected = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            message = buffered.pop(0) if buffered else await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Stop reading; the app sees a disconnect and whatever it sends is dropped
+                    rejected = True
+                    if not response_started:
+                        await self._reject(send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if rejected:
+                return
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not rejected:
+                raise
+
+    async def _precheck(self, receive, boundary: bytes, content_length: Optional[int]) -> Tuple[List[dict], int]:
+        """Read ahead to the file part and check it; returns the messages read and the body limit."""
+        messages, body = [], b""
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                return messages, self.max_bytes
+            body += message.get("body", b"")
+            more = message.get("more_body", False)
+            part = first_file_part(body, boundary)
+            if part is None:
+                if more and len(body) < PRECHECK_BYTES:
+                    continue
+                return messages, self.max_bytes
+            file_name, head, complete = part
+            limit = size_limit(file_name)
+            if not limit:
+                return messages, self.max_bytes  # the endpoint refuses unsupported types
+            if content_length is not None:
+                check_declared_size(file_name, content_length - FORM_OVERHEAD)
+            suffix = Path(file_name).suffix.lower()
+            verdict = _sniff(suffix, head, complete or not more)
+            if verdict is None and more and len(body) < PRECHECK_BYTES:
+                continue
+            if verdict is False:
+                raise HTTPException(status_code=400, detail=f"File content is not a valid {suffix} file")
+            return messages, limit + FORM_OVERHEAD
+
+    async def _reject(self, send, status_code: int = 413, detail: str = "Request body too large"):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,132 @@
+"""Version and status history storage.
+
+Every uploaded file version of a document or policy is one row in the
+`document_versions` collection, keyed by (document_id, version_number), where
+document_id is the owning document's or policy's id and record_type says which.
+Documents and policies only carry their current file, so reading them costs the
+same however often they have been revised, and history is paged from here.
+
+Every status a record takes (on creation, edit, delete and restore) is one row in
+`status_changes`. Together with the version upload dates this answers
+point-in-time queries (find_as_of): which version of each record was current,
+and in which status, at a given moment.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+RECORD_TYPES = {"documents": "document", "policies": "policy"}
+
+async def insert_version(db, document_id: str, record_type: str, version: Dict[str, Any]):
+    """Record a version that the owning record has already been moved to."""
+    try:
+        await db.document_versions.insert_one({**version, "document_id": document_id, "record_type": record_type})
+    except DuplicateKeyError:
+        # The owner's revision guard hands each version number out once, so this is a retried write
+        logger.warning(f"Version {version['version_number']} of {document_id} already recorded")
+
+async def migrate_embedded_versions(db, batch_size: int = 500) -> int:
+    """Move legacy embedded version_history arrays into document_versions (idempotent).
+
+    Rows are upserted on (document_id, version_number) before the array is removed,
+    so an interrupted run simply picks the remaining records up next time.
+    """
+    moved = 0
+    for collection_name, record_type in RECORD_TYPES.items():
+        collection = db[collection_name]
+        async for record in collection.find({"version_history": {"$exists": True}}, {"id": 1, "version_history": 1}):
+            operations = [
+                UpdateOne(
+                    {"document_id": record["id"], "version_number": version["version_number"]},
+                    {"$setOnInsert": {**version, "document_id": record["id"], "record_type": record_type}},
+                    upsert=True
+                )
+                for version in record["version_history"]
+            ]
+            for start in range(0, len(operations), batch_size):
+                await db.document_versions.bulk_write(operations[start:start + batch_size], ordered=False)
+            await collection.update_one({"_id": record["_id"]}, {"$unset": {"version_history": ""}})
+            moved += len(operations)
+    return moved
+
+async def record_status_change(db, document_id: str, record_type: str, status: str, changed_by: Optional[str],
+                               changed_at: Optional[datetime] = None):
+    await db.status_changes.insert_one({
+        "document_id": document_id, "record_type": record_type, "status": status,
+        "changed_by": changed_by, "changed_at": changed_at or datetime.utcnow()
+    })
+
+async def backfill_status_changes(db, batch_size: int = 500) -> int:
+    """Give records created before status history existed their current status as of creation (idempotent).
+
+    Earlier status changes of those records are unknown, so point-in-time queries
+    before this ran see them in their present status.
+    """
+    backfilled = 0
+    for collection_name, record_type in RECORD_TYPES.items():
+        known = set(await db.status_changes.distinct("document_id", {"record_type": record_type}))
+        operations = []
+        async for record in db[collection_name].find({}, {"id": 1, "status": 1, "created_at": 1, "created_by": 1}):
+            if record["id"] in known:
+                continue
+            operations.append(UpdateOne(
+                {"document_id": record["id"], "record_type": record_type},
+                {"$setOnInsert": {"status": record.get("status", "active"), "changed_by": record.get("created_by"),
+                                  "changed_at": record.get("created_at") or datetime.utcnow()}},
+                upsert=True
+            ))
+        for start in range(0, len(operations), batch_size):
+            await db.status_changes.bulk_write(operations[start:start + batch_size], ordered=False)
+        backfilled += len(operations)
+    return backfilled
+
+# Record fields that belong to a version and are replaced by the effective version's
+VERSION_FIELDS = ("file_url", "file_name", "file_size", "file_sha256", "web_file_url", "web_file_size", "web_file_sha256",
+                  "thumbnail_url", "preview_url")
+
+async def find_as_of(collection, as_of: datetime, query: Dict[str, Any],
+                     prefilter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Records as they stood at `as_of`: the version then current and the status then in effect.
+
+    `query` is matched against that past state, so status conditions refer to the
+    status at `as_of`. `prefilter` holds conditions on fields without history
+    (category, type, ...) and narrows the records before their history is looked up.
+    Records created later, or without a version uploaded by then, are left out.
+    Everything runs as one aggregation using the (document_id, ...) history indexes
+    (correlated $lookup with localField and pipeline, MongoDB 5.0+).
+    """
+    pipeline = [
+        {"$match": {**(prefilter or {}), "created_at": {"$lte": as_of}}},
+        {"$lookup": {
+            "from": "document_versions", "localField": "id", "foreignField": "document_id",
+            "pipeline": [
+                {"$match": {"upload_date": {"$lte": as_of}}},
+                {"$sort": {"version_number": -1}},
+                {"$limit": 1},
+            ],
+            "as": "effective_version",
+        }},
+        {"$unwind": "$effective_version"},
+        {"$lookup": {
+            "from": "status_changes", "localField": "id", "foreignField": "document_id",
+            "pipeline": [
+                {"$match": {"changed_at": {"$lte": as_of}}},
+                {"$sort": {"changed_at": -1}},
+                {"$limit": 1},
+            ],
+            "as": "effective_status",
+        }},
+        {"$set": {
+            "status": {"$ifNull": [{"$arrayElemAt": ["$effective_status.status", 0]}, "$status"]},
+            "version": "$effective_version.version_number",
+            **{field: {"$ifNull": [f"$effective_version.{field}", None]} for field in VERSION_FIELDS},
+        }},
+        {"$match": query},
+        {"$project": {"_id": 0, "effective_version": 0, "effective_status": 0}},
+    ]
+    return await collection.aggregate(pipeline).to_list(None)
@@ -0,0 +1,113 @@
+"""ZIP archives streamed straight from storage.
+
+zipfile can write to a non-seekable sink: each entry's CRC and sizes then go in a
+data descriptor after its bytes instead of being patched into the local header. The
+archive is built on the fly while the response is sent, so no temporary file is
+created and memory stays at about one storage chunk regardless of bundle size.
+"""
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+from storage import StorageBackend
+
+# Formats that are already compressed; deflating them again costs CPU for nothing
+STORED_EXTENSIONS = {".pdf", ".docx", ".xlsx", ".pptx", ".zip", ".png", ".jpg", ".jpeg", ".webp"}
+
+class ZipEntry(NamedTuple):
+    name: str
+    key: Optional[str]
+    modified: datetime
+
+class _Sink:
+    """Write-only file object that collects bytes until the generator drains them."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data) -> int:
+        self.buffer.extend(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+# Longest single path component written to an archive (most unzip tools cope with 255)
+MAX_COMPONENT_LENGTH = 120
+
+def safe_component(name: str, fallback: str = "file") -> str:
+    """Reduce a client-supplied name to one harmless archive path component.
+
+    Keeps only the last segment after any / or \\, drops `.`, `..` and control
+    characters, and shortens it to MAX_COMPONENT_LENGTH keeping the extension,
+    so no entry can climb out of the folder it is extracted into (zip slip).
+    """
+    parts = [part for part in name.replace("\\", "/").split("/") if part.strip(". ")]
+    component = "".join(ch for ch in (parts[-1] if parts else "") if ch.isprintable()).strip()
+    if not component.strip("."):
+        return fallback
+    if len(component) > MAX_COMPONENT_LENGTH:
+        suffix = Path(component).suffix
+        suffix = suffix if len(suffix) <= 16 else ""
+        component = component[:MAX_COMPONENT_LENGTH - len(suffix)].rstrip() + suffix
+    return component
+
+def unique_names(names: Iterable[str]) -> List[str]:
+    """Suffix repeated archive names with (2), (3), ... before the extension."""
+    seen = set()
+    result = []
+    for name in names:
+        candidate, n = name, 1
+        while candidate.lower() in seen:
+            n += 1
+            path = Path(name)
+            candidate = str(path.with_name(f"{path.stem} ({n}){path.suffix}"))
+        seen.add(candidate.lower())
+        result.append(candidate)
+    return result
+
+async def stream_zip(
+    storage: StorageBackend,
+    entries: List[ZipEntry],
+    checkout: Optional[Callable[[str], Awaitable[Tuple[str, Callable[[], Awaitable[None]]]]]] = None,
+) -> AsyncIterator[bytes]:
+    """Yield a ZIP archive of `entries`; objects missing from storage are listed in MISSING.txt.
+
+    `checkout` maps an entry's key to the key actually holding its bytes and a release
+    callback (see DeltaStore.checkout). It is called only when the entry is reached, and
+    the release runs once the entry has been written.
+    """
+    sink = _Sink()
+    missing = []
+    with zipfile.ZipFile(sink, "w") as archive:
+        for entry in entries:
+            key, release = await checkout(entry.key) if checkout and entry.key else (entry.key, None)
+            try:
+                stat = await storage.stat(key) if key else None
+                if stat is None:
+                    missing.append(entry.name)
+                    continue
+                info = zipfile.ZipInfo(entry.name, date_time=entry.modified.timetuple()[:6])
+                if Path(entry.name).suffix.lower() in STORED_EXTENSIONS:
+                    info.compress_type = zipfile.ZIP_STORED
+                else:
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                info.file_size = stat.size  # lets zipfile pick ZIP64 headers for files over 4 GiB
+                with archive.open(info, "w") as destination:
+                    async for chunk in storage.stream(key):
+                        destination.write(chunk)
+                        if sink.buffer:
+                            yield sink.drain()
+            finally:
+                if release:
+                    await release()
+            yield sink.drain()
+        if missing:
+            archive.writestr("MISSING.txt", "Files not found in storage:\n" + "\n".join(missing) + "\n")
+    yield sink.drain()
@@ -0,0 +1,250 @@
+import io
+import json
+import requests
+import sys
+import time
+import uuid
+
+class ChangeJournalTester:
+    def __init__(self, base_url="https://secure-doc-share.preview.emergentagent.com"):
+        self.base_url = base_url
+        self.api_url = f"{base_url}/api"
+        self.admin_token = None
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.test_results = []
+
+    def log_test(self, name, success, message=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name}: PASSED - {message}")
+        else:
+            print(f"❌ {name}: FAILED - {message}")
+        self.test_results.append({"test": name, "success": success, "message": message})
+
+    def headers(self):
+        return {'Authorization': f'Bearer {self.admin_token}'}
+
+    def setup_test_data(self):
+        """Login as admin"""
+        print("\n🔧 Setting up test data...")
+        response = requests.post(f"{self.api_url}/auth/login", json={"username": "admin", "password": "admin123"})
+        if response.status_code != 200:
+            print(f"❌ Admin login failed - Status: {response.status_code}")
+            return False
+        self.admin_token = response.json()['access_token']
+        return True
+
+    def read_changes(self, after, **params):
+        return requests.get(f"{self.api_url}/changes", params={"after": after, **params}, headers=self.headers())
+
+    def test_writes_are_journaled(self):
+        """Create, update and delete a category and read the three events back from the cursor"""
+        head = self.read_changes(0, limit=1).json()['head']
+        code = f"J{uuid.uuid4().hex[:6].upper()}"
+        category = requests.post(f"{self.api_url}/categories", headers=self.headers(),
+                                 json={"name": "Journal Test", "code": code, "description": "x"}).json()
+        requests.patch(f"{self.api_url}/categories/{category['id']}", headers=self.headers(),
+                       json={"description": "changed"})
+        requests.delete(f"{self.api_url}/categories/{category['id']}", headers=self.headers())
+
+        response = self.read_changes(head, entity="category")
+        self.log_test("Read Changes", response.status_code == 200, f"Status: {response.status_code}")
+        if response.status_code != 200:
+            return
+        page = response.json()
+        events = [(c['action'], c['fields']) for c in page['changes'] if c['entity_id'] == category['id']]
+        self.log_test(
+            "Category Events In Order",
+            events == [("created", []), ("updated", ["description"]), ("deleted", ["is_active", "is_deleted"])],
+            f"Events: {events}"
+        )
+        sequence = [c['seq'] for c in page['changes']]
+        self.log_test("Sequence Increases", sequence == sorted(set(sequence)) and page['cursor'] >= max(sequence),
+                      f"Seq: {sequence}, cursor: {page['cursor']}")
+
+        response = self.read_changes(page['cursor'], entity="category")
+        self.log_test("Cursor Continues After Last Event",
+                      all(c['seq'] > page['cursor'] for c in response.json()['changes']),
+                      f"Status: {response.status_code}")
+
+    def test_sync_tokens(self):
+        """Page through the public snapshot, then switch to incremental changes"""
+        response = requests.get(f"{self.api_url}/sync", params={"limit": 1})
+        self.log_test("Sync Snapshot", response.status_code == 200 and response.json()['snapshot'],
+                      f"Status: {response.status_code}")
+        if response.status_code != 200:
+            return
+        page, seen = response.json(), set()
+        while page['snapshot'] and page['has_more']:
+            seen.update(d['id'] for d in page['documents'])
+            page = requests.get(f"{self.api_url}/sync", params={"since": page['token'], "limit": 1}).json()
+        seen.update(d['id'] for d in page['documents'])
+        public = requests.get(f"{self.api_url}/public/documents").json()
+        self.log_test("Snapshot Covers Public Documents", {d['id'] for d in public} <= seen,
+                      f"Snapshot: {len(seen)}, public: {len(public)}")
+
+        response = requests.get(f"{self.api_url}/sync", params={"since": page['token']})
+        self.log_test("Sync Changes Phase", response.status_code == 200 and not response.json()['snapshot'],
+                      f"Status: {response.status_code}")
+
+        response = requests.get(f"{self.api_url}/sync", params={"since": "not-a-token"})
+        self.log_test("Invalid Sync Token", response.status_code == 400, f"Status: {response.status_code}")
+
+    def sync_token(self):
+        """Token positioned after the snapshot, i.e. at the current head of the journal"""
+        page = requests.get(f"{self.api_url}/sync", params={"limit": 1000}).json()
+        while page['snapshot']:
+            page = requests.get(f"{self.api_url}/sync", params={"since": page['token'], "limit": 1000}).json()
+        return page['token']
+
+    def upload_document(self, title):
+        categories = requests.get(f"{self.api_url}/categories", headers=self.headers()).json()
+        response = requests.post(
+            f"{self.api_url}/documents", headers=self.headers(),
+            data={"title": title, "category_id": categories[0]['id'], "date_issued": "2025-01-01T00:00:00Z",
+                  "owner_department": "Test Department"},
+            files={"file": (f"{uuid.uuid4().hex[:8]}.txt", io.BytesIO(b"sync tombstone test"), "text/plain")}
+        )
+        return response.json()['document'] if response.status_code == 200 else None
+
+    def test_sync_tombstones(self):
+        """Tombstones name documents that left public view, never documents that were never public"""
+        public = self.upload_document(f"Sync Public {uuid.uuid4().hex[:6]}")
+        private = self.upload_document(f"Sync Private {uuid.uuid4().hex[:6]}")
+        if not public or not private:
+            self.log_test("Upload Sync Documents", False, "Upload failed")
+            return
+        requests.patch(f"{self.api_url}/documents/{private['id']}/visibility", headers=self.headers(),
+                       json={"is_visible_to_users": False})
+        token = self.sync_token()
+
+        # Writes to a document that stays private: status and title changes, then deletion
+        requests.put(f"{self.api_url}/documents/{private['id']}", headers=self.headers(),
+                     json={"title": "Still Private", "status": "archived"})
+        requests.delete(f"{self.api_url}/documents/{private['id']}", headers=self.headers())
+        requests.patch(f"{self.api_url}/documents/{public['id']}/visibility", headers=self.headers(),
+                       json={"is_visible_to_users": False})
+
+        page = requests.get(f"{self.api_url}/sync", params={"since": token}).json()
+        self.log_test("Hidden Document Tombstoned", public['id'] in page['removed'], f"Removed: {page['removed']}")
+        self.log_test("Never-Public Document Not Listed",
+                      private['id'] not in page['removed'] and
+                      all(d['id'] != private['id'] for d in page['documents']),
+                      f"Removed: {page['removed']}")
+        requests.delete(f"{self.api_url}/documents/{public['id']}", headers=self.headers())
+
+    def stream_ticket(self, token):
+        response = requests.post(f"{self.api_url}/changes/stream-ticket", headers={'Authorization': f'Bearer {token}'})
+        return response.json()['ticket'] if response.status_code == 200 else None
+
+    def open_stream(self, ticket):
+        return requests.get(f"{self.api_url}/changes/stream", params={"ticket": ticket}, stream=True, timeout=30)
+
+    def test_change_stream(self):
+        """A change made after connecting arrives on the SSE stream"""
+        ticket = self.stream_ticket(self.admin_token)
+        stream = self.open_stream(ticket)
+        self.log_test("Open Change Stream",
+                      stream.status_code == 200 and stream.headers['content-type'].startswith("text/event-stream"),
+                      f"Status: {stream.status_code}")
+        if stream.status_code != 200:
+            return
+        code = f"S{uuid.uuid4().hex[:6].upper()}"
+        category = requests.post(f"{self.api_url}/categories", headers=self.headers(),
+                                 json={"name": "Stream Test", "code": code, "description": "x"}).json()
+        received = None
+        for line in stream.iter_lines(decode_unicode=True):
+            if line.startswith("data: ") and category['id'] in line:
+                received = json.loads(line[len("data: "):])
+                break
+        stream.close()
+        self.log_test("Change Pushed To Stream",
+                      received is not None and received['entity'] == "category" and received['action'] == "created",
+                      f"Received: {received}")
+        requests.delete(f"{self.api_url}/categories/{category['id']}", headers=self.headers())
+
+        response = requests.get(f"{self.api_url}/changes/stream", params={"ticket": ticket})
+        self.log_test("Stream Ticket Single Use", response.status_code == 401, f"Status: {response.status_code}")
+        response = requests.get(f"{self.api_url}/changes/stream", params={"ticket": "invalid"})
+        self.log_test("Stream Rejects Bad Ticket", response.status_code == 401, f"Status: {response.status_code}")
+        response = requests.get(f"{self.api_url}/changes/stream", params={"access_token": self.admin_token})
+        self.log_test("Stream Ignores Token In URL", response.status_code == 401, f"Status: {response.status_code}")
+        response = requests.post(f"{self.api_url}/changes/stream-ticket")
+        self.log_test("Ticket Requires Authentication", response.status_code in (401, 403),
+                      f"Status: {response.status_code}")
+
+    def create_user(self):
+        """Register, approve and log in a regular user; returns (user id, token)"""
+        name = f"stream_{uuid.uuid4().hex[:8]}"
+        user = requests.post(f"{self.api_url}/auth/register",
+                             json={"username": name, "email": f"{name}@example.com", "full_name": "Stream Test",
+                                   "password": "stream123"}).json()
+        requests.patch(f"{self.api_url}/users/{user['id']}/approve", headers=self.headers())
+        response = requests.post(f"{self.api_url}/auth/login", json={"username": name, "password": "stream123"})
+        return user['id'], response.json().get('access_token')
+
+    def test_stream_closed_on_suspension(self):
+        """Suspending a user ends their open stream, and the token no longer opens a new one"""
+        user_id, token = self.create_user()
+        if not token:
+            self.log_test("Create Stream User", False, "Login failed")
+            return
+        stream = self.open_stream(self.stream_ticket(token))
+        lines = stream.iter_lines(decode_unicode=True)
+        next(lines)  # retry: ... sent on connect
+        requests.patch(f"{self.api_url}/users/{user_id}/suspend", headers=self.headers())
+        started = time.time()
+        closed = all(time.time() - started < 20 for _ in lines)
+        stream.close()
+        self.log_test("Stream Closed On Suspension", closed, f"Closed after {time.time() - started:.1f}s")
+
+        response = requests.post(f"{self.api_url}/changes/stream-ticket", headers={'Authorization': f'Bearer {token}'})
+        self.log_test("Suspended User Cannot Reconnect", response.status_code == 401,
+                      f"Status: {response.status_code}")
+        requests.delete(f"{self.api_url}/users/{user_id}", headers=self.headers())
+
+    def test_admin_only(self):
+        response = requests.get(f"{self.api_url}/changes")
+        self.log_test("Changes Require Authentication", response.status_code in (401, 403),
+                      f"Status: {response.status_code}")
+
+    def run_all_tests(self):
+        """Run all change journal tests"""
+        print("🚀 Starting Change Journal Tests")
+        print("=" * 60)
+
+        if not self.setup_test_data():
+            print("\n❌ Failed to setup test data. Cannot proceed.")
+            return False
+
+        self.test_writes_are_journaled()
+        self.test_sync_tokens()
+        self.test_sync_tombstones()
+        self.test_change_stream()
+        self.test_stream_closed_on_suspension()
+        self.test_admin_only()
+
+        print("\n" + "=" * 60)
+        print(f"📊 Change Journal Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
+
+        if self.tests_passed == self.tests_run:
+            print("🎉 All change journal tests passed!")
+            return True
+
+        print(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
+        print("\nFailed Tests:")
+        for result in self.test_results:
+            if not result['success']:
+                print(f"  ❌ {result['test']}: {result['message']}")
+        return False
+
+def main():
+    tester = ChangeJournalTester()
+    success = tester.run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
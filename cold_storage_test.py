@@ -0,0 +1,181 @@
+"""Cold tier tests.
+
+Runs the cold tier mover against LocalStorage in a temporary directory and a
+throwaway database on the MongoDB at MONGO_URL (dropped afterwards):
+
+    pip install zstandard
+    MONGO_URL=mongodb://localhost:27017 python cold_storage_test.py
+"""
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from blob_store import BlobStore  # noqa: E402
+from cold_storage import COLD_TIER, MOVER_LOCK_ID, ColdTier, cold_key, zstandard  # noqa: E402
+from delta_store import DeltaStore  # noqa: E402
+from storage import LocalStorage  # noqa: E402
+
+LONG_AGO = datetime.utcnow() - timedelta(days=365)
+
+class ColdStorageTester:
+    def __init__(self):
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.test_results = []
+        self.workdir = Path(tempfile.mkdtemp())
+        self.scratch = self.workdir / "scratch"
+        self.scratch.mkdir()
+        self.storage = LocalStorage(self.workdir / "store")
+        self.client = None
+        self.db = None
+        self.content = {}
+
+    def log_test(self, name, success, message=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name}: PASSED - {message}")
+        else:
+            print(f"❌ {name}: FAILED - {message}")
+        self.test_results.append({"test": name, "success": success, "message": message})
+
+    async def commit(self, name):
+        """Store a compressible file the way an upload does and return its hash."""
+        content = b"".join(f"{name} paragraph {n} of the register.\n".encode() for n in range(5000))
+        sha256 = hashlib.sha256(content).hexdigest()
+        temp_path = self.scratch / f"{uuid.uuid4().hex}.part"
+        temp_path.write_bytes(content)
+        await self.store.commit(temp_path, sha256, len(content))
+        await self.store.add_ref(sha256, len(content))
+        self.content[sha256] = content
+        return sha256
+
+    async def is_cold(self, sha256):
+        record = await self.db.blobs.find_one({"_id": sha256})
+        return (record.get("tier") == COLD_TIER and await self.storage.stat(cold_key(sha256)) is not None
+                and await self.storage.stat(self.store.key_for(sha256)) is None)
+
+    async def setup_test_data(self):
+        """Idle, recently read, archived and shared blobs"""
+        print("\n🔧 Setting up test data...")
+        if zstandard is None:
+            print("❌ zstandard is not installed (pip install zstandard)")
+            return False
+        self.client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                                         serverSelectionTimeoutMS=3000)
+        self.db = self.client[f"cold_storage_test_{uuid.uuid4().hex[:8]}"]
+        try:
+            await self.client.server_info()
+        except Exception as e:
+            print(f"❌ MongoDB not reachable: {e}")
+            return False
+        self.store = BlobStore(self.db, self.storage)
+        self.cold = ColdTier(self.db, self.store, self.storage, self.scratch)
+        self.idle = await self.commit("idle")
+        self.recent = await self.commit("recently read")
+        self.archived = await self.commit("archived")
+        self.shared = await self.commit("shared")
+
+        await self.db.blobs.update_one({"_id": self.idle}, {"$set": {"created_at": LONG_AGO, "last_access": LONG_AGO}})
+        await self.db.blobs.update_one({"_id": self.recent}, {"$set": {"created_at": LONG_AGO,
+                                                                        "last_access": datetime.utcnow()}})
+        await self.db.documents.insert_many([
+            {"id": str(uuid.uuid4()), "status": "archived", "file_sha256": self.archived},
+            {"id": str(uuid.uuid4()), "status": "archived", "file_sha256": self.shared},
+            {"id": str(uuid.uuid4()), "status": "active", "file_sha256": self.shared},
+        ])
+        return True
+
+    async def test_lease_held(self):
+        """A pass is skipped while another node holds the mover lease"""
+        await self.db.maintenance.insert_one(
+            {"_id": MOVER_LOCK_ID, "lease_until": datetime.utcnow() + timedelta(hours=1)}
+        )
+        stats = await self.cold.run()
+        self.log_test("Mover Skips While Leased", stats["moved"] == 0 and not await self.is_cold(self.idle),
+                      f"Stats: {stats}")
+        await self.db.maintenance.update_one({"_id": MOVER_LOCK_ID},
+                                             {"$set": {"lease_until": datetime.utcnow() - timedelta(minutes=1)}})
+
+    async def test_freeze(self):
+        """An expired lease is taken over; idle and archived blobs move, live ones stay"""
+        stats = await self.cold.run()
+        self.log_test("Mover Takes Expired Lease", stats["moved"] == 2, f"Stats: {stats}")
+        self.log_test("Idle Blob Frozen", await self.is_cold(self.idle), "blobs/ -> cold/")
+        self.log_test("Archived Blob Frozen", await self.is_cold(self.archived), "blobs/ -> cold/")
+        self.log_test("Recently Read Blob Stays", not await self.is_cold(self.recent), "Still in blobs/")
+        self.log_test("Blob Of A Live Record Stays", not await self.is_cold(self.shared),
+                      "Shared with an active document")
+        self.log_test("Cold Copy Compressed", stats["bytes_after"] < stats["bytes_before"],
+                      f"{stats['bytes_before']} -> {stats['bytes_after']} bytes")
+        lease = await self.db.maintenance.find_one({"_id": MOVER_LOCK_ID})
+        self.log_test("Lease Released", lease["lease_until"] is None, f"Finished at {lease.get('finished_at')}")
+
+        stats = await self.cold.run()
+        self.log_test("Second Pass Moves Nothing", stats["moved"] == 0, f"Stats: {stats}")
+
+    async def test_rehydrate(self):
+        """Reads decompress cold blobs into the cache and stamp last_access"""
+        deltas = DeltaStore(self.db, self.store, self.storage, self.scratch, self.cold)
+        key = await deltas.resolve(self.store.key_for(self.idle))
+        data = await self.storage.get(key)
+        self.log_test("Cold Blob Rehydrated", key != self.store.key_for(self.idle) and data == self.content[self.idle],
+                      f"Read {len(data)} bytes from {key.split('/')[0]}/")
+        record = await self.db.blobs.find_one({"_id": self.idle})
+        self.log_test("Read Stamps Last Access", record["last_access"] > LONG_AGO, f"last_access: {record['last_access']}")
+
+        await self.commit("archived")
+        record = await self.db.blobs.find_one({"_id": self.archived})
+        self.log_test("Re-Upload Thaws Blob", "tier" not in record and
+                      await deltas.resolve(self.store.key_for(self.archived)) == self.store.key_for(self.archived),
+                      "Whole file back in blobs/")
+
+    async def run(self):
+        if not await self.setup_test_data():
+            print("\n❌ Failed to setup test data. Cannot proceed.")
+            return False
+        try:
+            await self.test_lease_held()
+            await self.test_freeze()
+            await self.test_rehydrate()
+        finally:
+            await self.client.drop_database(self.db.name)
+        return True
+
+    def run_all_tests(self):
+        print("🚀 Starting Cold Storage Tests")
+        print("=" * 60)
+
+        if not asyncio.run(self.run()):
+            return False
+
+        print("\n" + "=" * 60)
+        print(f"📊 Cold Storage Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
+
+        if self.tests_passed == self.tests_run:
+            print("🎉 All cold storage tests passed!")
+            return True
+
+        print(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
+        for result in self.test_results:
+            if not result['success']:
+                print(f"  ❌ {result['test']}: {result['message']}")
+        return False
+
+def main():
+    tester = ColdStorageTester()
+    success = tester.run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
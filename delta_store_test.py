@@ -0,0 +1,225 @@
+"""Delta-encoded version tests.
+
+Runs DeltaStore against LocalStorage in a temporary directory and a throwaway
+database on the MongoDB at MONGO_URL (dropped afterwards):
+
+    pip install zstandard
+    MONGO_URL=mongodb://localhost:27017 python delta_store_test.py
+"""
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from blob_store import BlobStore  # noqa: E402
+from delta_store import DELTA_ENCODING, DeltaStore, decode_delta, delta_key, encode_delta, zstandard  # noqa: E402
+from storage import LocalStorage  # noqa: E402
+
+def version_bytes(seed, edit=b""):
+    """Roughly 200 KiB of text; versions of one seed differ only by `edit`."""
+    lines = [f"{seed} clause {n}: the holder shall comply with section {n % 17}.\n".encode() for n in range(3000)]
+    lines[1500] = edit or lines[1500]
+    return b"".join(lines)
+
+class HookedStorage(LocalStorage):
+    """LocalStorage that runs a callback when a given key is written."""
+    hooks = {}
+
+    async def put(self, key, source):
+        await super().put(key, source)
+        if key in self.hooks:
+            await self.hooks.pop(key)()
+
+class DeltaStoreTester:
+    def __init__(self):
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.test_results = []
+        self.workdir = Path(tempfile.mkdtemp())
+        self.scratch = self.workdir / "scratch"
+        self.scratch.mkdir()
+        self.storage = HookedStorage(self.workdir / "store")
+        self.client = None
+        self.db = None
+
+    def log_test(self, name, success, message=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name}: PASSED - {message}")
+        else:
+            print(f"❌ {name}: FAILED - {message}")
+        self.test_results.append({"test": name, "success": success, "message": message})
+
+    async def commit(self, content):
+        """Store content the way an upload does and return its hash."""
+        sha256 = hashlib.sha256(content).hexdigest()
+        temp_path = self.scratch / f"{uuid.uuid4().hex}.part"
+        temp_path.write_bytes(content)
+        await self.store.commit(temp_path, sha256, len(content))
+        await self.store.add_ref(sha256, len(content))
+        return sha256
+
+    async def make_current(self, document_id, sha256):
+        await self.db.documents.update_one({"id": document_id}, {"$set": {"file_sha256": sha256}}, upsert=True)
+
+    async def read(self, sha256):
+        return await self.storage.get(await self.deltas.resolve(self.store.key_for(sha256)))
+
+    async def setup_test_data(self):
+        """Store two versions of one document, the second one current"""
+        print("\n🔧 Setting up test data...")
+        if zstandard is None:
+            print("❌ zstandard is not installed (pip install zstandard)")
+            return False
+        self.client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                                         serverSelectionTimeoutMS=3000)
+        self.db = self.client[f"delta_store_test_{uuid.uuid4().hex[:8]}"]
+        try:
+            await self.client.server_info()
+        except Exception as e:
+            print(f"❌ MongoDB not reachable: {e}")
+            return False
+        self.store = BlobStore(self.db, self.storage)
+        self.deltas = DeltaStore(self.db, self.store, self.storage, self.scratch)
+        self.v1 = version_bytes("policy")
+        self.v2 = version_bytes("policy", b"clause 1500 was rewritten in version two.\n")
+        self.v1_sha = await self.commit(self.v1)
+        self.v2_sha = await self.commit(self.v2)
+        await self.make_current("document-1", self.v2_sha)
+        return True
+
+    def test_codec_round_trip(self):
+        delta = encode_delta(self.v1, self.v2)
+        self.log_test("Delta Round Trip", decode_delta(delta, self.v2, len(self.v1)) == self.v1,
+                      f"{len(self.v1)} bytes -> {len(delta)} byte delta")
+
+    async def test_encode(self):
+        """The superseded version moves to deltas/; the current one stays whole"""
+        encoded = await self.deltas.encode(self.v1_sha, self.v2_sha)
+        record = await self.db.blobs.find_one({"_id": self.v1_sha})
+        self.log_test("Superseded Version Encoded", encoded and record.get("encoding") == DELTA_ENCODING and
+                      record.get("base_sha256") == self.v2_sha,
+                      f"stored {record.get('stored_size')} of {record.get('size')} bytes")
+        self.log_test("Whole File Replaced By Delta", await self.storage.stat(self.store.key_for(self.v1_sha)) is None
+                      and await self.storage.stat(delta_key(self.v1_sha)) is not None, "blobs/ -> deltas/")
+        self.log_test("Current Version Not Encoded", not await self.deltas.encode(self.v2_sha, self.v1_sha),
+                      "encode() refused the current file")
+
+    async def test_resolve(self):
+        data = await self.read(self.v1_sha)
+        self.log_test("Resolve Reconstructs Version", data == self.v1, f"{len(data)} bytes")
+        self.log_test("Resolve Passes Whole Blobs Through",
+                      await self.deltas.resolve(self.store.key_for(self.v2_sha)) == self.store.key_for(self.v2_sha),
+                      "Current version read in place")
+
+    async def test_eviction(self):
+        """evict() leaves a checked-out reconstruction alone until it is released"""
+        # A second reconstruction, read last, is the newest entry, which evict() always keeps
+        other, other_base = version_bytes("handbook"), version_bytes("handbook", b"chapter 1500 was revised.\n")
+        other_sha, other_base_sha = await self.commit(other), await self.commit(other_base)
+        await self.make_current("document-3", other_base_sha)
+        await self.deltas.encode(other_sha, other_base_sha)
+
+        self.deltas.cache_bytes = 0
+        key, release = await self.deltas.checkout(self.store.key_for(self.v1_sha))
+        await self.read(other_sha)  # reconstructing evicts everything else it can
+        self.log_test("Leased File Kept", await self.storage.stat(key) is not None, key)
+
+        # The lease has run out; the checkout still holds the file while it is streamed
+        await self.db.reconstructed_cache.update_one({"_id": self.v1_sha}, {"$set": {"lease_until": datetime.utcnow()}})
+        await self.deltas.evict()
+        self.log_test("Checked Out File Kept", await self.storage.stat(key) is not None, "Held by its reader")
+
+        await release()
+        await self.deltas.evict()
+        self.log_test("Released File Evicted", await self.storage.stat(key) is None
+                      and await self.db.reconstructed_cache.find_one({"_id": self.v1_sha}) is None, "cache/ entry gone")
+        self.log_test("Evicted File Rebuilt", await self.read(self.v1_sha) == self.v1, "Reconstructed again")
+        self.deltas.cache_bytes = 512 * 1024 * 1024
+
+    async def test_revert(self):
+        """Reverting to a delta-encoded version keeps it readable, and re-uploading makes it whole"""
+        # The record is written before anything re-stores the bytes: the current file is a delta
+        await self.make_current("document-1", self.v1_sha)
+        data = await self.read(self.v1_sha)
+        self.log_test("Reverted Current File Readable", data == self.v1, "Reconstructed from its delta")
+        self.log_test("No Delta Against A Delta", not await self.deltas.encode(self.v2_sha, self.v1_sha),
+                      "v2 not encoded against the delta-encoded v1")
+
+        await self.commit(self.v1)
+        record = await self.db.blobs.find_one({"_id": self.v1_sha})
+        self.log_test("Re-Upload Stores Whole File", "encoding" not in record and
+                      await self.storage.stat(self.store.key_for(self.v1_sha)) is not None, f"Record: {record}")
+        self.log_test("Resolve Uses Whole File Again",
+                      await self.deltas.resolve(self.store.key_for(self.v1_sha)) == self.store.key_for(self.v1_sha),
+                      "No reconstruction")
+        self.log_test("Former Current Version Encoded", await self.deltas.encode(self.v2_sha, self.v1_sha) and
+                      await self.read(self.v2_sha) == self.v2, "v2 encoded against v1 and read back")
+
+    async def test_revert_during_encode(self):
+        """A revert landing while its old version is being encoded leaves the file whole"""
+        v1 = version_bytes("procedure")
+        v2 = version_bytes("procedure", b"a new step 1500 was added.\n")
+        v1_sha, v2_sha = await self.commit(v1), await self.commit(v2)
+        await self.make_current("document-2", v2_sha)
+        # Revert document-2 to v1 right after the delta has been written
+        self.storage.hooks[delta_key(v1_sha)] = lambda: self.make_current("document-2", v1_sha)
+
+        encoded = await self.deltas.encode(v1_sha, v2_sha)
+        record = await self.db.blobs.find_one({"_id": v1_sha})
+        self.log_test("Encoding Abandoned On Revert", not encoded and "encoding" not in record, f"Record: {record}")
+        self.log_test("Reverted File Still Whole", await self.storage.stat(self.store.key_for(v1_sha)) is not None
+                      and await self.storage.stat(delta_key(v1_sha)) is None, "blobs/ kept, delta removed")
+
+    async def run(self):
+        if not await self.setup_test_data():
+            print("\n❌ Failed to setup test data. Cannot proceed.")
+            return False
+        try:
+            self.test_codec_round_trip()
+            await self.test_encode()
+            await self.test_resolve()
+            await self.test_eviction()
+            await self.test_revert()
+            await self.test_revert_during_encode()
+        finally:
+            await self.client.drop_database(self.db.name)
+        return True
+
+    def run_all_tests(self):
+        print("🚀 Starting Delta Store Tests")
+        print("=" * 60)
+
+        if not asyncio.run(self.run()):
+            return False
+
+        print("\n" + "=" * 60)
+        print(f"📊 Delta Store Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
+
+        if self.tests_passed == self.tests_run:
+            print("🎉 All delta store tests passed!")
+            return True
+
+        print(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
+        for result in self.test_results:
+            if not result['success']:
+                print(f"  ❌ {result['test']}: {result['message']}")
+        return False
+
+def main():
+    tester = DeltaStoreTester()
+    success = tester.run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
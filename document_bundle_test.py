@@ -0,0 +1,161 @@
+import io
+import requests
+import sys
+import uuid
+import zipfile
+
+PDF_CONTENT = b"""%PDF-1.4
+1 0 obj
+<< /Type /Catalog /Pages 2 0 R >>
+endobj
+2 0 obj
+<< /Type /Pages /Kids [] /Count 0 >>
+endobj
+trailer
+<< /Root 1 0 R >>
+%%EOF"""
+
+class DocumentBundleTester:
+    def __init__(self, base_url="https://secure-doc-share.preview.emergentagent.com"):
+        self.base_url = base_url
+        self.api_url = f"{base_url}/api"
+        self.admin_token = None
+        self.category_id = None
+        self.document_ids = []
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.test_results = []
+
+    def log_test(self, name, success, message=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name}: PASSED - {message}")
+        else:
+            print(f"❌ {name}: FAILED - {message}")
+        self.test_results.append({"test": name, "success": success, "message": message})
+
+    def headers(self):
+        return {'Authorization': f'Bearer {self.admin_token}'}
+
+    def setup_test_data(self):
+        """Login as admin and pick a category"""
+        print("\n🔧 Setting up test data...")
+        response = requests.post(f"{self.api_url}/auth/login", json={"username": "admin", "password": "admin123"})
+        if response.status_code != 200:
+            print(f"❌ Admin login failed - Status: {response.status_code}")
+            return False
+        self.admin_token = response.json()['access_token']
+        categories = requests.get(f"{self.api_url}/categories", headers=self.headers()).json()
+        if not categories:
+            print("❌ No categories available")
+            return False
+        self.category_id = categories[0]['id']
+        return True
+
+    def upload(self, title, file_name):
+        response = requests.post(
+            f"{self.api_url}/documents",
+            headers=self.headers(),
+            data={"title": title, "category_id": self.category_id, "date_issued": "2025-01-01T00:00:00Z",
+                  "owner_department": "Test Department"},
+            files={"file": (file_name, io.BytesIO(PDF_CONTENT), "application/pdf")}
+        )
+        if response.status_code != 200:
+            return None
+        document = response.json()['document']
+        self.document_ids.append(document['id'])
+        return document
+
+    def bundle(self, **selection):
+        return requests.post(f"{self.api_url}/documents/bundle", headers=self.headers(), json=selection)
+
+    def test_bundle_contents(self):
+        """Bundle two documents and check one entry per file under per-document folders"""
+        first = self.upload(f"Bundle A {uuid.uuid4().hex[:6]}", "report.pdf")
+        second = self.upload(f"Bundle B {uuid.uuid4().hex[:6]}", "report.pdf")
+        if not first or not second:
+            self.log_test("Upload Bundle Documents", False, "Upload failed")
+            return
+        response = self.bundle(document_ids=[first['id'], second['id']])
+        self.log_test("Bundle Response", response.status_code == 200 and
+                      response.headers.get('content-type') == "application/zip", f"Status: {response.status_code}")
+        if response.status_code != 200:
+            return
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+        names = archive.namelist()
+        self.log_test("One Entry Per Document", len(names) == 2 and all(n.endswith("/report.pdf") for n in names),
+                      f"Entries: {names}")
+        self.log_test("Entries Hold The Uploaded Bytes",
+                      all(archive.read(name) == PDF_CONTENT for name in names), "Compared entry contents")
+
+    def test_hostile_file_names(self):
+        """Names with path segments must not escape the document's folder (zip slip)"""
+        hostile = [("../../evil.pdf", "evil.pdf"), ("..\\..\\windows.pdf", "windows.pdf"),
+                   ("/etc/passwd.pdf", "passwd.pdf")]
+        title = f"../../Hostile {uuid.uuid4().hex[:6]}"
+        uploaded = [(self.upload(title, name), expected) for name, expected in hostile]
+        if not all(document for document, _ in uploaded):
+            self.log_test("Upload Hostile Names", False, "Upload failed")
+            return
+        response = self.bundle(document_ids=[document['id'] for document, _ in uploaded], include_versions=True)
+        if response.status_code != 200:
+            self.log_test("Bundle Hostile Names", False, f"Status: {response.status_code}")
+            return
+        names = zipfile.ZipFile(io.BytesIO(response.content)).namelist()
+        unsafe = [name for name in names
+                  if name.startswith("/") or "\\" in name or any(part in ("", ".", "..") for part in name.split("/"))]
+        self.log_test("No Path Traversal In Entries", not unsafe, f"Unsafe: {unsafe}")
+        base_names = {name.rsplit("/", 1)[-1] for name in names}
+        self.log_test("Names Reduced To Base Names", {expected for _, expected in hostile} <= base_names,
+                      f"Entries: {names}")
+
+    def test_bundle_requires_selection(self):
+        response = self.bundle()
+        self.log_test("Empty Selection Rejected", response.status_code == 400, f"Status: {response.status_code}")
+        response = requests.post(f"{self.api_url}/documents/bundle", json={"document_ids": self.document_ids[:1]})
+        self.log_test("Bundle Requires Authentication", response.status_code in (401, 403),
+                      f"Status: {response.status_code}")
+
+    def cleanup(self):
+        for document_id in self.document_ids:
+            requests.delete(f"{self.api_url}/documents/{document_id}", headers=self.headers())
+
+    def run_all_tests(self):
+        """Run all document bundle tests"""
+        print("🚀 Starting Document Bundle Tests")
+        print("=" * 60)
+
+        if not self.setup_test_data():
+            print("\n❌ Failed to setup test data. Cannot proceed.")
+            return False
+
+        try:
+            self.test_bundle_contents()
+            self.test_hostile_file_names()
+            self.test_bundle_requires_selection()
+        finally:
+            self.cleanup()
+
+        print("\n" + "=" * 60)
+        print(f"📊 Document Bundle Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
+
+        if self.tests_passed == self.tests_run:
+            print("🎉 All document bundle tests passed!")
+            return True
+
+        print(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
+        print("\nFailed Tests:")
+        for result in self.test_results:
+            if not result['success']:
+                print(f"  ❌ {result['test']}: {result['message']}")
+        return False
+
+def main():
+    tester = DocumentBundleTester()
+    success = tester.run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
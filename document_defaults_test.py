@@ -68,7 +68,7 @@ class DocumentDefaultsTester:
         headers = {'Authorization': f'Bearer {self.token}'}
         
         # Create minimal policy upload
-        test_file = io.BytesIO(b"Test policy content")
+        test_file = io.BytesIO(b"%PDF-1.4\nTest policy content\n%%EOF")
         form_data = {
             'title': 'Default Values Test Policy',
             'category_id': self.test_category_id,
@@ -179,7 +179,7 @@ class DocumentDefaultsTester:
         headers = {'Authorization': f'Bearer {self.token}'}
         
         # First, create a policy and set it to hidden
-        test_file = io.BytesIO(b"Hidden policy content")
+        test_file = io.BytesIO(b"%PDF-1.4\nHidden policy content\n%%EOF")
         form_data = {
             'title': 'Hidden Policy Test',
             'category_id': self.test_category_id,
@@ -2,9 +2,10 @@ import requests
 import sys
 import json
 import io
-from datetime import datetime
+from datetime import datetime, timedelta
 import tempfile
 import os
+import zipfile
 
 class DocumentEditingTester:
     def __init__(self, base_url="https://secure-doc-share.preview.emergentagent.com"):
@@ -94,11 +95,20 @@ startxref
 %%EOF"""
         return io.BytesIO(pdf_content)
 
-    def create_test_docx_file(self):
+    def create_test_docx_file(self, paragraphs=("Test Document Content",)):
         """Create a simple test DOCX file"""
-        # Create a minimal DOCX content (simplified ZIP structure)
-        docx_content = b"PK\x03\x04\x14\x00\x00\x00\x08\x00Test Document Content"
-        return io.BytesIO(docx_content)
+        # Minimal DOCX package: the server checks for these two parts
+        body = "".join(f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>" for text in paragraphs)
+        docx_content = io.BytesIO()
+        with zipfile.ZipFile(docx_content, "w") as package:
+            package.writestr("[Content_Types].xml", "<Types/>")
+            package.writestr(
+                "word/document.xml",
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f"<w:body>{body}</w:body></w:document>"
+            )
+        docx_content.seek(0)
+        return docx_content
 
     def login_user(self, username, password, role_name):
         """Login and get token for a user"""
@@ -501,7 +511,9 @@ startxref
             if response.status_code == 200:
                 initial_policy = response.json()
                 initial_version = initial_policy.get('version', 1)
-                initial_history_count = len(initial_policy.get('version_history', []))
+                initial_history_count = requests.get(
+                    f"{self.api_url}/policies/{self.test_policy_id}/versions", headers=headers
+                ).json().get('total', 0)
                 
                 print(f"   Initial policy version: {initial_version}")
                 print(f"   Initial version history entries: {initial_history_count}")
@@ -534,8 +546,10 @@ startxref
                     # Get updated policy to check version history
                     response = requests.get(f"{self.api_url}/policies/{self.test_policy_id}", headers=headers)
                     if response.status_code == 200:
-                        updated_policy = response.json()
-                        new_history_count = len(updated_policy.get('version_history', []))
+                        versions_page = requests.get(
+                            f"{self.api_url}/policies/{self.test_policy_id}/versions", headers=headers
+                        ).json()
+                        new_history_count = versions_page.get('total', 0)
                         
                         # Verify version history updated
                         history_updated = new_history_count == initial_history_count + 1
@@ -546,8 +560,8 @@ startxref
                         )
                         
                         # Check latest version history entry
-                        if updated_policy.get('version_history'):
-                            latest_entry = updated_policy['version_history'][-1]
+                        if versions_page.get('versions'):
+                            latest_entry = versions_page['versions'][0]  # newest first
                             
                             # Check version number in history
                             correct_version = latest_entry.get('version_number') == new_version
@@ -591,6 +605,97 @@ startxref
 
         return True
 
+    def test_version_diff(self):
+        """Test the text diff between two policy versions"""
+        print("\n=== VERSION DIFF TESTS ===")
+        
+        if not self.test_policy_id or not self.admin_token:
+            self.log_test("Version Diff Setup", False, "Missing test policy or admin token")
+            return False
+
+        upload_headers = {'Authorization': f'Bearer {self.admin_token}'}
+        try:
+            versions = []
+            for paragraphs in (("Scope", "Staff must lock screens."), ("Scope", "Staff must lock screens when away.")):
+                files = {'file': ('diff_test.docx', self.create_test_docx_file(paragraphs),
+                                  'application/vnd.openxmlformats-officedocument.wordprocessingml.document')}
+                response = requests.patch(
+                    f"{self.api_url}/policies/{self.test_policy_id}/document",
+                    data={'change_summary': 'Diff test'}, files=files, headers=upload_headers
+                )
+                if response.status_code != 200:
+                    self.log_test("Version Diff Upload", False, f"Status: {response.status_code}")
+                    return False
+                versions.append(response.json()['new_version'])
+
+            url = f"{self.api_url}/policies/{self.test_policy_id}/diff?from={versions[0]}&to={versions[1]}"
+            response = requests.get(url, headers=upload_headers)
+            if response.status_code == 200:
+                result = response.json()
+                self.log_test(
+                    "Version Diff Lines",
+                    "-Staff must lock screens." in result['diff'] and "+Staff must lock screens when away." in result['diff']
+                    and result['added'] == 1 and result['removed'] == 1,
+                    f"Diff: {result['diff']}"
+                )
+                repeated = requests.get(url, headers=upload_headers).json()
+                self.log_test("Version Diff Repeated", repeated['diff'] == result['diff'], "Second request returns the same diff")
+            else:
+                self.log_test("Version Diff", False, f"Status: {response.status_code}")
+
+            response = requests.get(
+                f"{self.api_url}/policies/{self.test_policy_id}/diff?from={versions[1] + 100}&to={versions[1]}",
+                headers=upload_headers
+            )
+            self.log_test("Version Diff Unknown Version", response.status_code == 404, f"Status: {response.status_code}")
+        except Exception as e:
+            self.log_test("Version Diff", False, f"Exception: {str(e)}")
+
+        return True
+
+    def test_as_of_listing(self):
+        """Test listing policies as they stood before the latest upload"""
+        print("\n=== POINT-IN-TIME LISTING TESTS ===")
+        
+        if not self.test_policy_id or not self.admin_token:
+            self.log_test("As Of Setup", False, "Missing test policy or admin token")
+            return False
+
+        headers = {'Authorization': f'Bearer {self.admin_token}'}
+        try:
+            latest = requests.get(
+                f"{self.api_url}/policies/{self.test_policy_id}/versions", headers=headers
+            ).json()['versions'][0]
+            if latest['version_number'] < 2:
+                self.log_test("As Of Listing", False, "Test policy has a single version")
+                return False
+            # Just before the latest upload, the previous version was in force
+            upload_date = datetime.fromisoformat(latest['upload_date'].replace('Z', ''))
+            as_of = (upload_date - timedelta(milliseconds=10)).isoformat()
+            response = requests.get(f"{self.api_url}/policies", params={'as_of': as_of}, headers=headers)
+            if response.status_code == 200:
+                policy = next((p for p in response.json() if p['id'] == self.test_policy_id), None)
+                self.log_test(
+                    "As Of Listing Version",
+                    policy is not None and policy['version'] == latest['version_number'] - 1,
+                    f"Version as of {as_of}: {policy and policy['version']}"
+                )
+            else:
+                self.log_test("As Of Listing", False, f"Status: {response.status_code}")
+
+            response = requests.get(
+                f"{self.api_url}/policies", params={'as_of': '2000-01-01T00:00:00'}, headers=headers
+            )
+            self.log_test(
+                "As Of Before Creation",
+                response.status_code == 200 and all(p['id'] != self.test_policy_id for p in response.json()),
+                f"Status: {response.status_code}"
+            )
+        except Exception as e:
+            self.log_test("As Of Listing", False, f"Exception: {str(e)}")
+
+        return True
+
     def test_policy_data_updates(self):
         """Test policy data updates after document replacement"""
         print("\n=== POLICY DATA UPDATES TESTS ===")
@@ -789,12 +894,11 @@ startxref
             # Verify default summary was used
             if success:
                 headers_json = {'Authorization': f'Bearer {self.admin_token}', 'Content-Type': 'application/json'}
-                policy_response = requests.get(f"{self.api_url}/policies/{self.test_policy_id}", headers=headers_json)
-                if policy_response.status_code == 200:
-                    policy = policy_response.json()
-                    version_history = policy.get('version_history', [])
+                versions_response = requests.get(f"{self.api_url}/policies/{self.test_policy_id}/versions", headers=headers_json)
+                if versions_response.status_code == 200:
+                    version_history = versions_response.json().get('versions', [])
                     if version_history:
-                        latest_entry = version_history[-1]
+                        latest_entry = version_history[0]  # newest first
                         change_summary = latest_entry.get('change_summary', '')
                         default_used = change_summary == 'Document updated'
                         self.log_test(
@@ -908,6 +1012,8 @@ startxref
         self.test_authentication_authorization()
         self.test_document_upload_replacement()
         self.test_version_management()
+        self.test_version_diff()
+        self.test_as_of_listing()
         self.test_policy_data_updates()
         self.test_error_handling()
         self.test_existing_functionality_regression()
@@ -0,0 +1,161 @@
+import requests
+import sys
+import io
+from datetime import datetime
+
+class DownloadCachingTester:
+    def __init__(self, base_url="https://secure-doc-share.preview.emergentagent.com"):
+        self.base_url = base_url
+        self.api_url = f"{base_url}/api"
+        self.admin_token = None
+        self.test_document_id = None
+        self.content = b"%PDF-1.4\n" + bytes(range(256)) * 64 + b"\n%%EOF"
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.test_results = []
+
+    def log_test(self, name, success, message=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name}: PASSED - {message}")
+        else:
+            print(f"❌ {name}: FAILED - {message}")
+        self.test_results.append({"test": name, "success": success, "message": message})
+
+    def headers(self, extra=None):
+        headers = {'Authorization': f'Bearer {self.admin_token}'}
+        if extra:
+            headers.update(extra)
+        return headers
+
+    def setup_test_data(self):
+        """Login as admin and upload a public PDF document"""
+        print("\n🔧 Setting up test data...")
+        response = requests.post(f"{self.api_url}/auth/login", json={"username": "admin", "password": "admin123"})
+        if response.status_code != 200:
+            print(f"❌ Admin login failed - Status: {response.status_code}")
+            return False
+        self.admin_token = response.json()['access_token']
+
+        categories = requests.get(f"{self.api_url}/categories", headers=self.headers()).json()
+        if not categories:
+            print("❌ No categories available for testing")
+            return False
+
+        files = {'file': ('range_test.pdf', io.BytesIO(self.content), 'application/pdf')}
+        data = {
+            'title': f"Range Test Document {datetime.now().strftime('%H%M%S')}",
+            'document_type': 'document',
+            'category_id': categories[0]['id'],
+            'date_issued': datetime.now().isoformat(),
+            'owner_department': 'Testing'
+        }
+        response = requests.post(f"{self.api_url}/documents", files=files, data=data, headers=self.headers())
+        if response.status_code != 200:
+            print(f"❌ Document upload failed - Status: {response.status_code} - {response.text}")
+            return False
+        self.test_document_id = response.json()['document']['id']
+        print(f"✅ Created test document: {self.test_document_id}")
+        return True
+
+    def test_full_download(self):
+        """A plain GET returns the file with a strong ETag and the real content type"""
+        response = requests.get(f"{self.api_url}/documents/{self.test_document_id}/download", headers=self.headers())
+        etag = response.headers.get('ETag', '')
+        self.log_test(
+            "Full Download Headers",
+            response.status_code == 200 and response.content == self.content
+            and etag.startswith('"') and response.headers.get('Content-Type') == 'application/pdf'
+            and response.headers.get('Accept-Ranges') == 'bytes',
+            f"Status: {response.status_code}, ETag: {etag}, Content-Type: {response.headers.get('Content-Type')}"
+        )
+        return etag
+
+    def test_conditional_get(self, etag):
+        """Revalidating with the ETag or Last-Modified costs a bodiless 304"""
+        response = requests.get(
+            f"{self.api_url}/documents/{self.test_document_id}/download",
+            headers=self.headers({'If-None-Match': etag})
+        )
+        self.log_test("If-None-Match Returns 304", response.status_code == 304 and not response.content,
+                      f"Status: {response.status_code}")
+
+        last_modified = requests.get(
+            f"{self.api_url}/public/documents/{self.test_document_id}/download"
+        ).headers.get('Last-Modified')
+        response = requests.get(
+            f"{self.api_url}/public/documents/{self.test_document_id}/download",
+            headers={'If-Modified-Since': last_modified}
+        )
+        self.log_test("If-Modified-Since Returns 304 (Public)", response.status_code == 304, f"Status: {response.status_code}")
+
+    def test_ranges(self, etag):
+        """Single, suffix, multi and unsatisfiable ranges"""
+        url = f"{self.api_url}/documents/{self.test_document_id}/download"
+        size = len(self.content)
+
+        response = requests.get(url, headers=self.headers({'Range': 'bytes=0-1023'}))
+        self.log_test(
+            "Single Range Returns 206",
+            response.status_code == 206 and response.content == self.content[:1024]
+            and response.headers.get('Content-Range') == f"bytes 0-1023/{size}",
+            f"Status: {response.status_code}, Content-Range: {response.headers.get('Content-Range')}"
+        )
+
+        response = requests.get(url, headers=self.headers({'Range': 'bytes=-6'}))
+        self.log_test("Suffix Range Returns Tail", response.status_code == 206 and response.content == self.content[-6:],
+                      f"Status: {response.status_code}")
+
+        response = requests.get(url, headers=self.headers({'Range': 'bytes=0-9,2000-2009'}))
+        self.log_test(
+            "Multi Range Returns multipart/byteranges",
+            response.status_code == 206 and response.headers.get('Content-Type', '').startswith('multipart/byteranges')
+            and self.content[2000:2010] in response.content,
+            f"Status: {response.status_code}, Content-Type: {response.headers.get('Content-Type')}"
+        )
+
+        response = requests.get(url, headers=self.headers({'Range': f'bytes={size + 10}-'}))
+        self.log_test("Unsatisfiable Range Returns 416", response.status_code == 416, f"Status: {response.status_code}")
+
+        response = requests.get(url, headers=self.headers({'Range': 'bytes=0-9', 'If-Range': '"stale"'}))
+        self.log_test("Stale If-Range Returns Full File", response.status_code == 200, f"Status: {response.status_code}")
+
+        response = requests.get(url, headers=self.headers({'Range': 'bytes=0-9', 'If-Range': etag}))
+        self.log_test("Current If-Range Returns 206", response.status_code == 206, f"Status: {response.status_code}")
+
+    def run_all_tests(self):
+        """Run all download caching tests"""
+        print("🚀 Starting Download Range / ETag Tests")
+        print("=" * 60)
+
+        if not self.setup_test_data():
+            print("\n❌ Failed to setup test data. Cannot proceed.")
+            return False
+
+        etag = self.test_full_download()
+        self.test_conditional_get(etag)
+        self.test_ranges(etag)
+
+        print("\n" + "=" * 60)
+        print(f"📊 Download Caching Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
+
+        if self.tests_passed == self.tests_run:
+            print("🎉 All download caching tests passed!")
+            return True
+
+        print(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
+        print("\nFailed Tests:")
+        for result in self.test_results:
+            if not result['success']:
+                print(f"  ❌ {result['test']}: {result['message']}")
+        return False
+
+def main():
+    tester = DownloadCachingTester()
+    success = tester.run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
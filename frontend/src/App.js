@@ -60,6 +60,9 @@ import { AdminLogin } from './components/AdminLogin';
 // Set up PDF.js worker - use local worker file to fix CORS issues
 pdfjs.GlobalWorkerOptions.workerSrc = '/pdf.worker.min.js';
 
+// Fetch only the byte ranges pages need instead of the whole file up front
+const PDF_OPTIONS = { disableAutoFetch: true, disableStream: true };
+
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
@@ -369,7 +372,8 @@ const PDFViewer = () => {
     );
   }
 
-  const pdfUrl = `${BACKEND_URL}${policy.file_url}`;
+  // Prefer the linearized copy when one exists: page 1 renders from the first range request
+  const pdfUrl = `${BACKEND_URL}${policy.web_file_url || policy.file_url}`;
 
   return (
     <div className="min-h-screen bg-slate-50">
@@ -449,6 +453,7 @@ const PDFViewer = () => {
             <div className="pdf-document bg-white shadow-lg">
               <Document
                 file={pdfUrl}
+                options={PDF_OPTIONS}
                 onLoadSuccess={onDocumentLoadSuccess}
                 loading={
                   <div className="flex items-center justify-center h-96">
@@ -674,6 +679,99 @@ const Dashboard = () => {
     }
   }, [user, showHidden, showDeleted, showDeletedPolicyTypes, showDeletedUserGroups]);
 
+  // Live updates from other tabs and users: patch the touched document, reload only the affected list
+  useEffect(() => {
+    if (!localStorage.getItem('token')) return;
+    let source = null;
+    let retry = null;
+    let stopped = false;
+    const reloadAll = () => {
+      fetchDocuments();
+      fetchCategories();
+      fetchPolicyTypes();
+      if (user.role === 'admin') {
+        fetchUsers();
+        fetchUserGroups();
+      }
+    };
+    // EventSource cannot send the Authorization header: every connection opens with a single-use ticket
+    const connect = async (reconnecting) => {
+      let ticket;
+      try {
+        ticket = (await axios.post(`${API}/changes/stream-ticket`)).data.ticket;
+      } catch (error) {
+        // 401: signed out, expired or suspended; the stream stays closed
+        if (!stopped && error.response?.status !== 401) retry = setTimeout(() => connect(reconnecting), 5000);
+        return;
+      }
+      if (stopped) return;
+      source = new EventSource(`${API}/changes/stream?ticket=${encodeURIComponent(ticket)}`);
+      source.onopen = () => {
+        if (reconnecting) reloadAll();  // changes made while disconnected were not delivered
+      };
+      source.addEventListener('change', (event) => {
+        const change = JSON.parse(event.data);
+        if (change.entity === 'document') {
+          refreshDocument(change);
+        } else if (change.entity === 'category') {
+          fetchCategories();
+        } else if (change.entity === 'policy_type') {
+          fetchPolicyTypes();
+        } else if (change.entity === 'user') {
+          fetchUsers();
+        } else if (change.entity === 'user_group') {
+          fetchUserGroups();
+        }
+      });
+      source.addEventListener('resync', reloadAll);
+      // The ticket is spent, so EventSource's own retry would be refused: reconnect with a new one
+      source.onerror = () => {
+        source.close();
+        if (!stopped) retry = setTimeout(() => connect(true), 5000);
+      };
+    };
+    connect(false);
+    return () => {
+      stopped = true;
+      clearTimeout(retry);
+      if (source) source.close();
+    };
+  }, [user, showHidden, showDeleted, showDeletedPolicyTypes, showDeletedUserGroups]);
+
+  // Same rule as the server-side filter of GET /documents for this role and these toggles
+  const inDocumentList = (doc) => {
+    const groupIds = user.user_group_ids || [];
+    const visible = doc.is_visible_to_users || (doc.visible_to_groups || []).some(id => groupIds.includes(id));
+    if (user.role === 'admin') return showDeleted || doc.status !== 'deleted';
+    if (user.role === 'policy_manager') return doc.status !== 'deleted' && visible;
+    return ['active', 'archived'].includes(doc.status) && visible;
+  };
+
+  const refreshDocument = async (change) => {
+    const drop = () => setDocuments(current => current.filter(doc => doc.id !== change.id));
+    if (change.action === 'removed' || (change.action === 'deleted' && !showDeleted)) {
+      drop();
+      return;
+    }
+    try {
+      const response = await axios.get(`${API}/documents/${change.id}`);
+      if (!inDocumentList(response.data)) {
+        drop();
+        return;
+      }
+      setDocuments(current => {
+        const index = current.findIndex(doc => doc.id === change.id);
+        if (index === -1) return [...current, response.data];
+        const next = [...current];
+        next[index] = response.data;
+        return next;
+      });
+    } catch (error) {
+      if (error.response?.status === 404) drop();
+      else console.error('Error refreshing document:', error);
+    }
+  };
+
   const fetchDocuments = async () => {  // Renamed from fetchPolicies
     try {
       const params = new URLSearchParams();
@@ -1075,7 +1173,17 @@ const Dashboard = () => {
                             {policy.policy_number}
                           </TableCell>
                           <TableCell className="font-medium">
-                            {policy.title}
+                            <div className="flex items-center space-x-3">
+                              {policy.thumbnail_url && (
+                                <img
+                                  src={`${BACKEND_URL}${policy.thumbnail_url}`}
+                                  alt=""
+                                  loading="lazy"
+                                  className="h-12 w-9 object-cover rounded border border-slate-200"
+                                />
+                              )}
+                              <span>{policy.title}</span>
+                            </div>
                           </TableCell>
                           <TableCell>
                             <Badge variant="secondary">
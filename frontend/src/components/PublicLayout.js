@@ -35,6 +35,9 @@ const API = `${BACKEND_URL}/api`;
 // Set up PDF.js worker with local fallback
 pdfjs.GlobalWorkerOptions.workerSrc = '/pdf.worker.min.js';
 
+// Fetch only the byte ranges pages need instead of the whole file up front
+const PDF_OPTIONS = { disableAutoFetch: true, disableStream: true };
+
 // Public Policy List Component
 export const PublicPolicyList = () => {
   const navigate = useNavigate();
@@ -258,7 +261,17 @@ export const PublicPolicyList = () => {
                           {policy.policy_number}
                         </TableCell>
                         <TableCell className="font-medium">
-                          {policy.title}
+                          <div className="flex items-center space-x-3">
+                            {policy.thumbnail_url && (
+                              <img
+                                src={`${BACKEND_URL}${policy.thumbnail_url}`}
+                                alt=""
+                                loading="lazy"
+                                className="h-12 w-9 object-cover rounded border border-slate-200"
+                              />
+                            )}
+                            <span>{policy.title}</span>
+                          </div>
                         </TableCell>
                         <TableCell>
                           <Badge variant="secondary">
@@ -407,7 +420,8 @@ export const PublicPDFViewer = () => {
     );
   }
 
-  const pdfUrl = `${BACKEND_URL}${policy.file_url}`;
+  // Prefer the linearized copy when one exists: page 1 renders from the first range request
+  const pdfUrl = `${BACKEND_URL}${policy.web_file_url || policy.file_url}`;
 
   return (
     <div className="min-h-screen bg-slate-50">
@@ -487,6 +501,7 @@ export const PublicPDFViewer = () => {
             <div className="pdf-document bg-white shadow-lg">
               <Document
                 file={pdfUrl}
+                options={PDF_OPTIONS}
                 onLoadSuccess={onDocumentLoadSuccess}
                 loading={
                   <div className="flex items-center justify-center h-96">
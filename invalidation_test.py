@@ -0,0 +1,218 @@
+"""Invalidation bus, principal cache and public list version tests.
+
+Two buses on one throwaway database on the MongoDB at MONGO_URL (dropped
+afterwards) stand in for two workers:
+
+    MONGO_URL=mongodb://localhost:27017 python invalidation_test.py
+"""
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from change_journal import ChangeJournal  # noqa: E402
+from invalidation import InvalidationBus  # noqa: E402
+from principals import PrincipalCache  # noqa: E402
+from public_cache import CollectionVersions  # noqa: E402
+
+# Longest a message may take between workers with the journal source polling every 50 ms
+DELIVERY_TIMEOUT = 5
+
+class GatedUsers:
+    """The users collection, with find_one held until the test opens the gate."""
+
+    def __init__(self, users):
+        self.users = users
+        self.gate = asyncio.Event()
+        self.reading = asyncio.Event()
+
+    async def find_one(self, *args, **kwargs):
+        user = await self.users.find_one(*args, **kwargs)
+        self.reading.set()
+        await self.gate.wait()
+        return user
+
+class InvalidationTester:
+    def __init__(self):
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.test_results = []
+        self.client = None
+        self.db = None
+
+    def log_test(self, name, success, message=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name}: PASSED - {message}")
+        else:
+            print(f"❌ {name}: FAILED - {message}")
+        self.test_results.append({"test": name, "success": success, "message": message})
+
+    def worker(self):
+        """A journal and a bus polling it, as each server process has"""
+        journal = ChangeJournal(self.db)
+        bus = InvalidationBus(self.db, journal)
+        bus.mode = "journal"
+        bus.poll_interval = 0.05
+        return journal, bus
+
+    async def wait_until(self, condition):
+        for _ in range(DELIVERY_TIMEOUT * 20):
+            if condition():
+                return True
+            await asyncio.sleep(0.05)
+        return False
+
+    async def setup_test_data(self):
+        """Start two workers and create a user"""
+        print("\n🔧 Setting up test data...")
+        self.client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                                         serverSelectionTimeoutMS=3000)
+        self.db = self.client[f"invalidation_test_{uuid.uuid4().hex[:8]}"]
+        try:
+            await self.client.server_info()
+        except Exception as e:
+            print(f"❌ MongoDB not reachable: {e}")
+            return False
+        self.journal_a, self.bus_a = self.worker()
+        self.journal_b, self.bus_b = self.worker()
+        self.user = {"id": str(uuid.uuid4()), "username": f"user_{uuid.uuid4().hex[:8]}", "role": "user",
+                     "is_suspended": False, "is_deleted": False}
+        await self.db.users.insert_one(dict(self.user))
+        self.bus_a.start()
+        self.bus_b.start()
+        await asyncio.sleep(0.2)  # both sources positioned at the journal head
+        return True
+
+    async def suspend(self, journal, suspended=True):
+        await self.db.users.update_one({"id": self.user["id"]}, {"$set": {"is_suspended": suspended}})
+        await journal.append("user", self.user["id"], "updated", None, ["is_suspended"])
+
+    async def test_bus_delivery(self):
+        """A journaled write reaches its own worker at once and the other through the journal"""
+        received_a, received_b = [], []
+        self.bus_a.subscribe("category", received_a.append)
+        self.bus_b.subscribe("category", received_b.append)
+        await self.journal_a.append("category", "category-1", "updated", None, ["name"])
+        self.log_test("Local Write Delivered At Once", received_a[:1] == [{"category-1"}], f"Received: {received_a}")
+        delivered = await self.wait_until(lambda: {"category-1"} in received_b)
+        self.log_test("Write Delivered To Other Worker", delivered, f"Received: {received_b}")
+        self.log_test("Other Topics Not Delivered", all(ids == {"category-1"} for ids in received_a + received_b),
+                      "Only the category topic was notified")
+
+    async def test_principal_cache(self):
+        """Cached users are served from memory until a write to them is journaled"""
+        cache = PrincipalCache(self.db.users, self.bus_a)
+        first = await cache.get(self.user["username"])
+        await self.db.users.update_one({"id": self.user["id"]}, {"$set": {"role": "policy_manager"}})
+        cached = await cache.get(self.user["username"])
+        self.log_test("Principal Served From Cache", first is not None and cached["role"] == "user",
+                      "Unjournaled write not seen")
+        await self.journal_a.append("user", self.user["id"], "updated", None, ["role"])
+        fresh = await cache.get(self.user["username"])
+        self.log_test("Journaled Write Drops Principal", fresh["role"] == "policy_manager", f"Role: {fresh['role']}")
+        self.log_test("Unknown User Not Found", await cache.get("no-such-user") is None, "None returned")
+
+    async def test_suspension_on_other_worker(self):
+        """A suspension made on one worker reaches the other worker's cache"""
+        cache_b = PrincipalCache(self.db.users, self.bus_b)
+        before = await cache_b.get(self.user["username"])
+        await self.suspend(self.journal_a)
+        applied = await self.wait_until(lambda: self.user["username"] not in cache_b._entries)
+        after = await cache_b.get(self.user["username"])
+        self.log_test("Suspension Reaches Other Worker", not before["is_suspended"] and applied
+                      and after["is_suspended"], f"is_suspended: {after['is_suspended']}")
+        await self.suspend(self.journal_a, False)
+
+    async def test_invalidation_during_load(self):
+        """A record read while the user was being changed is used once but not cached"""
+        users = GatedUsers(self.db.users)
+        cache = PrincipalCache(users, self.bus_a)
+        users.gate.clear()
+        loading = asyncio.create_task(cache.get(self.user["username"]))
+        await users.reading.wait()  # holds the record from before the suspension
+        await self.suspend(self.journal_a)
+        users.gate.set()
+        stale = await loading
+        fresh = await cache.get(self.user["username"])
+        self.log_test("Stale Load Not Cached", not stale["is_suspended"] and fresh["is_suspended"],
+                      f"In-flight: {stale['is_suspended']}, next lookup: {fresh['is_suspended']}")
+
+    async def test_collection_versions(self):
+        """The public list version follows writes and survives the journal's retention"""
+        versions = CollectionVersions(self.journal_a, self.bus_a)
+        before = await versions.version("document")
+        seq = await self.journal_a.append("document", "document-1", "updated", None, ["title"])
+        await self.journal_a.append("policy", "policy-1", "updated", None, ["title"])
+        self.log_test("Version Follows Write", await versions.version("document") == seq != before,
+                      f"{before} -> {seq}")
+        await self.db.change_journal.delete_many({})  # as the retention TTL eventually does
+        versions._invalidate("document")
+        after = await versions.version("document")
+        self.log_test("Version Survives Journal Expiry", after == seq, f"Version after purge: {after}")
+
+    async def test_version_read_before_counter(self):
+        """A change stream's counter event drops a version read between the write and its journal entry"""
+        versions = CollectionVersions(self.journal_b, self.bus_b)
+        # The stream delivers the documents write; the writer has not journaled it yet
+        self.bus_b._deliver_change({"ns": {"coll": "documents"}, "fullDocument": {"id": "document-2"}})
+        stale = await versions.version("document")
+        seq = await self.journal_a.append("document", "document-2", "updated", None, ["title"])
+        counter = await self.db.counters.find_one({"_id": "change_journal"})
+        self.bus_b._deliver_change({"ns": {"coll": "counters"}, "documentKey": {"_id": "change_journal"},
+                                    "updateDescription": {"updatedFields": {"seq": seq, "entities.document": seq}},
+                                    "fullDocument": counter})
+        after = await versions.version("document")
+        self.log_test("Counter Event Drops Early Read", stale < seq == after, f"{stale} -> {after}")
+
+    async def run(self):
+        if not await self.setup_test_data():
+            print("\n❌ Failed to setup test data. Cannot proceed.")
+            return False
+        try:
+            await self.test_bus_delivery()
+            await self.test_principal_cache()
+            await self.test_suspension_on_other_worker()
+            await self.test_invalidation_during_load()
+            await self.test_collection_versions()
+            await self.test_version_read_before_counter()
+        finally:
+            self.bus_a.shutdown()
+            self.bus_b.shutdown()
+            await self.client.drop_database(self.db.name)
+        return True
+
+    def run_all_tests(self):
+        print("🚀 Starting Invalidation Tests")
+        print("=" * 60)
+
+        if not asyncio.run(self.run()):
+            return False
+
+        print("\n" + "=" * 60)
+        print(f"📊 Invalidation Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
+
+        if self.tests_passed == self.tests_run:
+            print("🎉 All invalidation tests passed!")
+            return True
+
+        print(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
+        for result in self.test_results:
+            if not result['success']:
+                print(f"  ❌ {result['test']}: {result['message']}")
+        return False
+
+def main():
+    tester = InvalidationTester()
+    success = tester.run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""Change journal outbox tests.
+
+Runs ChangeJournal.commit() and drain() on a throwaway database on the MongoDB
+at MONGO_URL (dropped afterwards):
+
+    MONGO_URL=mongodb://localhost:27017 python journal_outbox_test.py
+"""
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from change_journal import PENDING_FIELD, PENDING_TIMEOUT, ChangeJournal, pending_change, with_pending  # noqa: E402
+
+class JournalOutboxTester:
+    def __init__(self):
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.test_results = []
+        self.client = None
+        self.db = None
+
+    def log_test(self, name, success, message=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name}: PASSED - {message}")
+        else:
+            print(f"❌ {name}: FAILED - {message}")
+        self.test_results.append({"test": name, "success": success, "message": message})
+
+    async def events_for(self, entity_id):
+        return await self.db.change_journal.find({"entity_id": entity_id}, {"_id": 0}).sort("seq", 1).to_list(None)
+
+    async def setup_test_data(self):
+        print("\n🔧 Setting up test data...")
+        self.client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                                         serverSelectionTimeoutMS=3000)
+        self.db = self.client[f"journal_outbox_test_{uuid.uuid4().hex[:8]}"]
+        try:
+            await self.client.server_info()
+        except Exception as e:
+            print(f"❌ MongoDB not reachable: {e}")
+            return False
+        self.journal = ChangeJournal(self.db)
+        return True
+
+    async def test_commit(self):
+        """A committed change is journaled and leaves no outbox behind"""
+        document_id = str(uuid.uuid4())
+        change = pending_change("created", "user-1")
+        await self.db.documents.insert_one({"id": document_id, "status": "draft", PENDING_FIELD: [change]})
+        seq = await self.journal.commit("document", document_id, change)
+        record = await self.db.documents.find_one({"id": document_id})
+        events = await self.events_for(document_id)
+        self.log_test("Commit Journals Change", [event["seq"] for event in events] == [seq]
+                      and events[0]["action"] == "created" and events[0]["actor"] == "user-1", f"Events: {events}")
+        self.log_test("Commit Clears Outbox", PENDING_FIELD not in record, f"Record: {record}")
+
+    async def test_concurrent_changes(self):
+        """Committing one change leaves another writer's entry in place"""
+        document_id = str(uuid.uuid4())
+        await self.db.documents.insert_one({"id": document_id, "status": "draft"})
+        first = pending_change("updated", "user-1", ["title", "modified_at"])
+        second = pending_change("updated", "user-2", ["status"])
+        for change, values in ((first, {"title": "New"}), (second, {"status": "active"})):
+            await self.db.documents.update_one({"id": document_id}, with_pending({"$set": values}, change))
+        await self.journal.commit("document", document_id, second)
+        record = await self.db.documents.find_one({"id": document_id})
+        self.log_test("Other Entry Kept", [entry["id"] for entry in record[PENDING_FIELD]] == [first["id"]],
+                      f"Pending: {record[PENDING_FIELD]}")
+        self.log_test("Bookkeeping Fields Left Out", first["fields"] == ["title"], f"Fields: {first['fields']}")
+
+    async def test_drain(self):
+        """A change whose writer stopped before commit() is journaled once it is old enough"""
+        stranded_id, recent_id = str(uuid.uuid4()), str(uuid.uuid4())
+        stranded = pending_change("updated", "user-1", ["status"])
+        stranded["at"] = datetime.utcnow() - 2 * PENDING_TIMEOUT
+        await self.db.documents.insert_one({"id": stranded_id, "status": "deleted", PENDING_FIELD: [stranded]})
+        await self.db.users.insert_one({"id": recent_id, "username": "writer",
+                                        PENDING_FIELD: [pending_change("updated", "user-1", ["role"])]})
+
+        drained = await self.journal.drain()
+        events = await self.events_for(stranded_id)
+        record = await self.db.documents.find_one({"id": stranded_id})
+        self.log_test("Stranded Change Journaled", len(events) == 1 and events[0]["fields"] == ["status"]
+                      and PENDING_FIELD not in record, f"Events: {events}")
+        recent = await self.db.users.find_one({"id": recent_id})
+        self.log_test("Recent Change Left To Its Writer", not await self.events_for(recent_id)
+                      and len(recent[PENDING_FIELD]) == 1, f"Drained {drained}")
+        self.log_test("Second Drain Does Nothing", await self.journal.drain() == 0, "Nothing pending")
+
+    async def run(self):
+        if not await self.setup_test_data():
+            print("\n❌ Failed to setup test data. Cannot proceed.")
+            return False
+        try:
+            await self.test_commit()
+            await self.test_concurrent_changes()
+            await self.test_drain()
+        finally:
+            await self.client.drop_database(self.db.name)
+        return True
+
+    def run_all_tests(self):
+        print("🚀 Starting Journal Outbox Tests")
+        print("=" * 60)
+
+        if not asyncio.run(self.run()):
+            return False
+
+        print("\n" + "=" * 60)
+        print(f"📊 Journal Outbox Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
+
+        if self.tests_passed == self.tests_run:
+            print("🎉 All journal outbox tests passed!")
+            return True
+
+        print(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
+        for result in self.test_results:
+            if not result['success']:
+                print(f"  ❌ {result['test']}: {result['message']}")
+        return False
+
+def main():
+    tester = JournalOutboxTester()
+    success = tester.run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
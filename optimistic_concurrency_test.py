@@ -0,0 +1,156 @@
+import requests
+import sys
+import io
+from datetime import datetime
+
+class OptimisticConcurrencyTester:
+    def __init__(self, base_url="https://secure-doc-share.preview.emergentagent.com"):
+        self.base_url = base_url
+        self.api_url = f"{base_url}/api"
+        self.admin_token = None
+        self.test_document_id = None
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.test_results = []
+
+    def log_test(self, name, success, message=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name}: PASSED - {message}")
+        else:
+            print(f"❌ {name}: FAILED - {message}")
+        self.test_results.append({"test": name, "success": success, "message": message})
+
+    def headers(self, extra=None):
+        headers = {'Authorization': f'Bearer {self.admin_token}'}
+        if extra:
+            headers.update(extra)
+        return headers
+
+    def setup_test_data(self):
+        """Login as admin and upload a document to edit"""
+        print("\n🔧 Setting up test data...")
+        response = requests.post(f"{self.api_url}/auth/login", json={"username": "admin", "password": "admin123"})
+        if response.status_code != 200:
+            print(f"❌ Admin login failed - Status: {response.status_code}")
+            return False
+        self.admin_token = response.json()['access_token']
+
+        categories = requests.get(f"{self.api_url}/categories", headers=self.headers()).json()
+        if not categories:
+            print("❌ No categories available for testing")
+            return False
+
+        files = {'file': ('etag_test.txt', io.BytesIO(b"Optimistic concurrency test document"), 'text/plain')}
+        data = {
+            'title': f"ETag Test Document {datetime.now().strftime('%H%M%S')}",
+            'document_type': 'document',
+            'category_id': categories[0]['id'],
+            'date_issued': datetime.now().isoformat(),
+            'owner_department': 'Testing'
+        }
+        response = requests.post(f"{self.api_url}/documents", files=files, data=data, headers=self.headers())
+        if response.status_code != 200:
+            print(f"❌ Document upload failed - Status: {response.status_code} - {response.text}")
+            return False
+        self.test_document_id = response.json()['document']['id']
+        print(f"✅ Created test document: {self.test_document_id}")
+        return True
+
+    def test_etag_on_read(self):
+        """GET returns the revision as a strong ETag"""
+        response = requests.get(f"{self.api_url}/documents/{self.test_document_id}", headers=self.headers())
+        etag = response.headers.get('ETag')
+        revision = response.json().get('revision') if response.status_code == 200 else None
+        self.log_test(
+            "ETag On Document Read",
+            response.status_code == 200 and etag == f'"{revision}"',
+            f"Status: {response.status_code}, ETag: {etag}, revision: {revision}"
+        )
+        return etag
+
+    def test_conditional_update(self, etag):
+        """PUT with a current If-Match succeeds and returns the next revision"""
+        response = requests.put(
+            f"{self.api_url}/documents/{self.test_document_id}",
+            json={"description": "Updated with If-Match"},
+            headers=self.headers({'If-Match': etag})
+        )
+        new_etag = response.headers.get('ETag')
+        self.log_test(
+            "Conditional Update With Current ETag",
+            response.status_code == 200 and new_etag and new_etag != etag,
+            f"Status: {response.status_code}, ETag: {etag} -> {new_etag}"
+        )
+
+        # Replaying the old ETag must be rejected instead of overwriting the newer edit
+        response = requests.put(
+            f"{self.api_url}/documents/{self.test_document_id}",
+            json={"description": "Stale edit"},
+            headers=self.headers({'If-Match': etag})
+        )
+        self.log_test("Stale If-Match Rejected", response.status_code == 412, f"Status: {response.status_code}")
+
+        document = requests.get(f"{self.api_url}/documents/{self.test_document_id}", headers=self.headers()).json()
+        self.log_test(
+            "Stale Edit Not Applied",
+            document.get('description') == "Updated with If-Match",
+            f"Description: {document.get('description')}"
+        )
+
+    def test_unconditional_update(self):
+        """PUT without If-Match keeps last-writer-wins behaviour for existing clients"""
+        response = requests.put(
+            f"{self.api_url}/documents/{self.test_document_id}",
+            json={"description": "Unconditional update"},
+            headers=self.headers()
+        )
+        self.log_test("Unconditional Update Still Works", response.status_code == 200, f"Status: {response.status_code}")
+
+    def test_missing_document(self):
+        """A conditional update of a missing document is a 404, not a 412"""
+        response = requests.put(
+            f"{self.api_url}/documents/non-existent-document-id",
+            json={"description": "Nothing here"},
+            headers=self.headers({'If-Match': '"1"'})
+        )
+        self.log_test("Missing Document Returns 404", response.status_code == 404, f"Status: {response.status_code}")
+
+    def run_all_tests(self):
+        """Run all optimistic concurrency tests"""
+        print("🚀 Starting Optimistic Concurrency (ETag / If-Match) Tests")
+        print("=" * 60)
+
+        if not self.setup_test_data():
+            print("\n❌ Failed to setup test data. Cannot proceed.")
+            return False
+
+        etag = self.test_etag_on_read()
+        if etag:
+            self.test_conditional_update(etag)
+        self.test_unconditional_update()
+        self.test_missing_document()
+
+        print("\n" + "=" * 60)
+        print(f"📊 Optimistic Concurrency Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
+
+        if self.tests_passed == self.tests_run:
+            print("🎉 All optimistic concurrency tests passed!")
+            return True
+
+        print(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
+        print("\nFailed Tests:")
+        for result in self.test_results:
+            if not result['success']:
+                print(f"  ❌ {result['test']}: {result['message']}")
+        return False
+
+def main():
+    tester = OptimisticConcurrencyTester()
+    success = tester.run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import io
+import requests
+import sys
+import time
+import uuid
+
+# One-page PDF with visible text, small enough to render quickly
+PDF_CONTENT = b"""%PDF-1.4
+1 0 obj
+<< /Type /Catalog /Pages 2 0 R >>
+endobj
+2 0 obj
+<< /Type /Pages /Kids [3 0 R] /Count 1 >>
+endobj
+3 0 obj
+<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R
+   /Resources << /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >> >> >>
+endobj
+4 0 obj
+<< /Length 44 >>
+stream
+BT
+/F1 24 Tf
+72 720 Td
+(Preview Test) Tj
+ET
+endstream
+endobj
+trailer
+<< /Size 5 /Root 1 0 R >>
+%%EOF"""
+
+# Background rendering finishes within this many seconds on an idle server
+WAIT_SECONDS = 30
+
+class PdfPreviewTester:
+    def __init__(self, base_url="https://secure-doc-share.preview.emergentagent.com"):
+        self.base_url = base_url
+        self.api_url = f"{base_url}/api"
+        self.admin_token = None
+        self.category_id = None
+        self.document = None
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.test_results = []
+
+    def log_test(self, name, success, message=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name}: PASSED - {message}")
+        else:
+            print(f"❌ {name}: FAILED - {message}")
+        self.test_results.append({"test": name, "success": success, "message": message})
+
+    def headers(self):
+        return {'Authorization': f'Bearer {self.admin_token}'}
+
+    def setup_test_data(self):
+        """Login as admin and upload a visible one-page PDF"""
+        print("\n🔧 Setting up test data...")
+        response = requests.post(f"{self.api_url}/auth/login", json={"username": "admin", "password": "admin123"})
+        if response.status_code != 200:
+            print(f"❌ Admin login failed - Status: {response.status_code}")
+            return False
+        self.admin_token = response.json()['access_token']
+        categories = requests.get(f"{self.api_url}/categories", headers=self.headers()).json()
+        if not categories:
+            print("❌ No categories available")
+            return False
+        self.category_id = categories[0]['id']
+        response = requests.post(
+            f"{self.api_url}/documents",
+            headers=self.headers(),
+            data={"title": f"Preview Test {uuid.uuid4().hex[:6]}", "category_id": self.category_id,
+                  "date_issued": "2025-01-01T00:00:00Z", "owner_department": "Test Department"},
+            files={"file": (f"preview-{uuid.uuid4().hex[:6]}.pdf", io.BytesIO(PDF_CONTENT), "application/pdf")}
+        )
+        if response.status_code != 200:
+            print(f"❌ Upload failed - Status: {response.status_code}")
+            return False
+        self.document = response.json()['document']
+        return True
+
+    def wait_for(self, field):
+        """Poll the document until the background worker has set `field`."""
+        deadline = time.time() + WAIT_SECONDS
+        while time.time() < deadline:
+            document = requests.get(f"{self.api_url}/documents/{self.document['id']}", headers=self.headers()).json()
+            if document.get(field):
+                return document
+            time.sleep(1)
+        return None
+
+    def test_preview_urls(self):
+        """Rendered previews are exposed on the record and served as images"""
+        document = self.wait_for("thumbnail_url")
+        self.log_test("Record Exposes Preview URLs", document is not None and bool(document.get("preview_url")),
+                      f"thumbnail_url: {document and document.get('thumbnail_url')}")
+        if document is None:
+            return
+        self.log_test("Revision Unchanged By Preview", document['revision'] == self.document['revision'],
+                      f"Revision: {self.document['revision']} -> {document['revision']}")
+        for field in ("thumbnail_url", "preview_url"):
+            response = requests.get(f"{self.base_url}{document[field]}")
+            self.log_test(f"Serve {field}", response.status_code == 200 and
+                          response.headers.get('content-type', '').startswith("image/"),
+                          f"Status: {response.status_code}, type: {response.headers.get('content-type')}")
+
+        public = requests.get(f"{self.api_url}/public/documents").json()
+        listed = next((d for d in public if d['id'] == self.document['id']), None)
+        self.log_test("Public List Carries Thumbnail", listed is not None and
+                      listed.get("thumbnail_url") == document["thumbnail_url"], "Checked public document list")
+
+    def test_web_rendition(self):
+        """With PDF_LINEARIZE=true the record gains a linearized copy for viewers; downloads keep the original"""
+        document = self.wait_for("web_file_url")
+        self.log_test("Record Exposes Linearized Copy", document is not None,
+                      "web_file_url set" if document else "not set (is PDF_LINEARIZE=true on the server?)")
+        if document is None:
+            return
+        self.log_test("Revision Unchanged By Rendition", document['revision'] == self.document['revision'],
+                      f"Revision: {self.document['revision']} -> {document['revision']}")
+        rendition = requests.get(f"{self.base_url}{document['web_file_url']}")
+        self.log_test("Serve Linearized Copy", rendition.status_code == 200 and b"/Linearized" in rendition.content[:1024],
+                      f"Status: {rendition.status_code}, size: {len(rendition.content)}")
+        first_bytes = requests.get(f"{self.base_url}{document['web_file_url']}", headers={"Range": "bytes=0-1023"})
+        self.log_test("Linearized Copy Supports Ranges", first_bytes.status_code == 206,
+                      f"Status: {first_bytes.status_code}")
+        original = requests.get(f"{self.api_url}/documents/{self.document['id']}/download", headers=self.headers())
+        self.log_test("Download Serves Original Bytes", original.content == PDF_CONTENT,
+                      f"Status: {original.status_code}")
+
+        # An If-Match edit with the revision from upload time must still succeed
+        response = requests.put(f"{self.api_url}/documents/{self.document['id']}",
+                                headers={**self.headers(), "If-Match": f'"{self.document["revision"]}"'},
+                                json={"owner_department": "Edited After Rendition"})
+        self.log_test("If-Match Edit After Rendition", response.status_code == 200, f"Status: {response.status_code}")
+
+    def test_unknown_preview(self):
+        response = requests.get(f"{self.base_url}/preview/{'0' * 64}/thumb")
+        self.log_test("Unknown Preview 404", response.status_code == 404, f"Status: {response.status_code}")
+        response = requests.get(f"{self.base_url}/preview/not-a-hash/thumb")
+        self.log_test("Malformed Hash 404", response.status_code == 404, f"Status: {response.status_code}")
+
+    def cleanup(self):
+        if self.document:
+            requests.delete(f"{self.api_url}/documents/{self.document['id']}", headers=self.headers())
+
+    def run_all_tests(self):
+        """Run all PDF preview tests"""
+        print("🚀 Starting PDF Preview Tests")
+        print("=" * 60)
+
+        if not self.setup_test_data():
+            print("\n❌ Failed to setup test data. Cannot proceed.")
+            return False
+
+        try:
+            self.test_preview_urls()
+            self.test_web_rendition()
+            self.test_unknown_preview()
+        finally:
+            self.cleanup()
+
+        print("\n" + "=" * 60)
+        print(f"📊 PDF Preview Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
+
+        if self.tests_passed == self.tests_run:
+            print("🎉 All PDF preview tests passed!")
+            return True
+
+        print(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
+        print("\nFailed Tests:")
+        for result in self.test_results:
+            if not result['success']:
+                print(f"  ❌ {result['test']}: {result['message']}")
+        return False
+
+def main():
+    tester = PdfPreviewTester()
+    success = tester.run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,7 @@ import sys
 import json
 from datetime import datetime
 import time
+import uuid
 
 class PublicAPITester:
     def __init__(self, base_url="https://secure-doc-share.preview.emergentagent.com"):
@@ -152,10 +153,11 @@ class PublicAPITester:
         print("   No visible policies found, creating test policy...")
         
         # Create a simple text file to upload as policy document
-        test_content = f"""
+        test_content = f"""%PDF-1.4
 TEST POLICY DOCUMENT
 Created: {datetime.now().isoformat()}
 This is a test policy document for public API testing.
+%%EOF
 """
         
         # Create test policy using form data
@@ -518,6 +520,76 @@ This is a test policy document for public API testing.
 
         return True
 
+    def test_conditional_get(self):
+        """Public lists answer 304 to a current ETag and change their ETag after a write"""
+        print("\n=== TESTING CONDITIONAL GET ON PUBLIC LISTS ===")
+        
+        for endpoint in ("public/policies", "public/documents", "public/categories", "public/policy-types"):
+            first = requests.get(f"{self.api_url}/{endpoint}")
+            etag = first.headers.get("ETag")
+            self.log_test(f"ETag And Cache-Control - {endpoint}",
+                          first.status_code == 200 and bool(etag) and "public" in first.headers.get("Cache-Control", ""),
+                          f"ETag: {etag}, Cache-Control: {first.headers.get('Cache-Control')}")
+            if not etag:
+                continue
+            second = requests.get(f"{self.api_url}/{endpoint}", headers={"If-None-Match": etag})
+            self.log_test(f"304 For Current ETag - {endpoint}", second.status_code == 304 and not second.content,
+                          f"Status: {second.status_code}")
+
+        if self.test_policy_id and self.admin_token:
+            etag = requests.get(f"{self.api_url}/public/policies").headers.get("ETag")
+            headers = {'Authorization': f'Bearer {self.admin_token}'}
+            for visible in ("false", "true"):
+                requests.patch(f"{self.api_url}/policies/{self.test_policy_id}/visibility",
+                               params={"is_visible": visible}, headers=headers)
+            response = requests.get(f"{self.api_url}/public/policies", headers={"If-None-Match": etag})
+            self.log_test("Write Changes Public ETag", response.status_code == 200 and response.headers.get("ETag") != etag,
+                          f"Status: {response.status_code}")
+
+        return True
+
+    def test_reference_list_invalidation(self):
+        """Create, update, delete and restore show up in the cached lists at once and change their ETag"""
+        print("\n=== TESTING REFERENCE LIST INVALIDATION ===")
+        if not self.admin_token:
+            return False
+        headers = {'Authorization': f'Bearer {self.admin_token}'}
+
+        for resource, label in (("policy-types", "Policy Type"), ("categories", "Category")):
+            def listed():
+                """ETag and names of the public list, names of the signed-in list"""
+                public = requests.get(f"{self.api_url}/public/{resource}")
+                private = requests.get(f"{self.api_url}/{resource}", headers=headers).json()
+                return (public.headers.get("ETag"), {row['id']: row['name'] for row in public.json()},
+                        {row['id']: row['name'] for row in private})
+
+            etag, _, _ = listed()
+            code = f"C{uuid.uuid4().hex[:6].upper()}"
+            created = requests.post(f"{self.api_url}/{resource}", headers=headers,
+                                    json={"name": f"Cache Test {code}", "code": code}).json()
+            steps = [
+                ("Create", None, lambda rows: rows.get(created['id']) == f"Cache Test {code}"),
+                ("Update", lambda: requests.patch(f"{self.api_url}/{resource}/{created['id']}", headers=headers,
+                                                  json={"name": f"Renamed {code}"}),
+                 lambda rows: rows.get(created['id']) == f"Renamed {code}"),
+                ("Delete", lambda: requests.delete(f"{self.api_url}/{resource}/{created['id']}", headers=headers),
+                 lambda rows: created['id'] not in rows),
+                ("Restore", lambda: requests.patch(f"{self.api_url}/{resource}/{created['id']}/restore",
+                                                   headers=headers),
+                 lambda rows: rows.get(created['id']) == f"Renamed {code}"),
+            ]
+            for step, write, check in steps:
+                if write:
+                    write()
+                new_etag, public_rows, private_rows = listed()
+                self.log_test(f"{label} {step} Listed At Once", check(public_rows) and check(private_rows),
+                              f"Public: {public_rows.get(created['id'])}, signed-in: {private_rows.get(created['id'])}")
+                self.log_test(f"{label} {step} Changes ETag", new_etag != etag, f"{etag} -> {new_etag}")
+                etag = new_etag
+            requests.delete(f"{self.api_url}/{resource}/{created['id']}", headers=headers)
+
+        return True
+
     def run_all_tests(self):
         """Run all public API tests"""
         print("🚀 Starting Public API Endpoint Tests")
@@ -540,6 +612,8 @@ This is a test policy document for public API testing.
         self.test_public_policy_download_endpoint()
         self.test_public_categories_endpoint()
         self.test_public_policy_types_endpoint()
+        self.test_conditional_get()
+        self.test_reference_list_invalidation()
         
         # Print summary
         print("\n" + "=" * 60)
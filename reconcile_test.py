@@ -0,0 +1,184 @@
+"""Storage reconciliation tests.
+
+Runs reconcile() against LocalStorage in a temporary directory and a throwaway
+database on the MongoDB at MONGO_URL (dropped afterwards):
+
+    MONGO_URL=mongodb://localhost:27017 python reconcile_test.py
+"""
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from reconcile import QUARANTINE_PREFIX, reconcile  # noqa: E402
+from storage import LocalStorage  # noqa: E402
+
+UPLOAD_URL_PREFIX = "/uploads/"
+# Older than the default one-hour grace period
+OLD = time.time() - 2 * 3600
+
+def blob_key(sha256):
+    return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+class ReconcileTester:
+    def __init__(self):
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.test_results = []
+        self.workdir = Path(tempfile.mkdtemp())
+        self.storage = LocalStorage(self.workdir / "store")
+        self.client = None
+        self.db = None
+
+    def log_test(self, name, success, message=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name}: PASSED - {message}")
+        else:
+            print(f"❌ {name}: FAILED - {message}")
+        self.test_results.append({"test": name, "success": success, "message": message})
+
+    def write(self, key, content, modified=OLD):
+        path = self.storage.local_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        os.utime(path, (modified, modified))
+
+    def blob(self, name, modified=OLD):
+        content = f"{name} {uuid.uuid4().hex}".encode()
+        sha256 = hashlib.sha256(content).hexdigest()
+        self.write(blob_key(sha256), content, modified)
+        return sha256
+
+    async def setup_test_data(self):
+        """Lay out referenced, orphaned, fresh, in-flight and missing objects"""
+        print("\n🔧 Setting up test data...")
+        self.client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                                         serverSelectionTimeoutMS=3000)
+        self.db = self.client[f"reconcile_test_{uuid.uuid4().hex[:8]}"]
+        try:
+            await self.client.server_info()
+        except Exception as e:
+            print(f"❌ MongoDB not reachable: {e}")
+            return False
+        self.referenced = self.blob("referenced")
+        self.deleted_reference = self.blob("soft-deleted record")
+        self.orphan = self.blob("orphan")
+        self.fresh = self.blob("fresh upload", modified=time.time())
+        self.missing = hashlib.sha256(b"missing").hexdigest()
+        self.write(".incoming/upload-session.part", b"partial upload")
+
+        await self.db.documents.insert_many([
+            {"id": str(uuid.uuid4()), "file_url": UPLOAD_URL_PREFIX + blob_key(self.referenced), "is_deleted": False},
+            {"id": str(uuid.uuid4()), "file_url": UPLOAD_URL_PREFIX + blob_key(self.deleted_reference),
+             "is_deleted": True},
+            {"id": str(uuid.uuid4()), "file_url": UPLOAD_URL_PREFIX + blob_key(self.missing), "is_deleted": False},
+        ])
+        await self.db.blobs.insert_many([{"_id": sha256, "refs": 0} for sha256 in (self.orphan, self.fresh)])
+        return True
+
+    async def test_report(self):
+        """A dry run reports orphans and missing references without moving anything"""
+        report = await reconcile(self.db, self.storage, rate=10000)
+        self.log_test("Orphan Detected", report["orphans"] == [blob_key(self.orphan)], f"Orphans: {report['orphans']}")
+        self.log_test("Missing Reference Detected", report["missing"] == [blob_key(self.missing)],
+                      f"Missing: {report['missing']}")
+        self.log_test("Soft-Deleted Records Still Reference", blob_key(self.deleted_reference) not in report["orphans"],
+                      "Blob of a soft-deleted record kept")
+        self.log_test("In-Flight Uploads Skipped", not any(key.startswith(".incoming/") for key in report["orphans"]),
+                      f"Scanned: {report['scanned']}")
+        self.log_test("Dry Run Moves Nothing", report["quarantined"] == 0 and
+                      await self.storage.stat(blob_key(self.orphan)) is not None, "Orphan still in place")
+
+    async def test_grace_period(self):
+        """Unreferenced objects younger than the grace period are left alone"""
+        report = await reconcile(self.db, self.storage, rate=10000)
+        self.log_test("Fresh Object Within Grace", blob_key(self.fresh) not in report["orphans"],
+                      "Recent upload without a record not reported")
+        report = await reconcile(self.db, self.storage, grace=timedelta(0), rate=10000)
+        self.log_test("Fresh Object After Grace", blob_key(self.fresh) in report["orphans"],
+                      f"Orphans with no grace: {len(report['orphans'])}")
+
+    async def test_limit_and_resume(self):
+        """A capped run checkpoints its position and the next run continues after it"""
+        first = await reconcile(self.db, self.storage, rate=10000, limit=2)
+        self.log_test("Capped Run Incomplete", not first["complete"] and first["scanned"] == 2,
+                      f"Scanned: {first['scanned']}, last key: {first['last_key']}")
+        second = await reconcile(self.db, self.storage, rate=10000, resume=True)
+        self.log_test("Resume Continues After Checkpoint", second["started_after"] == first["last_key"] and
+                      second["complete"], f"Started after: {second['started_after']}")
+        checkpoint = await self.db.maintenance.find_one({"_id": "reconcile"})
+        self.log_test("Checkpoint Cleared When Complete", checkpoint and checkpoint["last_key"] is None,
+                      f"Checkpoint: {checkpoint and checkpoint['last_key']}")
+
+    async def test_quarantine(self):
+        """Quarantine moves orphans under quarantine/ and forgets their blob records"""
+        report = await reconcile(self.db, self.storage, quarantine=True, rate=10000)
+        self.log_test("Orphan Quarantined", report["quarantined"] == 1, f"Quarantined: {report['quarantined']}")
+        self.log_test("Orphan Moved Out Of Place", await self.storage.stat(blob_key(self.orphan)) is None,
+                      "Original key gone")
+        moved = [key async for key, _ in self.storage.list() if key.startswith(QUARANTINE_PREFIX)]
+        self.log_test("Orphan Kept Under Quarantine", len(moved) == 1 and moved[0].endswith(blob_key(self.orphan)),
+                      f"Quarantine: {moved}")
+        self.log_test("Blob Record Removed", await self.db.blobs.count_documents({"_id": self.orphan}) == 0,
+                      "blobs entry deleted")
+        self.log_test("Referenced Object Untouched", await self.storage.stat(blob_key(self.referenced)) is not None,
+                      "Referenced blob still in place")
+        self.log_test("Fresh Object Not Quarantined", await self.storage.stat(blob_key(self.fresh)) is not None,
+                      "Blob within grace still in place")
+
+        report = await reconcile(self.db, self.storage, quarantine=True, rate=10000)
+        self.log_test("Quarantine Not Reconciled Again", report["orphans"] == [],
+                      f"Orphans on second pass: {report['orphans']}")
+
+    async def run(self):
+        if not await self.setup_test_data():
+            print("\n❌ Failed to setup test data. Cannot proceed.")
+            return False
+        try:
+            await self.test_report()
+            await self.test_grace_period()
+            await self.test_limit_and_resume()
+            await self.test_quarantine()
+        finally:
+            await self.client.drop_database(self.db.name)
+        return True
+
+    def run_all_tests(self):
+        print("🚀 Starting Reconcile Tests")
+        print("=" * 60)
+
+        if not asyncio.run(self.run()):
+            return False
+
+        print("\n" + "=" * 60)
+        print(f"📊 Reconcile Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
+
+        if self.tests_passed == self.tests_run:
+            print("🎉 All reconcile tests passed!")
+            return True
+
+        print(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
+        for result in self.test_results:
+            if not result['success']:
+                print(f"  ❌ {result['test']}: {result['message']}")
+        return False
+
+def main():
+    tester = ReconcileTester()
+    success = tester.run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import requests
+import sys
+from datetime import datetime
+
+class ResumableUploadTester:
+    def __init__(self, base_url="https://secure-doc-share.preview.emergentagent.com"):
+        self.base_url = base_url
+        self.api_url = f"{base_url}/api"
+        self.admin_token = None
+        self.category_id = None
+        self.content = b"%PDF-1.4\n" + bytes(range(256)) * 4096 + b"\n%%EOF"  # ~1 MiB
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.test_results = []
+
+    def log_test(self, name, success, message=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name}: PASSED - {message}")
+        else:
+            print(f"❌ {name}: FAILED - {message}")
+        self.test_results.append({"test": name, "success": success, "message": message})
+
+    def headers(self):
+        return {'Authorization': f'Bearer {self.admin_token}'}
+
+    def setup_test_data(self):
+        """Login as admin and pick a category"""
+        print("\n🔧 Setting up test data...")
+        response = requests.post(f"{self.api_url}/auth/login", json={"username": "admin", "password": "admin123"})
+        if response.status_code != 200:
+            print(f"❌ Admin login failed - Status: {response.status_code}")
+            return False
+        self.admin_token = response.json()['access_token']
+
+        categories = requests.get(f"{self.api_url}/categories", headers=self.headers()).json()
+        if not categories:
+            print("❌ No categories available for testing")
+            return False
+        self.category_id = categories[0]['id']
+        return True
+
+    def create_session(self):
+        response = requests.post(f"{self.api_url}/uploads", headers=self.headers(),
+                                 json={"file_name": "scan.pdf", "size": len(self.content)})
+        return response.json()['id'] if response.status_code == 200 else None
+
+    def put_chunk(self, session_id, offset, data):
+        return requests.put(f"{self.api_url}/uploads/{session_id}", params={"offset": offset},
+                            data=data, headers=self.headers())
+
+    def test_chunked_upload(self):
+        """Upload in chunks, resume from the reported offset and finalize into a new document"""
+        session_id = self.create_session()
+        self.log_test("Create Upload Session", session_id is not None, f"Session: {session_id}")
+        if not session_id:
+            return None
+
+        half = len(self.content) // 2
+        response = self.put_chunk(session_id, 0, self.content[:half])
+        self.log_test("Put First Chunk", response.status_code == 200 and response.json()['offset'] == half,
+                      f"Status: {response.status_code}")
+
+        # A client that lost the response re-sends from 0; the server reports where to resume
+        response = self.put_chunk(session_id, 0, self.content[:half])
+        self.log_test("Wrong Offset Returns 409", response.status_code == 409, f"Detail: {response.text}")
+
+        offset = requests.get(f"{self.api_url}/uploads/{session_id}", headers=self.headers()).json()['offset']
+        self.log_test("Query Progress", offset == half, f"Offset: {offset}")
+
+        response = requests.post(f"{self.api_url}/uploads/{session_id}/finalize", headers=self.headers(), json={
+            "document": {"title": "x", "category_id": self.category_id,
+                         "date_issued": datetime.now().isoformat(), "owner_department": "Testing"}
+        })
+        self.log_test("Finalize Incomplete Returns 409", response.status_code == 409, f"Status: {response.status_code}")
+
+        response = self.put_chunk(session_id, offset, self.content[offset:])
+        self.log_test("Resume Upload", response.status_code == 200 and response.json()['offset'] == len(self.content),
+                      f"Status: {response.status_code}")
+
+        response = requests.post(f"{self.api_url}/uploads/{session_id}/finalize", headers=self.headers(), json={
+            "document": {"title": f"Resumable Upload {datetime.now().strftime('%H%M%S')}",
+                         "category_id": self.category_id, "date_issued": datetime.now().isoformat(),
+                         "owner_department": "Testing"}
+        })
+        document = response.json().get('document', {}) if response.status_code == 200 else {}
+        self.log_test("Finalize Creates Document", document.get('file_size') == len(self.content),
+                      f"Status: {response.status_code}, Number: {document.get('document_number')}")
+        if not document:
+            return None
+
+        download = requests.get(f"{self.api_url}/documents/{document['id']}/download", headers=self.headers())
+        self.log_test("Downloaded Bytes Match", download.content == self.content, f"{len(download.content)} bytes")
+        return document['id']
+
+    def test_new_version(self, document_id):
+        """Finalizing against an existing document adds a version"""
+        session_id = self.create_session()
+        self.put_chunk(session_id, 0, self.content)
+        response = requests.post(f"{self.api_url}/uploads/{session_id}/finalize", headers=self.headers(),
+                                 json={"document_id": document_id, "change_summary": "Rescanned"})
+        version = response.json().get('document', {}).get('version') if response.status_code == 200 else None
+        self.log_test("Finalize Adds Version", version == 2, f"Status: {response.status_code}, Version: {version}")
+
+    def test_abort(self):
+        """Aborted sessions are gone"""
+        session_id = self.create_session()
+        requests.delete(f"{self.api_url}/uploads/{session_id}", headers=self.headers())
+        response = requests.get(f"{self.api_url}/uploads/{session_id}", headers=self.headers())
+        self.log_test("Abort Session", response.status_code == 404, f"Status: {response.status_code}")
+
+    def run_all_tests(self):
+        """Run all resumable upload tests"""
+        print("🚀 Starting Resumable Upload Tests")
+        print("=" * 60)
+
+        if not self.setup_test_data():
+            print("\n❌ Failed to setup test data. Cannot proceed.")
+            return False
+
+        document_id = self.test_chunked_upload()
+        if document_id:
+            self.test_new_version(document_id)
+        self.test_abort()
+
+        print("\n" + "=" * 60)
+        print(f"📊 Resumable Upload Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
+
+        if self.tests_passed == self.tests_run:
+            print("🎉 All resumable upload tests passed!")
+            return True
+
+        print(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
+        print("\nFailed Tests:")
+        for result in self.test_results:
+            if not result['success']:
+                print(f"  ❌ {result['test']}: {result['message']}")
+        return False
+
+def main():
+    tester = ResumableUploadTester()
+    success = tester.run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""Storage backend contract tests.
+
+Runs the same checks against LocalStorage and against S3Storage backed by moto's
+in-process S3 stand-in, so no network or real bucket is needed:
+
+    pip install "moto[s3]"
+    python storage_backend_test.py
+"""
+import asyncio
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from storage import LocalStorage, S3Storage  # noqa: E402
+
+class StorageBackendTester:
+    def __init__(self):
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.test_results = []
+        self.workdir = Path(tempfile.mkdtemp())
+        self.content = bytes(range(256)) * 1024  # 256 KiB, several stream chunks
+
+    def log_test(self, name, success, message=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name}: PASSED - {message}")
+        else:
+            print(f"❌ {name}: FAILED - {message}")
+        self.test_results.append({"test": name, "success": success, "message": message})
+
+    def source_file(self):
+        path = self.workdir / f"{uuid.uuid4().hex}.part"
+        path.write_bytes(self.content)
+        return path
+
+    async def collect(self, stream):
+        return b"".join([chunk async for chunk in stream])
+
+    async def check_contract(self, label, storage):
+        """put / stat / get / stream / presign / delete round trip"""
+        key = "blobs/ab/cd/abcd-test"
+        source = self.source_file()
+
+        await storage.put(key, source)
+        self.log_test(f"{label}: Put Consumes Source", not source.exists(), f"source exists: {source.exists()}")
+
+        stat = await storage.stat(key)
+        self.log_test(f"{label}: Stat Size", stat is not None and stat.size == len(self.content),
+                      f"stat: {stat}")
+
+        data = await storage.get(key)
+        self.log_test(f"{label}: Get Round Trip", data == self.content, f"{len(data)} bytes")
+
+        full = await self.collect(storage.stream(key))
+        self.log_test(f"{label}: Stream Whole Object", full == self.content, f"{len(full)} bytes")
+
+        part = await self.collect(storage.stream(key, 1000, 70999))
+        self.log_test(f"{label}: Stream Byte Range", part == self.content[1000:71000], f"{len(part)} bytes")
+
+        url = await storage.presign(key, "report.pdf", "application/pdf", 'attachment; filename="report.pdf"')
+        expected = label.startswith("S3")
+        self.log_test(f"{label}: Presign", bool(url) == expected, f"url: {url[:60] + '...' if url else url}")
+
+        await storage.delete(key)
+        self.log_test(f"{label}: Delete", await storage.stat(key) is None, "stat after delete is None")
+
+        missing = await storage.stat("blobs/00/00/missing")
+        self.log_test(f"{label}: Stat Missing Key", missing is None, f"stat: {missing}")
+
+        try:
+            storage.object_key("../escape") if hasattr(storage, "object_key") else storage.local_path("../escape")
+            self.log_test(f"{label}: Rejects Path Traversal", False, "no error raised")
+        except ValueError:
+            self.log_test(f"{label}: Rejects Path Traversal", True, "ValueError raised")
+
+    async def run_s3(self):
+        try:
+            import boto3
+            from moto import mock_aws
+        except ImportError:
+            print("⚠️  moto not installed, skipping S3 backend checks")
+            return
+        with mock_aws():
+            client = boto3.client("s3", region_name="us-east-1")
+            client.create_bucket(Bucket="policy-register-test")
+            storage = S3Storage("policy-register-test", prefix="uploads", client=client)
+            await self.check_contract("S3Storage", storage)
+
+    def run_all_tests(self):
+        print("🚀 Starting Storage Backend Contract Tests")
+        print("=" * 60)
+
+        asyncio.run(self.check_contract("LocalStorage", LocalStorage(self.workdir / "store")))
+        asyncio.run(self.run_s3())
+
+        print("\n" + "=" * 60)
+        print(f"📊 Storage Backend Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
+
+        if self.tests_passed == self.tests_run:
+            print("🎉 All storage backend tests passed!")
+            return True
+
+        print(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
+        for result in self.test_results:
+            if not result['success']:
+                print(f"  ❌ {result['test']}: {result['message']}")
+        return False
+
+def main():
+    tester = StorageBackendTester()
+    success = tester.run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Upload validation middleware tests.
+
+Drives BodySizeLimitMiddleware directly with multipart bodies delivered in
+64 KiB chunks, in front of an app that reads the whole body as Starlette's form
+parser does. No server or database is needed:
+
+    python upload_validation_test.py
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from upload_validation import MB, UPLOAD_SIZE_LIMITS, BodySizeLimitMiddleware  # noqa: E402
+
+CHUNK = 64 * 1024
+BOUNDARY = b"----registry-test-boundary"
+PDF = b"%PDF-1.4\n" + b"0" * (2 * MB) + b"\n%%EOF\n"
+
+def multipart(file_name, content, fields=None):
+    """Body of a form with some text fields followed by one file."""
+    parts = [b"--" + BOUNDARY + f'\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+             for name, value in (fields or {"title": "Policy", "category_id": "c-1"}).items()]
+    parts.append(b"--" + BOUNDARY + f'\r\nContent-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b"\r\n")
+    return b"".join(parts) + b"--" + BOUNDARY + b"--\r\n"
+
+class UploadValidationTester:
+    def __init__(self):
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.test_results = []
+
+    def log_test(self, name, success, message=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name}: PASSED - {message}")
+        else:
+            print(f"❌ {name}: FAILED - {message}")
+        self.test_results.append({"test": name, "success": success, "message": message})
+
+    async def post(self, body, content_length=True, content_type=None):
+        """Send `body` through the middleware; returns (status, detail, bytes the client had to send)."""
+        chunks = [body[i:i + CHUNK] for i in range(0, len(body), CHUNK)] or [b""]
+        sent = 0
+
+        async def receive():
+            nonlocal sent
+            if not chunks:
+                return {"type": "http.disconnect"}
+            chunk = chunks.pop(0)
+            sent += len(chunk)
+            return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+        async def app(scope, receive, send):
+            while True:
+                message = await receive()
+                if message["type"] != "http.request" or not message.get("more_body"):
+                    break
+            if message["type"] == "http.disconnect":
+                return
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        response = {}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            else:
+                response["body"] = message.get("body", b"")
+
+        headers = [(b"content-type", content_type or b"multipart/form-data; boundary=" + BOUNDARY)]
+        if content_length:
+            headers.append((b"content-length", str(len(body)).encode()))
+        await BodySizeLimitMiddleware(app)({"type": "http", "headers": headers}, receive, send)
+        detail = json.loads(response["body"]).get("detail") if response.get("body") else None
+        return response.get("status"), detail, sent
+
+    async def test_valid_upload(self):
+        status, _, sent = await self.post(multipart("policy.pdf", PDF))
+        self.log_test("Valid PDF Passes", status == 200 and sent >= len(PDF), f"Status {status}, {sent} bytes read")
+
+    async def test_oversized_by_content_length(self):
+        """A declared size over the type's cap is refused before any body is read past the file header"""
+        text = b"a" * (UPLOAD_SIZE_LIMITS[".txt"] + 2 * MB)
+        status, detail, sent = await self.post(multipart("notes.txt", text))
+        self.log_test("Oversized Text Refused Early", status == 413 and sent <= CHUNK,
+                      f"Status {status} after {sent} bytes: {detail}")
+
+    async def test_oversized_chunked(self):
+        """Without Content-Length the type's cap applies to the running count"""
+        text = b"a" * (UPLOAD_SIZE_LIMITS[".txt"] + 2 * MB)
+        status, _, sent = await self.post(multipart("notes.txt", text), content_length=False)
+        limit = UPLOAD_SIZE_LIMITS[".txt"] + MB
+        self.log_test("Chunked Text Stopped At Its Cap", status == 413 and sent <= limit + CHUNK,
+                      f"Status {status} after {sent} bytes (cap {limit})")
+
+    async def test_mislabelled(self):
+        """Content that does not match its extension is refused on the first chunk"""
+        status, detail, sent = await self.post(multipart("policy.docx", PDF))
+        self.log_test("Mislabelled DOCX Refused Early", status == 400 and sent <= CHUNK,
+                      f"Status {status} after {sent} bytes: {detail}")
+        status, _, sent = await self.post(multipart("notes.txt", b"\x00\x01binary" * 200000))
+        self.log_test("Binary Text File Refused Early", status == 400 and sent <= CHUNK,
+                      f"Status {status} after {sent} bytes")
+
+    async def test_file_after_large_field(self):
+        """A file part beyond the read-ahead window is left to the endpoint's own checks"""
+        body = multipart("policy.docx", PDF, {"description": "x" * (128 * 1024)})
+        status, _, sent = await self.post(body)
+        self.log_test("Late File Part Passed On", status == 200 and sent == len(body), f"Status {status}")
+
+    async def test_non_multipart(self):
+        status, _, _ = await self.post(b"\x00" * CHUNK, content_type=b"application/octet-stream")
+        self.log_test("Raw Bodies Not Sniffed", status == 200, f"Status {status}")
+
+    async def run(self):
+        await self.test_valid_upload()
+        await self.test_oversized_by_content_length()
+        await self.test_oversized_chunked()
+        await self.test_mislabelled()
+        await self.test_file_after_large_field()
+        await self.test_non_multipart()
+
+    def run_all_tests(self):
+        print("🚀 Starting Upload Validation Tests")
+        print("=" * 60)
+
+        asyncio.run(self.run())
+
+        print("\n" + "=" * 60)
+        print(f"📊 Upload Validation Test Summary: {self.tests_passed}/{self.tests_run} tests passed")
+
+        if self.tests_passed == self.tests_run:
+            print("🎉 All upload validation tests passed!")
+            return True
+
+        print(f"⚠️  {self.tests_run - self.tests_passed} tests failed")
+        for result in self.test_results:
+            if not result['success']:
+                print(f"  ❌ {result['test']}: {result['message']}")
+        return False
+
+def main():
+    tester = UploadValidationTester()
+    success = tester.run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())